@@ -45,6 +45,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Perfilado por petición con cabecera Server-Timing (ver POLLS_PROFILING)
+    # Va primero para medir también el resto del middleware
+    'polls.middleware.ProfilingMiddleware',
+    
+    # Latencia y consultas por vista para /metrics (ver POLLS_METRICS)
+    'polls.middleware.MetricsMiddleware',
+    
+    # Vista de origen de las consultas lentas (ver POLLS_SLOW_QUERIES)
+    'polls.middleware.SlowQueryMiddleware',
+    
     # Middleware para seguridad básica
     'django.middleware.security.SecurityMiddleware',
     
@@ -162,6 +172,176 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# =============================================================================
+# CONFIGURACIÓN DE RENDIMIENTO DE LA APLICACIÓN DE ENCUESTAS
+# =============================================================================
+
+# Escritor de votos por lotes (polls/vote_writer.py)
+# Si ENABLED es True, los votos se juntan en memoria y se guardan por lotes
+# con bulk_create cada MAX_DELAY_MS milisegundos o cada MAX_BATCH votos.
+# TIMEOUT es cuántos segundos espera cada petición a que se guarde su voto.
+POLLS_VOTE_WRITER = {
+    'ENABLED': False,
+    'MAX_BATCH': 200,
+    'MAX_DELAY_MS': 20,
+    'TIMEOUT': 5,
+}
+
+# Caché de Django
+# Tiene que ser compartida por todos los procesos (gunicorn/uvicorn con
+# varios trabajadores): las versiones de resultados viven aquí. Un
+# directorio en disco sirve para un servidor; con varios servidores usa
+# Redis o Memcached. locmem (una caché por proceso) solo sirve con un único
+# proceso y `manage.py check --deploy` avisa.
+# TIMEOUT None: las claves de versión no deben vencer (cada uso de la caché
+# en polls pasa su propio timeout). MAX_ENTRIES alto para que la limpieza
+# al llenarse no borre versiones al azar.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+# Caché de resultados en vivo (polls/results_cache.py)
+# ALIAS es la caché de CACHES que se usa; TIMEOUT, cuántos segundos
+# se guarda cada versión de los resultados ya serializados
+POLLS_RESULTS_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+}
+
+# Resultados en vivo por Server-Sent Events (polls/live.py)
+# HEARTBEAT_SECONDS: cada cuánto se revisa la versión y se mantiene viva la conexión
+# MAX_SECONDS: duración máxima de cada stream (el navegador se reconecta solo)
+# RETRY_MS: cuánto espera el navegador antes de reconectarse
+# LONG_POLL_SECONDS: cuánto puede esperar /<id>/live-results/?since=<versión>
+# BATCH_MAX_IDS: máximo de preguntas por petición a /live-results/?ids=1,2,3
+POLLS_LIVE_STREAM = {
+    'HEARTBEAT_SECONDS': 15,
+    'MAX_SECONDS': 300,
+    'RETRY_MS': 3000,
+    'LONG_POLL_SECONDS': 25,
+    'BATCH_MAX_IDS': 50,
+}
+
+# Paginación por cursor de la lista de encuestas (polls/pagination.py)
+# PER_PAGE: encuestas por página
+# COUNT_TIMEOUT: segundos que se guarda en caché el total de encuestas
+POLLS_PAGINATION = {
+    'PER_PAGE': 5,
+    'COUNT_TIMEOUT': 60,
+}
+
+# Filtro en memoria de "¿ya votó?" (polls/voter_filter.py)
+# Un filtro de Bloom por pregunta evita consultar la base de datos cuando
+# el visitante seguro no votó. FALSE_POSITIVE_RATE es la tasa de "quizás"
+# equivocados (que solo cuestan la consulta de siempre), MEMORY_BYTES el
+# límite de memoria por proceso e IDLE_SECONDS cuándo se descarta el filtro
+# de una pregunta que nadie visita.
+POLLS_VOTER_FILTER = {
+    'ENABLED': True,
+    'FALSE_POSITIVE_RATE': 0.01,
+    'MEMORY_BYTES': 16 * 1024 * 1024,
+    'IDLE_SECONDS': 600,
+    'REFRESH_SECONDS': 1,
+}
+
+# Identidad del votante (polls/voter_identity.py)
+# Para buscar votos y evitar duplicados la IP se guarda como una clave de
+# 16 bytes (Vote.voter_key). 'packed' es la IP empaquetada; 'hash' es un HMAC
+# con SALT (o SECRET_KEY) que no permite recuperar la IP; en ese modo la IP
+# tampoco se guarda en texto (Vote.voter_ip queda vacío) ni se exporta.
+# Si se cambia con votos guardados, recalcular las claves con
+# voter_identity.rekey_votes() (al pasar a 'hash' borra las IPs guardadas).
+POLLS_VOTER_IDENTITY = {
+    'MODE': 'packed',
+    'SALT': None,
+}
+
+# Archivo de votos de encuestas cerradas (polls/vote_archive.py)
+# python manage.py archive_votes pasa los votos de las encuestas inactivas o
+# publicadas hace más de AFTER_DAYS días a un archivo por columnas en
+# DIRECTORY y borra sus filas de Vote de a BATCH_SIZE.
+POLLS_VOTE_ARCHIVE = {
+    'DIRECTORY': BASE_DIR / 'vote_archive',
+    'AFTER_DAYS': 90,
+    'BATCH_SIZE': 5000,
+}
+
+# Evolución de los votos en el tiempo (polls/rollups.py)
+# Cada voto suma a una fila por minuto, hora y día (GRANULARITIES) que lee
+# /<id>/timeline/. Los votos confirmados se juntan en memoria y se escriben
+# cada FLUSH_SECONDS (un UPDATE por fila, no por voto); 0 = al confirmar.
+# Recalcular desde los votos: python manage.py rebuild_vote_rollups
+POLLS_TIMELINE = {
+    'GRANULARITIES': ['minute', 'hour', 'day'],
+    'MAX_BUCKETS': 1500,
+    'FLUSH_SECONDS': 1.0,
+}
+
+# Exportación de votos (polls/export.py)
+# /<id>/export.csv, /<id>/export.ndjson y las acciones del admin mandan los
+# votos por partes, leyendo CHUNK_SIZE filas por tanda.
+POLLS_EXPORT = {
+    'CHUNK_SIZE': 2000,
+}
+
+# Perfilado por petición (polls/middleware.py)
+# Con ENABLED, las peticiones muestreadas (SAMPLE_RATE) llevan la cabecera
+# Server-Timing con el tiempo total, de SQL, de plantillas y de Python, y las
+# que tardan más de SLOW_MS milisegundos se registran en el log 'polls.middleware'.
+# Desactivado, Django quita el middleware al arrancar y no cuesta nada.
+# Server-Timing muestra detalles internos: en producción, mejor muestrear poco
+# o dejar SERVER_TIMING en False y usar solo el log
+POLLS_PROFILING = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 1.0,
+    'SERVER_TIMING': True,
+    'SLOW_MS': 500,
+}
+
+# Métricas para Prometheus en /metrics (polls/metrics.py)
+# Cada proceso escribe sus métricas en un archivo propio de DIRECTORY (mmap)
+# y /metrics suma los de todos: vaciar DIRECTORY al arrancar el servidor
+# (metrics.reset()). BUCKETS son los límites en segundos del histograma de
+# latencia; ALLOWED_IPS, las IPs que pueden leer /metrics (None = todas)
+POLLS_METRICS = {
+    'ENABLED': False,
+    'DIRECTORY': BASE_DIR / 'metrics',
+    'BUCKETS': [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+    'ALLOWED_IPS': None,
+}
+
+# Registro de consultas lentas (polls/slow_queries.py)
+# Con ENABLED, cada consulta que tarda más de THRESHOLD_MS se anota en LOG_FILE
+# (rotativo: MAX_BYTES y BACKUP_COUNT) con sus parámetros, la vista, la pila y
+# su plan (EXPLAIN). Ver las que más tiempo suman: python manage.py slow_queries
+# Pensado para una máquina de pruebas: con varios procesos escribiendo el
+# mismo archivo, al rotar se pueden perder algunos renglones
+POLLS_SLOW_QUERIES = {
+    'ENABLED': False,
+    'THRESHOLD_MS': 100,
+    'LOG_FILE': BASE_DIR / 'slow_queries.log',
+    'MAX_BYTES': 5 * 1024 * 1024,
+    'BACKUP_COUNT': 3,
+    'EXPLAIN': True,
+    'LOG_PARAMS': True,
+    'STACK_DEPTH': 5,
+}
+
+# Vistas async (polls/async_views.py)
+# Con True, detail, vote y live-results usan las vistas async con el ORM async.
+# Activarlo solo con el servidor ASGI (encuestas_project/asgi.py): con WSGI cada
+# petición async pasa por async_to_sync, con un event loop nuevo, y rinde menos.
+# El long polling de live-results (?since=) solo espera con las vistas async.
+# Se lee al cargar polls/urls.py. Comparar ambas: python manage.py bench_async_views
+POLLS_ASYNC_VIEWS = False
+
 # =============================================================================
 # CONFIGURACIÓN FINAL
 # =============================================================================
@@ -0,0 +1,16 @@
+"""
+URLs del proyecto con las vistas síncronas de polls, sin importar POLLS_ASYNC_VIEWS.
+
+Las usan las pruebas y bench_async_views con override_settings(ROOT_URLCONF=...)
+para comparar las dos versiones en el mismo proceso (ver polls.urls.get_urlpatterns).
+"""
+
+from django.contrib import admin
+from django.urls import include, path
+
+from polls import urls as polls_urls
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('', include((polls_urls.get_urlpatterns(use_async=False), polls_urls.app_name))),
+]
@@ -6,10 +6,12 @@ Aquí configuramos cómo se ven y comportan nuestros modelos en el admin.
 """
 
 from django.contrib import admin
-from django.utils.html import format_html
-from django.urls import reverse
+from django.utils.html import format_html, format_html_join
 from django.utils.safestring import mark_safe
 from .models import Question, Choice, Vote
+from .results import tally_question
+from . import export, live
+from .voter_identity import voter_key
 
 
 class ChoiceInline(admin.TabularInline):
@@ -69,6 +71,10 @@ class QuestionAdmin(admin.ModelAdmin):
     # Campos que se pueden editar directamente desde la lista (sin entrar al detalle)
     list_editable = ['is_active']
     
+    # Acciones para descargar los votos de las preguntas elegidas
+    # (se envían por partes, sin cargar todos los votos en memoria)
+    actions = ['export_votes_csv', 'export_votes_ndjson', 'export_totals_csv']
+    
     # Organización de campos en la página de edición
     fieldsets = [
         (
@@ -85,13 +91,21 @@ class QuestionAdmin(admin.ModelAdmin):
                 'description': 'Cuándo y quién publicó esta encuesta'
             }
         ),
+        (
+            'Resultados',
+            {
+                'fields': ['results_display', 'counter_shards'],
+                'classes': ['collapse'],
+                'description': 'Sube los fragmentos del contador solo para encuestas con muchos votos simultáneos'
+            }
+        ),
     ]
     
     # Incluir las opciones como inline (editar opciones desde la página de la pregunta)
     inlines = [ChoiceInline]
     
     # Campos de solo lectura (no se pueden editar)
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['created_at', 'updated_at', 'results_display']
     
     # Ordenamiento por defecto en la lista
     ordering = ['-pub_date']
@@ -121,7 +135,44 @@ class QuestionAdmin(admin.ModelAdmin):
             return format_html('<span style="color: #28a745;"><strong>{} votos</strong></span>', total)
     
     total_votes_display.short_description = 'Total de Votos'
-    total_votes_display.admin_order_field = 'vote_count'  # Permite ordenar por este campo
+    
+    def results_display(self, obj):
+        """
+        Muestra los votos y porcentajes de cada opción en la página de edición.
+        
+        Usa el módulo results, que calcula todo con una sola consulta.
+        """
+        if not obj.pk:
+            return '-'
+        question_results = tally_question(obj.pk)
+        if not question_results.choices:
+            return format_html('<span style="color: #999;">Sin opciones</span>')
+        return format_html_join(
+            mark_safe('<br>'),
+            '{}: <strong>{}</strong> votos ({:.1f}%)',
+            (
+                (choice.choice_text, choice.votes, choice.percentage)
+                for choice in question_results.choices
+            ),
+        )
+    
+    results_display.short_description = 'Resultados por opción'
+    total_votes_display.admin_order_field = 'votes'  # Permite ordenar por este campo
+    
+    @admin.action(description='Exportar votos (CSV)')
+    def export_votes_csv(self, request, queryset):
+        """Descarga un renglón por voto de las preguntas elegidas (ver export.py)."""
+        return export.stream_export(queryset.order_by('pk'), 'csv', 'votes')
+    
+    @admin.action(description='Exportar votos (NDJSON)')
+    def export_votes_ndjson(self, request, queryset):
+        """Descarga un objeto JSON por voto de las preguntas elegidas."""
+        return export.stream_export(queryset.order_by('pk'), 'ndjson', 'votes')
+    
+    @admin.action(description='Exportar totales por opción (CSV)')
+    def export_totals_csv(self, request, queryset):
+        """Descarga un renglón por opción con sus votos y porcentaje."""
+        return export.stream_export(queryset.order_by('pk'), 'csv', 'totals')
     
     def get_queryset(self, request):
         """
@@ -130,8 +181,9 @@ class QuestionAdmin(admin.ModelAdmin):
         Esto evita consultas adicionales a la base de datos al mostrar la lista.
         """
         qs = super().get_queryset(request)
-        # Precargar las relaciones relacionadas para evitar consultas N+1
-        return qs.select_related('created_by').prefetch_related('choice_set__vote_set')
+        # El total de votos se lee de Question.votes, así que no hace falta
+        # precargar los votos; solo el creador para evitar consultas N+1
+        return qs.select_related('created_by')
     
     def save_model(self, request, obj, form, change):
         """
@@ -143,6 +195,23 @@ class QuestionAdmin(admin.ModelAdmin):
             if not obj.created_by:
                 obj.created_by = request.user
         super().save_model(request, obj, form, change)
+        
+        # Si se quitaron los fragmentos del contador, pasar sus votos a las opciones
+        if change and 'counter_shards' in form.changed_data and obj.counter_shards <= 1:
+            obj.compact_counters()
+        
+        # El texto de la pregunta va dentro de los resultados en caché
+        if change:
+            live.results_changed(obj.pk)
+    
+    def save_related(self, request, form, formsets, change):
+        """
+        Avisa que cambiaron los resultados (las opciones borradas desde el
+        inline ya recuentan su pregunta, ver signals.py).
+        """
+        super().save_related(request, form, formsets, change)
+        # Las opciones pudieron cambiar de texto o agregarse
+        live.results_changed(form.instance.pk)
 
 
 @admin.register(Choice)
@@ -178,6 +247,9 @@ class ChoiceAdmin(admin.ModelAdmin):
     # Ordenamiento por defecto
     ordering = ['question', 'id']
     
+    # vote_percentage() necesita la pregunta de cada opción
+    list_select_related = ['question']
+    
     def vote_count_display(self, obj):
         """Muestra el número de votos para esta opción."""
         count = obj.vote_count()
@@ -217,14 +289,14 @@ class VoteAdmin(admin.ModelAdmin):
     # Campos por los que se puede filtrar
     list_filter = [
         'voted_at',
-        'choice__question',
+        'question',
         'user',
     ]
     
     # Campo de búsqueda
     search_fields = [
         'choice__choice_text', 
-        'choice__question__question_text',
+        'question__question_text',
         'user__username',
         'voter_ip'
     ]
@@ -250,6 +322,23 @@ class VoteAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return True
     
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Si lo que se busca es una IP, busca también por su clave binaria.
+        
+        Así se encuentra el voto aunque la IP esté escrita de otra forma
+        (por ejemplo una IPv6 abreviada), usando el índice de voter_key.
+        La búsqueda por clave parte del queryset recibido, así respeta los
+        filtros activos de la lista (list_filter, date_hierarchy).
+        """
+        filtered = queryset
+        queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        try:
+            key = voter_key(search_term.strip())
+        except ValueError:
+            return queryset, may_have_duplicates
+        return queryset | filtered.filter(voter_key=key), may_have_duplicates
+    
     def get_question_text(self, obj):
         """Obtiene el texto de la pregunta para mostrar en la lista."""
         question_text = obj.choice.question.question_text
@@ -269,7 +358,7 @@ class VoteAdmin(admin.ModelAdmin):
         else:
             return format_html(
                 '<span style="color: #6c757d;">IP: {}</span>', 
-                obj.voter_ip
+                obj.voter_ip or 'oculta'
             )
     
     get_voter_info.short_description = 'Votante'
@@ -47,11 +47,17 @@ class PollsConfig(AppConfig):
         - Registrar tareas programadas
         - Inicializar configuraciones especiales
         
-        Por ahora no necesitamos nada especial, pero es bueno saber que existe.
+        Importamos checks.py para registrar sus verificaciones,
+        signals.py para conectar sus receptores y, si está
+        activado, enganchamos el registro de consultas lentas (también
+        mide las consultas de los comandos de gestión).
         """
-        # Aquí podrías importar señales u otras configuraciones
-        # Por ejemplo: from . import signals
-        pass
+        from . import checks  # noqa: F401
+        from . import signals  # noqa: F401
+        from . import slow_queries
+        
+        if slow_queries.get_config()['ENABLED']:
+            slow_queries.install()
 
 """
 NOTAS IMPORTANTES PARA PRINCIPIANTES:
@@ -0,0 +1,351 @@
+"""
+Vistas asíncronas de la aplicación de encuestas.
+
+Estas vistas están pensadas para el servidor ASGI (encuestas_project/asgi.py).
+Las conexiones que esperan cambios (Server-Sent Events y long polling) quedan
+"estacionadas" en el event loop sin ocupar un hilo cada una.
+
+`detail`, `vote` y `live_results_api` son las versiones async de las vistas
+de views.py: hacen las consultas con el ORM async (aget, afirst, acreate...)
+en lugar de pasar toda la vista por el pool de hilos de sync_to_async. Con
+POLLS_ASYNC_VIEWS en settings.py se elige cuáles usa polls/urls.py (ver
+get_urlpatterns).
+"""
+
+from django.contrib import messages
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError
+from django.http import (
+    Http404, HttpResponse, HttpResponseNotAllowed, HttpResponseNotModified, HttpResponseRedirect,
+    JsonResponse, StreamingHttpResponse,
+)
+from django.shortcuts import render
+from django.urls import reverse
+from asgiref.sync import sync_to_async
+import asyncio
+
+from .models import Question, Choice, Vote
+from .views import (
+    build_live_results_payload, etag_matches, find_voter_vote, get_client_ip, no_change_response,
+    parse_since, results_etag,
+)
+from . import live, metrics, results_cache, vote_writer
+from .voter_filter import voter_filters
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    """
+    Versión async de get_object_or_404 (Django 4.2 todavía no la trae).
+    
+    Args:
+        queryset: Modelo o QuerySet donde buscar
+        **kwargs: Filtros de la búsqueda
+    """
+    if not hasattr(queryset, 'aget'):
+        queryset = queryset._default_manager.all()
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f"No existe {queryset.model._meta.verbose_name} con esos datos.")
+
+
+async def aget_user(request):
+    """
+    Devuelve el usuario autenticado de la petición, o None si es anónimo.
+    
+    `request.user` se carga de forma perezosa desde la sesión (consulta la base
+    de datos), así que hay que resolverlo fuera del event loop. Después queda
+    en memoria y las plantillas pueden usarlo sin problema.
+    """
+    def resolve():
+        return request.user if request.user.is_authenticated else None
+    return await sync_to_async(resolve)()
+
+
+async def arender(request, template_name, context, status=None):
+    """
+    Renderiza una plantilla desde una vista async.
+    
+    Los context processors (usuario, mensajes) pueden leer la sesión de la
+    base de datos, por eso el render se hace en un hilo.
+    """
+    return await sync_to_async(render)(request, template_name, context, status=status)
+
+
+async def detail(request, question_id):
+    """
+    Versión async de views.detail: detalles de una encuesta para votar.
+    
+    Args:
+        request: Objeto HttpRequest de Django
+        question_id: ID de la pregunta a mostrar
+        
+    Returns:
+        HttpResponse: Página HTML con los detalles de la encuesta
+    """
+    question = await aget_object_or_404(
+        Question.objects.select_related('created_by').prefetch_related('choice_set'),
+        pk=question_id,
+        is_active=True
+    )
+    
+    # Buscar el voto del usuario (por IP o por cuenta) con una sola consulta,
+    # salvo que el filtro en memoria sepa que no votó (ver voter_filter.py)
+    user = await aget_user(request)
+    client_ip = get_client_ip(request)
+    existing_vote = None
+    if await sync_to_async(voter_filters.might_have_voted)(question.id, client_ip, user.pk if user else None):
+        existing_vote = await find_voter_vote(question, client_ip, user).afirst()
+    
+    context = {
+        'question': question,
+        'user_has_voted': existing_vote is not None,
+        'user_vote_choice': existing_vote.choice if existing_vote else None,
+        'total_votes': await sync_to_async(question.total_votes)(),
+    }
+    
+    return await arender(request, 'polls/detail_simple.html', context)
+
+
+async def vote(request, question_id):
+    """
+    Versión async de views.vote: procesa el voto de un usuario.
+    
+    Con POLLS_VOTE_WRITER activado se espera el Future del escritor por lotes
+    con `await`, así la petición no ocupa un hilo mientras espera el lote.
+    
+    Args:
+        request: Objeto HttpRequest de Django
+        question_id: ID de la pregunta en la que se vota
+        
+    Returns:
+        HttpResponseRedirect: Redirección a la página de resultados o error
+    """
+    # En Django 4.2 @require_POST no sabe envolver vistas async
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    
+    question = await aget_object_or_404(Question, pk=question_id, is_active=True)
+    results_url = reverse('polls:results', args=(question.id,))
+    
+    try:
+        choice_id = request.POST['choice']
+        selected_choice = await question.choice_set.aget(pk=choice_id)
+    except (KeyError, Choice.DoesNotExist):
+        messages.error(request, 'Por favor selecciona una opción válida.')
+        return await arender(request, 'polls/detail_simple.html', {
+            'question': question,
+            'error_message': "No seleccionaste una opción.",
+        })
+    
+    client_ip = get_client_ip(request)
+    if client_ip is None:
+        # Sin IP no se puede impedir que vote dos veces
+        return await arender(request, 'polls/detail_simple.html', {
+            'question': question,
+            'error_message': "No pudimos identificar tu conexión para registrar el voto.",
+        }, status=400)
+    user = await aget_user(request)
+    
+    try:
+        if vote_writer.is_enabled():
+            new_vote = Vote(choice=selected_choice, voter_ip=client_ip, user=user)
+            future = vote_writer.get_vote_writer().submit(new_vote)
+            try:
+                # shield: si se agota el tiempo no se cancela el Future del escritor
+                await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(future)),
+                    timeout=vote_writer.get_config()['TIMEOUT'],
+                )
+            except vote_writer.DuplicateVote:
+                metrics.inc('polls_votes_total', result='duplicate')
+                messages.warning(request, 'Ya has votado en esta encuesta.')
+                return HttpResponseRedirect(results_url)
+        else:
+            # Vote.save() ya hace el INSERT y los contadores en una transacción;
+            # si choca con una restricción única, el votante ya había votado
+            try:
+                await Vote.objects.acreate(choice=selected_choice, voter_ip=client_ip, user=user)
+            except IntegrityError:
+                metrics.inc('polls_votes_total', result='duplicate')
+                messages.warning(request, 'Ya has votado en esta encuesta.')
+                return HttpResponseRedirect(results_url)
+        
+        metrics.inc('polls_votes_total', result='accepted')
+        messages.success(request, f'¡Gracias por votar! Tu voto por "{selected_choice.choice_text}" ha sido registrado.')
+        return HttpResponseRedirect(results_url)
+        
+    except Exception:
+        metrics.inc('polls_votes_total', result='error')
+        messages.error(request, 'Hubo un error al procesar tu voto. Por favor inténtalo de nuevo.')
+        return await arender(request, 'polls/detail.html', {
+            'question': question,
+            'error_message': "Hubo un error al procesar tu voto.",
+        })
+
+
+# Cálculos de resultados en curso dentro de este proceso, por (event loop,
+# pregunta, versión). Si muchas conexiones en vivo se despiertan por el mismo
+# voto, solo una recalcula y las demás esperan ese mismo resultado. El loop va
+# en la clave porque una tarea solo se puede esperar desde su propio loop: con
+# WSGI, async_to_sync corre cada petición en un loop nuevo en su hilo.
+_payload_builds = {}
+
+
+async def _abuild_live_results_payload(question_id, version):
+    question = await Question.objects.aget(pk=question_id)
+    payload = await sync_to_async(build_live_results_payload)(question, version)
+    await results_cache.aset_payload(question_id, version, payload)
+    return payload
+
+
+async def aget_live_results_payload(question_id, version):
+    """
+    Devuelve el JSON de los resultados de una versión, desde la caché o calculándolo.
+    
+    Args:
+        question_id (int): ID de la pregunta
+        version (int): Versión de los resultados
+        
+    Returns:
+        bytes: Resultados en formato JSON
+    """
+    payload = await results_cache.aget_payload(question_id, version)
+    if payload is not None:
+        return payload
+    
+    key = (asyncio.get_running_loop(), question_id, version)
+    build = _payload_builds.get(key)
+    if build is None:
+        build = asyncio.ensure_future(_abuild_live_results_payload(question_id, version))
+        _payload_builds[key] = build
+        build.add_done_callback(lambda _: _payload_builds.pop(key, None))
+    return await asyncio.shield(build)
+
+
+async def live_results_events(question_id, last_version=None):
+    """
+    Generador de eventos Server-Sent Events con los resultados de una pregunta.
+    
+    Manda un evento `results` al conectarse y luego solo cuando cambia la
+    versión de los resultados. Entre cambios manda un comentario cada
+    HEARTBEAT_SECONDS y termina después de MAX_SECONDS (el navegador se
+    reconecta solo y manda Last-Event-ID).
+    """
+    config = live.get_config()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + config['MAX_SECONDS']
+    subscription = live.broadcaster.subscribe(question_id)
+    try:
+        yield f"retry: {config['RETRY_MS']}\n\n"
+        while True:
+            version = await results_cache.aget_version(question_id)
+            if version != last_version:
+                payload = await aget_live_results_payload(question_id, version)
+                yield f"id: {version}\nevent: results\ndata: {payload.decode()}\n\n"
+                last_version = version
+            
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            changed = await subscription.wait(min(config['HEARTBEAT_SECONDS'], remaining))
+            if not changed:
+                yield ": keepalive\n\n"
+    finally:
+        live.broadcaster.unsubscribe(subscription)
+
+
+async def live_results_stream(request, question_id):
+    """
+    Endpoint Server-Sent Events con los resultados en tiempo real.
+    
+    En lugar de preguntar cada 5 segundos, el navegador abre una conexión con
+    EventSource y recibe un evento cada vez que cambian los resultados.
+    Solo funciona con el servidor ASGI (encuestas_project/asgi.py); con WSGI
+    responde 501 y la página vuelve a preguntar periódicamente.
+    
+    Args:
+        request: Objeto HttpRequest de Django
+        question_id: ID de la pregunta
+        
+    Returns:
+        StreamingHttpResponse: Flujo text/event-stream
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(
+            'El stream de resultados necesita el servidor ASGI.',
+            status=501,
+            content_type='text/plain; charset=utf-8',
+        )
+    
+    if not await Question.objects.filter(pk=question_id).aexists():
+        raise Http404("No existe la pregunta.")
+    
+    # Si el navegador se reconecta con la última versión que ya tiene,
+    # no hace falta mandarle los mismos resultados otra vez
+    last_version = None
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    if last_event_id.isdigit():
+        last_version = int(last_event_id)
+    
+    response = StreamingHttpResponse(
+        live_results_events(question_id, last_version),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Evita que un proxy (por ejemplo Nginx) acumule los eventos
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def live_results_api(request, question_id):
+    """
+    API de resultados en tiempo real (versión async, con long polling).
+    
+    Sin parámetros se comporta igual que views.live_results_api (JSON con
+    ETag y 304). Con `?since=<versión>` la petición queda abierta hasta que
+    la versión de los resultados sea distinta de la que tiene el cliente, o
+    hasta que pase el tiempo límite (LONG_POLL_SECONDS o `?timeout=` si es
+    menor). Si cambió, devuelve los resultados nuevos con su versión; si no,
+    una respuesta vacía 204 de "sin cambios".
+    
+    Args:
+        request: Objeto HttpRequest de Django
+        question_id: ID de la pregunta
+        
+    Returns:
+        HttpResponse: Resultados en formato JSON, 304 o 204
+    """
+    
+    try:
+        version = await results_cache.aget_version(question_id)
+        since = parse_since(request)
+        
+        if since is not None and since == version:
+            timeout = live.get_config()['LONG_POLL_SECONDS']
+            requested = request.GET.get('timeout', '')
+            if requested.isdigit():
+                timeout = min(timeout, int(requested))
+            version = await live.wait_for_change(question_id, since, timeout)
+            if version is None:
+                return no_change_response(question_id, since)
+        
+        etag = results_etag(question_id, version)
+        if etag_matches(request, etag):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+        
+        payload = await aget_live_results_payload(question_id, version)
+        
+        response = HttpResponse(payload, content_type='application/json')
+        response['ETag'] = etag
+        response['X-Results-Version'] = str(version)
+        response['Cache-Control'] = 'no-cache'
+        return response
+        
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
@@ -0,0 +1,188 @@
+"""
+Micro-benchmarks de los caminos más usados de la aplicación, con presupuesto de consultas.
+
+Cada caso mide una operación (un método del modelo o una vista a través
+del cliente de pruebas) sobre la encuesta con más votos del dataset:
+
+- total_votes, get_results: métodos de Question
+- index, detail, vote, results, live_results_api: vistas, con Client
+
+De cada caso se guarda el tiempo por llamada (media, p50, p99) y las
+consultas SQL por llamada. Las consultas se cuentan con
+connection.execute_wrapper, que no guarda el SQL y casi no agrega tiempo.
+
+QUERY_BUDGETS declara cuántas consultas puede hacer cada caso como
+máximo: si un cambio agrega una consulta por encuesta u opción (N+1), el
+caso se pasa de su presupuesto. Lo verifican la prueba QueryBudgetTest y
+el comando bench_polls --check.
+
+Uso (ver el comando bench_polls):
+    from polls import benchmarks
+
+    resultados = benchmarks.run(iterations=50)
+    excedidos = benchmarks.over_budget(resultados)
+"""
+
+import ipaddress
+import statistics
+import time
+
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Question
+
+# Consultas SQL máximas por llamada de cada caso, con las cachés ya llenas
+# (las tarjetas de index y los resultados en vivo salen de la caché)
+QUERY_BUDGETS = {
+    'total_votes': 0,
+    'get_results': 1,
+    'index': 1,
+    'detail': 2,
+    'vote': 7,
+    'results': 2,
+    'live_results_api': 0,
+}
+
+# Código de estado esperado de las vistas (el voto redirige a resultados)
+EXPECTED_STATUS = {
+    'index': 200,
+    'detail': 200,
+    'vote': 302,
+    'results': 200,
+    'live_results_api': 200,
+}
+
+# Sentencias de control de transacciones, que no se cuentan como consultas
+TRANSACTION_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+# Llamadas sin medir antes de cada caso (llenan cachés y el filtro de votantes)
+WARMUP = 3
+
+# IPs de los votos del caso vote: 172.16.0.0/12, fuera de las del dataset sintético
+FIRST_BENCH_IP = int(ipaddress.IPv4Address('172.16.0.1'))
+
+
+def percentile(values, percent):
+    """Percentil (0-100) de una lista de números, por el método del más cercano."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def bench_ip(number):
+    """IP distinta para cada voto del caso vote."""
+    return str(ipaddress.IPv4Address(FIRST_BENCH_IP + number))
+
+
+def target_question():
+    """La encuesta publicada, activa y sin archivar con más votos."""
+    return (
+        Question.objects.filter(is_active=True, pub_date__lte=timezone.now(), archived_at__isnull=True)
+        .order_by('-votes', 'pk')
+        .first()
+    )
+
+
+def build_cases(question):
+    """
+    Arma los casos a medir: {nombre: función(número de llamada)}.
+
+    Las vistas devuelven la respuesta, para comprobar su código de estado.
+    """
+    client = Client(raise_request_exception=True)
+    choice_id = question.choice_set.order_by('pk').values_list('pk', flat=True).first()
+    urls = {
+        name: reverse(f'polls:{name}', args=(question.pk,))
+        for name in ('detail', 'vote', 'results', 'live_results_api')
+    }
+    return {
+        'total_votes': lambda number: question.total_votes(),
+        'get_results': lambda number: question.get_results(),
+        'index': lambda number: client.get(reverse('polls:index')),
+        'detail': lambda number: client.get(urls['detail']),
+        'vote': lambda number: client.post(
+            urls['vote'], {'choice': choice_id}, headers={'x-forwarded-for': bench_ip(number)}
+        ),
+        'results': lambda number: client.get(urls['results']),
+        'live_results_api': lambda number: client.get(urls['live_results_api']),
+    }
+
+
+def measure(name, func, iterations, warmup=WARMUP):
+    """
+    Mide un caso: `warmup` llamadas sin medir y después `iterations` medidas.
+
+    Returns:
+        dict: Tiempos en milisegundos, consultas por llamada y presupuesto
+    """
+    queries = []
+
+    def count_query(execute, sql, params, many, context):
+        # Los SAVEPOINT no cuentan: dentro de una prueba (que ya abrió una
+        # transacción) cada atomic() los agrega y fuera de ella no
+        if not sql.startswith(TRANSACTION_STATEMENTS):
+            queries[-1] += 1
+        return execute(sql, params, many, context)
+
+    for number in range(warmup):
+        func(number)
+
+    timings = []
+    with connection.execute_wrapper(count_query):
+        for number in range(warmup, warmup + iterations):
+            queries.append(0)
+            started = time.perf_counter()
+            response = func(number)
+            timings.append(time.perf_counter() - started)
+            expected = EXPECTED_STATUS.get(name)
+            if expected is not None and response.status_code != expected:
+                raise AssertionError(f'{name}: se esperaba {expected} y se obtuvo {response.status_code}')
+
+    return {
+        'iterations': iterations,
+        'mean_ms': statistics.fmean(timings) * 1000,
+        'p50_ms': statistics.median(timings) * 1000,
+        'p99_ms': percentile(timings, 99) * 1000,
+        'queries': statistics.fmean(queries),
+        'max_queries': max(queries),
+        'budget': QUERY_BUDGETS.get(name),
+    }
+
+
+def run(iterations=50, cases=None, question=None):
+    """
+    Mide los casos sobre la encuesta con más votos (o `question`).
+
+    Args:
+        iterations (int): Llamadas medidas por caso
+        cases (list): Nombres de los casos a medir (por defecto, todos)
+        question (Question): Encuesta sobre la que se mide
+
+    Returns:
+        dict: {nombre del caso: resultado de measure()}
+    """
+    question = question or target_question()
+    if question is None:
+        raise ValueError('No hay encuestas activas para medir: carga datos primero')
+    available = build_cases(question)
+    return {
+        name: measure(name, available[name], iterations)
+        for name in (cases or available)
+    }
+
+
+def over_budget(results):
+    """
+    Casos que hicieron más consultas que su presupuesto en alguna llamada.
+
+    Returns:
+        list: Tuplas (nombre, máximo de consultas, presupuesto)
+    """
+    return [
+        (name, result['max_queries'], result['budget'])
+        for name, result in results.items()
+        if result['budget'] is not None and result['max_queries'] > result['budget']
+    ]
@@ -0,0 +1,34 @@
+"""
+Verificaciones del sistema para la aplicación polls.
+
+Django las ejecuta con `python manage.py check` (las marcadas con deploy=True,
+solo con `python manage.py check --deploy`).
+"""
+
+from django.core.checks import Tags, Warning, register
+
+from . import results_cache
+
+
+@register(Tags.caches, deploy=True)
+def check_results_cache_is_shared(app_configs, **kwargs):
+    """
+    Avisa si la caché de resultados es LocMemCache.
+
+    Cada proceso tendría su propia versión de los resultados: un voto solo
+    la sube en el proceso que lo recibió y los demás siguen entregando
+    resultados viejos (y el filtro de votantes no ve sus votos).
+    """
+    if not results_cache.is_process_local():
+        return []
+    return [
+        Warning(
+            'La caché de resultados (POLLS_RESULTS_CACHE) es LocMemCache, '
+            'que es propia de cada proceso.',
+            hint=(
+                'Con varios procesos usa una caché compartida: FileBasedCache '
+                'en un servidor, Redis o Memcached en varios.'
+            ),
+            id='polls.W001',
+        )
+    ]
@@ -0,0 +1,158 @@
+"""
+Exportación de votos y resultados en CSV o NDJSON, enviada por partes.
+
+Las filas se generan de a una y se mandan con StreamingHttpResponse a medida
+que salen de la base de datos (QuerySet.iterator con CHUNK_SIZE filas por
+tanda), así la memoria usada es la misma para una encuesta de diez votos
+que para una de millones.
+
+Hay dos tipos de exportación:
+- 'votes': un renglón por voto (opción, usuario, IP, fecha). En las
+  encuestas archivadas los votos salen del archivo (ver vote_archive.py),
+  sin usuario ni IP. En el modo 'hash' de voter_identity.py la columna
+  voter_ip no se exporta.
+- 'totals': un renglón por opción con sus votos y porcentaje.
+
+Configuración en settings.py:
+    POLLS_EXPORT = {
+        'CHUNK_SIZE': 2000,   # Filas por tanda al leer los votos
+    }
+"""
+
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from . import vote_archive, voter_identity
+from .models import Vote
+from .results import tally
+
+DEFAULTS = {
+    'CHUNK_SIZE': 2000,
+}
+
+VOTE_COLUMNS = ['question_id', 'vote_id', 'choice_id', 'choice_text', 'user', 'voter_ip', 'voted_at']
+TOTAL_COLUMNS = ['question_id', 'choice_id', 'choice_text', 'votes', 'percentage']
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Preguntas por consulta al exportar totales de muchas preguntas
+TOTALS_BATCH = 500
+
+
+def get_config():
+    """Devuelve la configuración de la exportación mezclada con los valores por defecto."""
+    return {**DEFAULTS, **getattr(settings, 'POLLS_EXPORT', {})}
+
+
+class Echo:
+    """
+    Objeto con write() que devuelve lo que recibe en lugar de guardarlo.
+
+    Permite usar csv.writer para armar cada renglón sin acumular el archivo.
+    """
+
+    def write(self, value):
+        return value
+
+
+def vote_columns():
+    """Columnas de la exportación de votos (sin voter_ip en modo 'hash')."""
+    if voter_identity.stores_ip():
+        return VOTE_COLUMNS
+    return [column for column in VOTE_COLUMNS if column != 'voter_ip']
+
+
+def vote_rows(questions):
+    """
+    Recorre los votos de las preguntas como tuplas en el orden de vote_columns().
+
+    Args:
+        questions: Iterable de Question
+    """
+    chunk_size = get_config()['CHUNK_SIZE']
+    ip_fields = ['voter_ip'] if voter_identity.stores_ip() else []
+    no_ip = (None,) * len(ip_fields)
+    for question in questions:
+        votes = Vote.objects.filter(question=question)
+        archive = vote_archive.open_archive(question.pk) if question.archived_at else None
+        if archive is not None:
+            choice_texts = dict(question.choice_set.values_list('id', 'choice_text'))
+            with archive:
+                votes = votes.filter(id__gt=archive.last_vote_id)
+                for choice_id, voted_at in archive.iter_votes():
+                    yield (question.pk, None, choice_id, choice_texts.get(choice_id, ''), None, *no_ip, voted_at)
+
+        rows = votes.order_by('id').values_list(
+            'id', 'choice_id', 'choice__choice_text', 'user__username', *ip_fields, 'voted_at'
+        )
+        for row in rows.iterator(chunk_size=chunk_size):
+            yield (question.pk, *row)
+
+
+def total_rows(questions):
+    """
+    Recorre los totales por opción como tuplas en el orden de TOTAL_COLUMNS.
+
+    Los totales salen de los contadores (ver results.tally), con una consulta
+    cada TOTALS_BATCH preguntas.
+    """
+    batch = []
+    for question in questions:
+        batch.append(question.pk)
+        if len(batch) == TOTALS_BATCH:
+            yield from _total_rows_for(batch)
+            batch = []
+    if batch:
+        yield from _total_rows_for(batch)
+
+
+def _total_rows_for(question_ids):
+    for question_id, question_results in tally(question_ids).items():
+        for choice in question_results.choices:
+            yield question_id, choice.id, choice.choice_text, choice.votes, round(choice.percentage, 2)
+
+
+def render_csv(columns, rows):
+    """Genera el CSV renglón por renglón (con BOM para que Excel lea bien los acentos)."""
+    writer = csv.writer(Echo())
+    yield '\ufeff' + writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(['' if value is None else value for value in row])
+
+
+def render_ndjson(columns, rows):
+    """Genera un objeto JSON por renglón."""
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def stream_export(questions, fmt, kind='votes', filename='encuestas'):
+    """
+    Arma la respuesta que envía la exportación por partes.
+
+    Args:
+        questions: Iterable de Question (se recorre recién al enviar)
+        fmt (str): 'csv' o 'ndjson'
+        kind (str): 'votes' (un renglón por voto) o 'totals' (uno por opción)
+        filename (str): Nombre del archivo descargado, sin extensión
+
+    Returns:
+        StreamingHttpResponse: La descarga
+    """
+    if kind == 'totals':
+        columns, rows = TOTAL_COLUMNS, total_rows(questions)
+    else:
+        columns, rows = vote_columns(), vote_rows(questions)
+    render = render_csv if fmt == 'csv' else render_ndjson
+
+    response = StreamingHttpResponse(render(columns, rows), content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}-{kind}.{fmt}"'
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,169 @@
+"""
+Avisos en vivo de cambios en los resultados.
+
+Cuando se confirma un voto se llama a `results_changed(question_id)`, que sube
+la versión de los resultados en caché (ver results_cache.py) y avisa a todos
+los suscriptores de esa pregunta en este proceso. Un solo aviso llega a todas
+las conexiones abiertas (Server-Sent Events o long polling) de la pregunta.
+
+Los votos que se guardan en otros procesos no generan aviso aquí; por eso los
+suscriptores también revisan la versión en caché cada cierto tiempo.
+"""
+
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+
+from . import results_cache
+
+DEFAULTS = {
+    'HEARTBEAT_SECONDS': 15,
+    'MAX_SECONDS': 300,
+    'RETRY_MS': 3000,
+    'LONG_POLL_SECONDS': 25,
+    'BATCH_MAX_IDS': 50,
+}
+
+
+def get_config():
+    """
+    Devuelve la configuración de las conexiones en vivo (POLLS_LIVE_STREAM).
+
+    - HEARTBEAT_SECONDS: cada cuánto se revisa la versión en caché y se manda
+      un comentario para mantener viva la conexión
+    - MAX_SECONDS: duración máxima de un stream; el navegador se reconecta solo
+    - RETRY_MS: cuánto espera EventSource antes de reconectarse
+    - LONG_POLL_SECONDS: cuánto puede quedar abierta una petición con ?since=
+    - BATCH_MAX_IDS: máximo de preguntas por petición a /live-results/?ids=
+    """
+    return {**DEFAULTS, **getattr(settings, 'POLLS_LIVE_STREAM', {})}
+
+
+class Subscription:
+    """
+    Suscripción de una conexión a los cambios de una pregunta.
+
+    Se crea y se espera desde el event loop; los avisos pueden venir de
+    cualquier hilo (ver ResultsBroadcaster.publish).
+    """
+
+    def __init__(self, question_id, loop):
+        self.question_id = question_id
+        self.loop = loop
+        self.version = None
+        self._event = asyncio.Event()
+
+    def notify(self, version):
+        """Marca que hubo un cambio (se ejecuta dentro del event loop)."""
+        if self.version is None or version > self.version:
+            self.version = version
+        self._event.set()
+
+    async def wait(self, timeout):
+        """
+        Espera hasta que llegue un aviso o pase `timeout` segundos.
+
+        Returns:
+            bool: True si llegó un aviso, False si se agotó el tiempo
+        """
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._event.clear()
+        return True
+
+
+class ResultsBroadcaster:
+    """
+    Reparte los avisos de cambio entre los suscriptores de cada pregunta.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, question_id):
+        """Crea una suscripción (debe llamarse desde el event loop)."""
+        subscription = Subscription(question_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers[question_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Quita una suscripción."""
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.question_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.question_id]
+
+    def subscriber_count(self, question_id):
+        """Número de suscriptores de una pregunta en este proceso."""
+        with self._lock:
+            return len(self._subscribers.get(question_id, ()))
+
+    def publish(self, question_id, version):
+        """
+        Avisa a todos los suscriptores de la pregunta. Se puede llamar desde cualquier hilo.
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.get(question_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.notify, version)
+            except RuntimeError:
+                # El event loop de esa conexión ya se cerró
+                self.unsubscribe(subscription)
+
+
+broadcaster = ResultsBroadcaster()
+
+
+def results_changed(question_id):
+    """
+    Sube la versión de los resultados de una pregunta y avisa a los suscriptores.
+
+    Returns:
+        int: La nueva versión
+    """
+    version = results_cache.bump_version(question_id)
+    broadcaster.publish(question_id, version)
+    return version
+
+
+async def wait_for_change(question_id, since, timeout):
+    """
+    Espera (sin ocupar un hilo) a que la versión de una pregunta cambie.
+
+    Se compara con "distinta de" y no con "mayor que": si la caché perdió la
+    versión y empezó otra, el cliente igual recibe los resultados nuevos.
+
+    Args:
+        question_id (int): ID de la pregunta
+        since (int): Versión que ya tiene el cliente
+        timeout (float): Segundos máximos de espera
+
+    Returns:
+        int | None: La nueva versión, o None si no cambió a tiempo
+    """
+    heartbeat = get_config()['HEARTBEAT_SECONDS']
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    subscription = broadcaster.subscribe(question_id)
+    try:
+        while True:
+            version = await results_cache.aget_version(question_id)
+            if version != since:
+                return version
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            # Además del aviso en proceso, revisar la caché cada `heartbeat`
+            # segundos por si el voto se guardó en otro proceso
+            await subscription.wait(min(heartbeat, remaining))
+    finally:
+        broadcaster.unsubscribe(subscription)
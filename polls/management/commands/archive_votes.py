@@ -0,0 +1,84 @@
+"""
+Comando para archivar los votos de encuestas cerradas o viejas.
+
+Pasa los votos de cada encuesta elegida a un archivo por columnas (ver
+polls/vote_archive.py), deja los totales finales en los contadores y
+borra las filas de Vote por lotes. La encuesta queda cerrada
+(is_active=False). Los resultados se siguen viendo igual.
+
+Se eligen las encuestas inactivas y las publicadas hace más de
+POLLS_VOTE_ARCHIVE['AFTER_DAYS'] días (o --days).
+
+Uso:
+    python manage.py archive_votes
+    python manage.py archive_votes --days 30 --dry-run
+    python manage.py archive_votes --question 5
+"""
+
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from polls import vote_archive
+from polls.models import Question, Vote
+
+
+class Command(BaseCommand):
+    """
+    Archiva los votos de las encuestas inactivas o viejas.
+    """
+
+    help = 'Pasa los votos de encuestas cerradas a archivos por columnas y borra sus filas'
+
+    def add_arguments(self, parser):
+        """
+        Agrega argumentos opcionales al comando.
+        """
+        parser.add_argument(
+            '--question',
+            type=int,
+            action='append',
+            help='ID de la pregunta a archivar (se puede repetir), aunque siga activa',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Archivar encuestas publicadas hace más de N días (por defecto AFTER_DAYS)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo mostrar qué encuestas se archivarían',
+        )
+
+    def handle(self, *args, **options):
+        """
+        Método principal que ejecuta el comando.
+        """
+        if options['question']:
+            questions = Question.objects.filter(pk__in=options['question'])
+        else:
+            days = options['days'] if options['days'] is not None else vote_archive.get_config()['AFTER_DAYS']
+            old = timezone.now() - datetime.timedelta(days=days)
+            questions = Question.objects.filter(Q(is_active=False) | Q(pub_date__lt=old))
+        # Las ya archivadas solo se vuelven a procesar si les quedaron filas sin borrar
+        questions = questions.filter(
+            Q(archived_at__isnull=True) | Q(pk__in=Vote.objects.values('question'))
+        )
+
+        archived_questions = 0
+        for question in questions.order_by('pk'):
+            if options['dry_run']:
+                self.stdout.write(f'🔎 "{question}": {question.votes} votos')
+                continue
+            archived, deleted = vote_archive.archive_question(question)
+            archived_questions += 1
+            self.stdout.write(f'✅ "{question}": {archived} votos archivados, {deleted} filas borradas')
+
+        if not options['dry_run']:
+            self.stdout.write(
+                self.style.SUCCESS(f'🎉 {archived_questions} pregunta(s) archivada(s)')
+            )
@@ -0,0 +1,186 @@
+"""
+Benchmark de las vistas síncronas (WSGI) contra las vistas async (ASGI).
+
+Crea una base de datos de prueba aparte (no toca db.sqlite3), carga una
+encuesta y hace las mismas peticiones a detail, live-results y vote:
+
+- sync: vistas de views.py con el cliente de pruebas (manejador WSGI),
+  repartidas entre varios hilos
+- async: vistas de async_views.py con el cliente async (manejador ASGI),
+  con varias peticiones a la vez en el event loop
+
+Para cada vista muestra peticiones por segundo y latencia p50 / p99.
+
+Uso:
+    python manage.py bench_async_views
+    python manage.py bench_async_views --requests 500 --concurrency 16
+"""
+
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from polls import rollups
+from polls.benchmarks import percentile
+from polls.models import Question, Choice
+
+# URLs con las vistas de cada modo (ver polls.urls.get_urlpatterns)
+URLCONFS = {
+    'sync': 'encuestas_project.urls_sync',
+    'async': 'encuestas_project.urls_async',
+}
+
+
+class Command(BaseCommand):
+    """
+    Compara las vistas síncronas y async con el cliente de pruebas en el mismo proceso.
+    """
+
+    help = 'Compara peticiones/s y latencia p99 de las vistas síncronas (WSGI) y async (ASGI)'
+
+    def add_arguments(self, parser):
+        """
+        Agrega argumentos opcionales al comando.
+        """
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Peticiones por vista y por modo (por defecto 200)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Peticiones simultáneas: hilos en modo sync, tareas en modo async',
+        )
+        parser.add_argument(
+            '--choices',
+            type=int,
+            default=4,
+            help='Opciones de la encuesta de prueba',
+        )
+
+    def handle(self, *args, **options):
+        """
+        Método principal que ejecuta el comando.
+        """
+        setup_test_environment()
+        test_db = None
+        if connection.vendor == 'sqlite':
+            # Con varios hilos, la base en memoria compartida falla con
+            # "database table is locked"; un archivo temporal respeta el timeout
+            test_db = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+            connection.settings_dict['TEST']['NAME'] = test_db
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            question = Question.objects.create(
+                question_text='¿Benchmark de vistas?',
+                pub_date=timezone.now(),
+            )
+            Choice.objects.bulk_create(
+                Choice(question=question, choice_text=f'Opción {number}')
+                for number in range(1, options['choices'] + 1)
+            )
+            choice_id = question.choice_set.values_list('id', flat=True).first()
+
+            rows = []
+            for mode in ('sync', 'async'):
+                with override_settings(ROOT_URLCONF=URLCONFS[mode]):
+                    for view, timings, errors in self.run_mode(mode, question.id, choice_id, options):
+                        rows.append((view, mode, timings, errors))
+        finally:
+            # Escribir los rollups pendientes mientras la base de prueba existe
+            rollups.buffer.flush()
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            if test_db:
+                os.rmdir(os.path.dirname(test_db))
+
+        self.stdout.write(f"{'Vista':<14}{'Modo':<7}{'pet/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errores':>9}")
+        for view, mode, (elapsed, latencies), errors in rows:
+            self.stdout.write(
+                f'{view:<14}{mode:<7}{len(latencies) / elapsed:>10.1f}'
+                f'{statistics.median(latencies) * 1000:>10.2f}'
+                f'{percentile(latencies, 99) * 1000:>10.2f}{errors:>9}'
+            )
+
+    def requests_for(self, question_id, choice_id, total):
+        """
+        Peticiones de cada vista: (nombre, método, URL, datos, IP, estado esperado).
+
+        Cada voto usa una IP distinta (X-Forwarded-For) para que todos se registren.
+        """
+        return {
+            'detail': [
+                ('get', reverse('polls:detail', args=(question_id,)), None, '10.0.0.1', 200)
+                for _ in range(total)
+            ],
+            'live_results': [
+                ('get', reverse('polls:live_results_api', args=(question_id,)), None, '10.0.0.1', 200)
+                for _ in range(total)
+            ],
+            'vote': [
+                ('post', reverse('polls:vote', args=(question_id,)), {'choice': choice_id},
+                 f'10.{number // 65536 % 256}.{number // 256 % 256}.{number % 256}', 302)
+                for number in range(total)
+            ],
+        }
+
+    def run_mode(self, mode, question_id, choice_id, options):
+        """Ejecuta todas las vistas en un modo y devuelve (vista, tiempos, errores)."""
+        # Cada modo vota con IPs distintas a las del otro modo
+        offset = 0 if mode == 'sync' else options['requests']
+        plan = self.requests_for(question_id, choice_id, options['requests'] + offset)
+        results = []
+        for view, requests in plan.items():
+            requests = requests[offset:]
+            if mode == 'sync':
+                timings, errors = self.run_sync(requests, options['concurrency'])
+            else:
+                timings, errors = asyncio.run(self.run_async(requests, options['concurrency']))
+            results.append((view, timings, errors))
+        return results
+
+    def run_sync(self, requests, concurrency):
+        """Hace las peticiones con Client (WSGI) desde `concurrency` hilos."""
+        def send(request):
+            method, url, data, ip, expected = request
+            client = Client(raise_request_exception=False)
+            started = time.perf_counter()
+            response = getattr(client, method)(url, data, headers={'x-forwarded-for': ip})
+            return time.perf_counter() - started, response.status_code != expected
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='bench') as executor:
+            outcomes = list(executor.map(send, requests))
+        elapsed = time.perf_counter() - started
+        return (elapsed, [latency for latency, _ in outcomes]), sum(failed for _, failed in outcomes)
+
+    async def run_async(self, requests, concurrency):
+        """Hace las peticiones con AsyncClient (ASGI), `concurrency` a la vez."""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send(request):
+            method, url, data, ip, expected = request
+            client = AsyncClient(raise_request_exception=False)
+            async with semaphore:
+                started = time.perf_counter()
+                response = await getattr(client, method)(url, data, headers={'x-forwarded-for': ip})
+                return time.perf_counter() - started, response.status_code != expected
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(send(request) for request in requests))
+        elapsed = time.perf_counter() - started
+        return (elapsed, [latency for latency, _ in outcomes]), sum(failed for _, failed in outcomes)
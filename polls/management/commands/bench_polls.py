@@ -0,0 +1,160 @@
+"""
+Micro-benchmarks de los caminos más usados, con presupuesto de consultas.
+
+Crea una base de datos de prueba aparte (no toca db.sqlite3), la llena con
+el generador sintético (ver polls/synthetic.py) y mide, sobre la encuesta
+con más votos, Question.total_votes, Question.get_results y las vistas
+index, detail, vote, results y live_results_api (ver polls/benchmarks.py).
+
+Para cada caso muestra el tiempo por llamada (media, p50, p99) y las
+consultas SQL por llamada. Los resultados se pueden guardar en JSON y
+comparar con una corrida anterior.
+
+Uso:
+    python manage.py bench_polls
+    python manage.py bench_polls --questions 2000 --votes 200000 --output antes.json
+    python manage.py bench_polls --compare antes.json
+    python manage.py bench_polls --check    # falla si una vista se pasa de su presupuesto
+"""
+
+import datetime
+import json
+import platform
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from polls import benchmarks, synthetic
+
+
+class Command(BaseCommand):
+    """
+    Mide los caminos más usados de la aplicación sobre un dataset sintético.
+    """
+
+    help = 'Mide tiempo y consultas por llamada de los caminos más usados (con presupuesto de consultas)'
+
+    def add_arguments(self, parser):
+        """
+        Agrega argumentos opcionales al comando.
+        """
+        parser.add_argument(
+            '--questions',
+            type=int,
+            default=200,
+            help='Preguntas del dataset (por defecto 200)',
+        )
+        parser.add_argument(
+            '--votes',
+            type=int,
+            default=20000,
+            help='Votos del dataset (por defecto 20000)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Semilla del dataset (la misma semilla da el mismo dataset)',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=50,
+            help='Llamadas medidas por caso (por defecto 50)',
+        )
+        parser.add_argument(
+            '--case',
+            choices=list(benchmarks.QUERY_BUDGETS),
+            action='append',
+            help='Caso a medir (se puede repetir). Por defecto, todos',
+        )
+        parser.add_argument(
+            '--output',
+            help='Guardar los resultados en este archivo JSON',
+        )
+        parser.add_argument(
+            '--compare',
+            help='Archivo JSON de una corrida anterior para mostrar las diferencias',
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Terminar con error si algún caso se pasa de su presupuesto de consultas',
+        )
+
+    def handle(self, *args, **options):
+        """
+        Método principal que ejecuta el comando.
+        """
+        previous = self.load(options['compare']) if options['compare'] else None
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            synthetic.generate(
+                options['questions'], votes=options['votes'], seed=options['seed'],
+                log=lambda message: self.stdout.write(f'📊 {message}'),
+            )
+            results = benchmarks.run(options['iterations'], options['case'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.report(results, previous)
+
+        if options['output']:
+            data = {
+                'meta': {
+                    'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                    'questions': options['questions'],
+                    'votes': options['votes'],
+                    'seed': options['seed'],
+                    'iterations': options['iterations'],
+                    'database': connection.vendor,
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                },
+                'results': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(data, file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"✅ Resultados guardados en {options['output']}"))
+
+        if options['check']:
+            exceeded = benchmarks.over_budget(results)
+            if exceeded:
+                raise CommandError('Presupuesto de consultas excedido: ' + ', '.join(
+                    f'{name} ({queries} > {budget})' for name, queries, budget in exceeded
+                ))
+            self.stdout.write(self.style.SUCCESS('🎉 Todos los casos dentro de su presupuesto de consultas'))
+
+    def load(self, path):
+        """Lee los resultados de una corrida anterior."""
+        try:
+            with open(path, encoding='utf-8') as file:
+                return json.load(file)['results']
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f'No se pueden leer los resultados de {path}: {exc}')
+
+    def report(self, results, previous=None):
+        """Muestra la tabla de resultados (y las diferencias con la corrida anterior)."""
+        header = f"{'Caso':<18}{'media ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'consultas':>11}{'presup.':>9}"
+        if previous:
+            header += f"{'Δ media':>10}{'Δ consultas':>13}"
+        self.stdout.write(header)
+
+        for name, result in results.items():
+            budget = '-' if result['budget'] is None else result['budget']
+            line = (
+                f"{name:<18}{result['mean_ms']:>10.3f}{result['p50_ms']:>10.3f}"
+                f"{result['p99_ms']:>10.3f}{result['queries']:>11.1f}{budget:>9}"
+            )
+            before = (previous or {}).get(name)
+            if before:
+                change = (result['mean_ms'] - before['mean_ms']) / before['mean_ms'] * 100 if before['mean_ms'] else 0
+                line += f"{change:>+9.1f}%{result['queries'] - before['queries']:>+13.1f}"
+            if result['budget'] is not None and result['max_queries'] > result['budget']:
+                line = self.style.ERROR(f'{line}  ⚠️  excede el presupuesto')
+            self.stdout.write(line)
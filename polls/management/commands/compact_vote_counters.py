@@ -0,0 +1,80 @@
+"""
+Comando para compactar los contadores de votos fragmentados.
+
+Las preguntas con counter_shards > 1 reparten sus votos en filas
+ChoiceCounterShard. Cuando baja el tráfico conviene pasar esos votos de
+vuelta a Choice.votes y Question.votes para que las lecturas sean más baratas.
+
+Uso:
+    python manage.py compact_vote_counters
+    python manage.py compact_vote_counters --idle-minutes 30
+    python manage.py compact_vote_counters --question 5 --reset-shards
+"""
+
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from polls.models import Question, Vote
+
+
+class Command(BaseCommand):
+    """
+    Compacta los fragmentos de contador de las preguntas que los tengan.
+    """
+
+    help = 'Pasa los votos de los contadores fragmentados a Choice.votes y Question.votes'
+
+    def add_arguments(self, parser):
+        """
+        Agrega argumentos opcionales al comando.
+        """
+        parser.add_argument(
+            '--question',
+            type=int,
+            action='append',
+            help='ID de la pregunta a compactar (se puede repetir). Por defecto, todas',
+        )
+        parser.add_argument(
+            '--idle-minutes',
+            type=int,
+            default=0,
+            help='Solo compactar preguntas sin votos en los últimos N minutos',
+        )
+        parser.add_argument(
+            '--reset-shards',
+            action='store_true',
+            help='Además, volver a counter_shards=1 en las preguntas compactadas',
+        )
+
+    def handle(self, *args, **options):
+        """
+        Método principal que ejecuta el comando.
+        """
+        questions = Question.objects.filter(choice__counter_shards__isnull=False).distinct()
+        if options['question']:
+            questions = questions.filter(pk__in=options['question'])
+
+        idle_since = None
+        if options['idle_minutes']:
+            idle_since = timezone.now() - datetime.timedelta(minutes=options['idle_minutes'])
+
+        compacted = 0
+        for question in questions:
+            if idle_since and Vote.objects.filter(
+                question=question, voted_at__gte=idle_since
+            ).exists():
+                self.stdout.write(f'⏭️  "{question}" sigue recibiendo votos, se omite')
+                continue
+
+            if options['reset_shards'] and question.counter_shards > 1:
+                # Primero dejar de escribir en fragmentos y luego compactar
+                Question.objects.filter(pk=question.pk).update(counter_shards=1)
+            moved = question.compact_counters()
+            compacted += 1
+            self.stdout.write(f'✅ "{question}": {moved} votos compactados')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'🎉 {compacted} pregunta(s) compactada(s)')
+        )
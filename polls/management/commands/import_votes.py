@@ -0,0 +1,317 @@
+"""
+Comando para importar votos en masa desde CSV o NDJSON.
+
+Pensado para migrar encuestas de papel o de kioscos: millones de votos.
+Guardarlos con Vote.save() de a uno lleva horas; aquí el archivo se lee
+renglón por renglón (sin cargarlo entero) y los votos se insertan con
+bulk_create de a --batch-size, cada lote en su propia transacción.
+
+Columnas (CSV con encabezado, o claves de cada objeto NDJSON):
+- choice_id, o choice (ID o texto de la opción), o choice_text
+- question / question_id: ID de la pregunta (obligatorio si la opción va
+  por texto y no se usa --question)
+- voter_ip: IP del votante (obligatoria)
+- user: nombre de usuario (opcional)
+- voted_at: fecha ISO 8601 (opcional; por defecto, ahora)
+
+Es el mismo formato que genera la exportación (/<id>/export.csv).
+
+Los votos duplicados (misma IP o mismo usuario en la misma pregunta,
+dentro del archivo o contra los ya guardados) se saltean, respetando las
+restricciones únicas de Vote. Al final se recalculan los contadores y los
+rollups de las preguntas tocadas.
+
+Uso:
+    python manage.py import_votes votos.csv
+    python manage.py import_votes votos.ndjson --question 5
+    cat votos.csv | python manage.py import_votes - --format csv
+"""
+
+import csv
+import io
+import json
+import sys
+import time
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from polls import rollups
+from polls.models import Choice, Question, Vote
+from polls.voter_identity import stored_ip, voter_key
+
+# Ejemplos de renglones rechazados que se muestran al final
+MAX_REJECT_SAMPLES = 10
+
+
+class RejectedRow(Exception):
+    """Renglón que no se puede importar (el mensaje dice por qué)."""
+
+
+class Command(BaseCommand):
+    """
+    Importa votos desde un archivo CSV o NDJSON con inserciones por lotes.
+    """
+
+    help = 'Importa votos en masa desde CSV o NDJSON (por lotes, salteando duplicados)'
+
+    def add_arguments(self, parser):
+        """
+        Agrega los argumentos del comando.
+        """
+        parser.add_argument(
+            'path',
+            help='Archivo a importar, o - para leer de la entrada estándar',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'ndjson'],
+            help='Formato del archivo (por defecto, según la extensión)',
+        )
+        parser.add_argument(
+            '--question',
+            type=int,
+            help='Importar todos los votos a esta pregunta (ignora la columna question)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Votos por lote (un bulk_create y una transacción cada uno)',
+        )
+
+    def handle(self, *args, **options):
+        """
+        Método principal que ejecuta el comando.
+        """
+        fmt = options['format'] or self.guess_format(options['path'])
+        self.load_choices(options['question'])
+        self.users = {}
+        self.stats = Counter()
+        self.reject_samples = []
+        self.touched = set()
+        started = time.perf_counter()
+
+        stream = self.open(options['path'])
+        try:
+            batch = []
+            for line_number, row in self.read_rows(stream, fmt):
+                batch.append((line_number, row))
+                if len(batch) >= options['batch_size']:
+                    self.import_batch(batch, options['question'])
+                    batch = []
+            if batch:
+                self.import_batch(batch, options['question'])
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        # Los contadores y los rollups se recalculan una vez por pregunta al
+        # final: quedan exactos aunque otro proceso haya votado al mismo tiempo
+        for question in Question.objects.filter(pk__in=self.touched):
+            question.recount_votes()
+            rollups.rebuild(question)
+
+        elapsed = time.perf_counter() - started
+        for sample in self.reject_samples:
+            self.stdout.write(self.style.WARNING(f'⚠️  {sample}'))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"🎉 {self.stats['imported']} votos importados en {elapsed:.1f}s "
+                f"({self.stats['rows'] / elapsed if elapsed else 0:.0f} renglones/s), "
+                f"{self.stats['duplicates']} duplicados salteados, {self.stats['rejected']} rechazados"
+            )
+        )
+
+    def guess_format(self, path):
+        """Elige el formato por la extensión del archivo."""
+        if path.endswith('.csv'):
+            return 'csv'
+        if path.endswith(('.ndjson', '.jsonl')):
+            return 'ndjson'
+        raise CommandError('No se reconoce el formato: usa --format csv o --format ndjson')
+
+    def open(self, path):
+        """Abre el archivo (o la entrada estándar) como texto."""
+        if path == '-':
+            return sys.stdin
+        try:
+            return io.open(path, encoding='utf-8-sig', newline='')
+        except OSError as exc:
+            raise CommandError(f'No se puede abrir {path}: {exc}')
+
+    def read_rows(self, stream, fmt):
+        """Recorre el archivo de a un renglón: pares (número de línea, dict)."""
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else {}
+
+    def load_choices(self, question_id):
+        """
+        Arma en memoria los mapas para resolver las opciones sin consultas por renglón.
+
+        - choice_questions: {choice_id: question_id}
+        - choice_by_text: {(question_id, texto en minúsculas): choice_id}
+        """
+        choices = Choice.objects.all()
+        if question_id is not None:
+            if not Question.objects.filter(pk=question_id).exists():
+                raise CommandError(f'No existe la pregunta {question_id}')
+            choices = choices.filter(question_id=question_id)
+        self.archived = set(Question.objects.filter(archived_at__isnull=False).values_list('pk', flat=True))
+        self.choice_questions = {}
+        self.choice_by_text = {}
+        for choice_id, choice_question_id, choice_text in choices.values_list('id', 'question_id', 'choice_text').iterator():
+            self.choice_questions[choice_id] = choice_question_id
+            self.choice_by_text[(choice_question_id, choice_text.strip().lower())] = choice_id
+
+    def resolve_choice(self, row, question_id):
+        """Devuelve (question_id, choice_id) del renglón."""
+        question_id = question_id or self.to_int(row.get('question') or row.get('question_id'))
+        reference = str(row.get('choice_id') or row.get('choice') or '').strip()
+        if reference.isdigit() and int(reference) in self.choice_questions:
+            choice_id = int(reference)
+        else:
+            text = (reference or str(row.get('choice_text') or '')).strip().lower()
+            choice_id = self.choice_by_text.get((question_id, text))
+        if choice_id is None:
+            raise RejectedRow('opción desconocida')
+        if question_id is not None and self.choice_questions[choice_id] != question_id:
+            raise RejectedRow('la opción no es de esa pregunta')
+        question_id = self.choice_questions[choice_id]
+        if question_id in self.archived:
+            raise RejectedRow('la pregunta está archivada')
+        return question_id, choice_id
+
+    @staticmethod
+    def to_int(value):
+        value = str(value or '').strip()
+        return int(value) if value.isdigit() else None
+
+    def resolve_users(self, batch):
+        """Busca con una sola consulta los usuarios del lote que todavía no se conocen."""
+        usernames = {str(row.get('user') or '').strip() for _, row in batch} - set(self.users) - {''}
+        if usernames:
+            found = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+            for username in usernames:
+                self.users[username] = found.get(username)
+
+    def build_vote(self, row, question_id):
+        """Arma el Vote (sin guardar) de un renglón, o lanza RejectedRow."""
+        question_id, choice_id = self.resolve_choice(row, question_id)
+        voter_ip = str(row.get('voter_ip') or '').strip()
+        try:
+            key = voter_key(voter_ip)
+        except ValueError:
+            raise RejectedRow('IP inválida')
+
+        username = str(row.get('user') or '').strip()
+        user_id = None
+        if username:
+            user_id = self.users.get(username)
+            if user_id is None:
+                raise RejectedRow(f'usuario desconocido: {username}')
+
+        voted_at = timezone.now()
+        if row.get('voted_at'):
+            voted_at = parse_datetime(str(row['voted_at']).strip())
+            if voted_at is None:
+                raise RejectedRow('fecha inválida')
+            if timezone.is_naive(voted_at):
+                voted_at = timezone.make_aware(voted_at)
+
+        return Vote(
+            question_id=question_id, choice_id=choice_id, voter_ip=stored_ip(voter_ip),
+            voter_key=key, user_id=user_id, voted_at=voted_at,
+        )
+
+    def import_batch(self, batch, question_id):
+        """Valida, quita duplicados e inserta un lote de renglones."""
+        self.resolve_users(batch)
+        votes = []
+        for line_number, row in batch:
+            self.stats['rows'] += 1
+            try:
+                votes.append(self.build_vote(row, question_id))
+            except RejectedRow as exc:
+                self.stats['rejected'] += 1
+                if len(self.reject_samples) < MAX_REJECT_SAMPLES:
+                    self.reject_samples.append(f'Línea {line_number}: {exc}')
+
+        votes = self.remove_duplicates(votes)
+        if not votes:
+            return
+        question_ids = {vote.question_id for vote in votes}
+        with transaction.atomic():
+            # ignore_conflicts: si otro proceso votó entre la búsqueda de
+            # duplicados y el INSERT, la restricción única descarta ese voto.
+            # bulk_create no dice cuántas filas descartó: se buscan las
+            # claves del lote guardadas con un id nuevo (una consulta sobre
+            # el índice único (question, voter_key), sin recorrer los votos
+            # anteriores) y se cuentan las que son del lote y no del otro
+            # proceso
+            last_id = Vote.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+            Vote.objects.bulk_create(votes, batch_size=len(votes), ignore_conflicts=True)
+            batch_rows = {self.row_identity(vote) for vote in votes}
+            new_rows = Vote.objects.filter(
+                question_id__in=question_ids,
+                voter_key__in={vote.voter_key for vote in votes},
+                id__gt=last_id,
+            ).only('question_id', 'choice_id', 'voter_key', 'user_id', 'voted_at')
+            inserted = sum(self.row_identity(vote) in batch_rows for vote in new_rows)
+        self.stats['imported'] += inserted
+        self.stats['duplicates'] += len(votes) - inserted
+        self.touched.update(question_ids)
+
+    @staticmethod
+    def row_identity(vote):
+        """Datos de un voto que lo distinguen de uno guardado por otro proceso."""
+        return (vote.question_id, vote.choice_id, bytes(vote.voter_key), vote.user_id, vote.voted_at)
+
+    def remove_duplicates(self, votes):
+        """
+        Quita los votos repetidos dentro del lote y los que ya están guardados.
+
+        Una consulta por pregunta del lote sobre los índices únicos
+        (question, voter_key) y (question, user).
+        """
+        by_question = {}
+        for vote in votes:
+            by_question.setdefault(vote.question_id, []).append(vote)
+
+        accepted = []
+        for question_id, question_votes in by_question.items():
+            keys = {vote.voter_key for vote in question_votes}
+            user_ids = {vote.user_id for vote in question_votes if vote.user_id}
+            existing_keys = {
+                bytes(key) for key in Vote.objects.filter(
+                    question_id=question_id, voter_key__in=keys
+                ).values_list('voter_key', flat=True)
+            }
+            existing_users = set(
+                Vote.objects.filter(question_id=question_id, user_id__in=user_ids).values_list('user_id', flat=True)
+            ) if user_ids else set()
+            for vote in question_votes:
+                if vote.voter_key in existing_keys or vote.user_id in existing_users:
+                    self.stats['duplicates'] += 1
+                    continue
+                existing_keys.add(vote.voter_key)
+                if vote.user_id:
+                    existing_users.add(vote.user_id)
+                accepted.append(vote)
+        return accepted
@@ -4,14 +4,21 @@ Comando personalizado de Django para cargar datos de ejemplo en la aplicación.
 Este comando crea encuestas de muestra para poder probar la aplicación
 inmediatamente después de la instalación.
 
+Con --questions genera en cambio un dataset sintético grande y
+reproducible (ver polls/synthetic.py), útil para benchmarks.
+
 Uso: python manage.py load_sample_data
+     python manage.py load_sample_data --questions 10000 --choices 2-10 --votes 5000000 --seed 42 --skew zipf
 """
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.contrib.auth.models import User
 from polls.models import Question, Choice
+from polls import synthetic
 import datetime
+import time
 
 
 class Command(BaseCommand):
@@ -40,6 +47,62 @@ class Command(BaseCommand):
             help='Username del usuario que será marcado como creador de las encuestas',
             default='admin'
         )
+        
+        # Opciones del modo sintético (se activa con --questions)
+        parser.add_argument(
+            '--questions',
+            type=int,
+            help='Modo sintético: cantidad de encuestas a generar',
+        )
+        parser.add_argument(
+            '--choices',
+            default='2-10',
+            help='Modo sintético: opciones por encuesta, como rango (por defecto 2-10)',
+        )
+        parser.add_argument(
+            '--votes',
+            type=int,
+            default=0,
+            help='Modo sintético: cantidad total de votos',
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            help='Modo sintético: usuarios registrados que votan (por defecto, 5 %% de los votos)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Modo sintético: semilla; con la misma semilla y --end se generan los mismos datos',
+        )
+        parser.add_argument(
+            '--skew',
+            choices=['zipf', 'uniform'],
+            default='zipf',
+            help='Modo sintético: reparto de los votos entre encuestas y opciones',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='Modo sintético: días a lo largo de los que se publican las encuestas',
+        )
+        parser.add_argument(
+            '--end',
+            help='Modo sintético: fecha ISO del último voto (por defecto, hoy a las 00:00 UTC)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Modo sintético: filas por bulk_create',
+        )
+        parser.add_argument(
+            '--skip-rollups',
+            action='store_true',
+            help='Modo sintético: no crear los votos por hora y por día (más rápido)',
+        )
     
     def handle(self, *args, **options):
         """
@@ -69,6 +132,10 @@ class Command(BaseCommand):
             )
             creator = None
         
+        if options['questions'] is not None:
+            self.load_synthetic(options, creator)
+            return
+        
         # Datos de ejemplo para las encuestas
         sample_questions = [
             {
@@ -194,3 +261,45 @@ class Command(BaseCommand):
         self.stdout.write('   3. Vota en las encuestas y ve los resultados')
         self.stdout.write('   4. Accede al admin: http://127.0.0.1:8000/admin/')
         self.stdout.write('\n💡 Tip: Puedes ejecutar este comando con --delete para recrear los datos')
+
+    
+    def load_synthetic(self, options, creator):
+        """
+        Genera el dataset sintético con las opciones del comando.
+        """
+        try:
+            choices = synthetic.parse_range(options['choices'])
+        except ValueError:
+            raise CommandError('--choices debe ser un número o un rango como 2-10')
+        end = None
+        if options['end']:
+            end = parse_datetime(options['end']) or parse_datetime(options['end'] + 'T00:00:00')
+            if end is None:
+                raise CommandError('--end debe ser una fecha ISO 8601')
+            if timezone.is_naive(end):
+                end = timezone.make_aware(end, datetime.timezone.utc)
+        
+        started = time.perf_counter()
+        created = synthetic.generate(
+            questions=options['questions'],
+            choices=choices,
+            votes=options['votes'],
+            users=options['users'],
+            seed=options['seed'],
+            skew=options['skew'],
+            days=options['days'],
+            end=end,
+            creator=creator,
+            batch_size=options['batch_size'],
+            with_rollups=not options['skip_rollups'],
+            log=lambda message: self.stdout.write(f'   {message}'),
+        )
+        elapsed = time.perf_counter() - started
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"🎉 Dataset sintético (semilla {options['seed']}): {created['questions']} encuestas, "
+                f"{created['choices']} opciones, {created['users']} usuarios y {created['votes']} votos "
+                f"en {elapsed:.1f}s"
+            )
+        )
@@ -0,0 +1,553 @@
+"""
+Prueba de carga en el mismo proceso: lectores y votantes contra la aplicación WSGI (o ASGI).
+
+Sirve para reproducir localmente una "tormenta de votos" sin herramientas
+externas. Crea una base de datos de prueba aparte (no toca db.sqlite3), la
+llena con el generador sintético (ver polls/synthetic.py) y llama
+directamente a `application` de encuestas_project/wsgi.py (o de asgi.py con
+--server asgi), con todo el stack de middleware, como lo haría un servidor.
+
+Cada trabajador elige peticiones al azar según --mix:
+- index:   GET /
+- results: GET /<id>/results/
+- live:    GET /<id>/live-results/
+- vote:    POST /<id>/vote/ con una IP distinta en cada voto (X-Forwarded-For)
+
+Los votos van a las --hot encuestas con más votos. Los trabajadores son
+hilos (WSGI) o tareas del event loop (ASGI), --threads por proceso, en
+--processes procesos (cada proceso tiene su propia caché en memoria).
+
+Al final muestra peticiones por segundo sostenidas, latencia p50/p95/p99,
+tasa de errores y de "database is locked", y comprueba que los votos
+aceptados y los contadores coincidan con las filas de Vote.
+
+Uso:
+    python manage.py loadtest
+    python manage.py loadtest --threads 16 --duration 30 --mix index=1,live=4,vote=5
+    python manage.py loadtest --server asgi --processes 4 --hot 3
+"""
+
+import asyncio
+import contextvars
+import io
+import ipaddress
+import logging
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from typing import NamedTuple
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections
+from django.db.backends.signals import connection_created
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from polls import rollups, synthetic
+from polls.benchmarks import percentile
+from polls.models import Question, Vote, VoteRollup
+from polls.results import count_votes, tally
+
+KINDS = ('index', 'results', 'live', 'vote')
+DEFAULT_MIX = 'index=1,results=1,live=3,vote=5'
+
+# IPs de los votantes: 100.64.0.0/10, un bloque de MAX_VOTES_PER_WORKER por trabajador
+FIRST_VOTER_IP = int(ipaddress.IPv4Address('100.64.0.1'))
+MAX_VOTES_PER_WORKER = 1 << 16
+READER_IP = '192.0.2.1'
+
+# Errores de base de datos de la petición en curso (los anota record_database_errors)
+request_errors = contextvars.ContextVar('request_errors', default=None)
+
+
+class Sample(NamedTuple):
+    """Resultado de una petición."""
+    kind: str
+    latency: float
+    status: int
+    failed: bool
+    locked: bool
+
+
+def parse_mix(value):
+    """
+    Lee la mezcla de peticiones: "index=1,live=3,vote=5" -> {tipo: peso}.
+
+    Raises:
+        CommandError: Si un tipo no existe o un peso no es un número positivo
+    """
+    mix = {}
+    for part in value.split(','):
+        kind, _, weight = part.strip().partition('=')
+        if kind not in KINDS:
+            raise CommandError(f'Tipo de petición desconocido en --mix: {kind!r} (válidos: {", ".join(KINDS)})')
+        try:
+            mix[kind] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f'Peso inválido en --mix: {part!r}')
+        if mix[kind] < 0:
+            raise CommandError(f'Peso inválido en --mix: {part!r}')
+    if not any(mix.values()):
+        raise CommandError('--mix necesita al menos un tipo con peso mayor a 0')
+    return mix
+
+
+def record_database_errors(execute, sql, params, many, context):
+    """Envoltorio de consultas que anota los errores de base de datos de la petición."""
+    try:
+        return execute(sql, params, many, context)
+    except DatabaseError as exc:
+        errors = request_errors.get()
+        if errors is not None:
+            errors.append(exc)
+        raise
+
+
+def watch_connection(sender, connection, **kwargs):
+    """Instala record_database_errors en cada conexión nueva (de cualquier hilo)."""
+    if record_database_errors not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_database_errors)
+
+
+def is_locked(errors):
+    return any('locked' in str(exc) for exc in errors)
+
+
+class Worker:
+    """
+    Un cliente simulado: elige peticiones según la mezcla y anota cada resultado.
+
+    Las peticiones se arman aquí; enviarlas depende del servidor (WSGI o ASGI).
+    """
+
+    def __init__(self, number, plan):
+        self.number = number
+        self.plan = plan
+        self.rng = random.Random(plan['seed'] * 100003 + number)
+        self.kinds = list(plan['mix'])
+        self.weights = list(plan['mix'].values())
+        self.votes = 0
+        self.csrf_token = ''
+        self.samples = []
+
+    def csrf_request(self):
+        """GET del detalle de una encuesta, para recibir la cookie csrftoken."""
+        return 'GET', self.plan['paths'][0]['detail'], b'', READER_IP
+
+    def remember_csrf(self, headers):
+        for name, value in headers:
+            if name.lower() == 'set-cookie':
+                cookie = SimpleCookie(value)
+                if 'csrftoken' in cookie:
+                    self.csrf_token = cookie['csrftoken'].value
+
+    def next_request(self):
+        """Devuelve (tipo, método, ruta, cuerpo, IP) de la próxima petición."""
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        if kind == 'index':
+            return kind, 'GET', self.plan['index'], b'', READER_IP
+        paths = self.rng.choice(self.plan['paths'])
+        if kind != 'vote' or self.votes >= MAX_VOTES_PER_WORKER:
+            kind = 'results' if kind == 'vote' else kind
+            return kind, 'GET', paths[kind], b'', READER_IP
+        ip = str(ipaddress.IPv4Address(FIRST_VOTER_IP + self.number * MAX_VOTES_PER_WORKER + self.votes))
+        self.votes += 1
+        body = urlencode({'choice': self.rng.choice(paths['choices']), 'csrfmiddlewaretoken': self.csrf_token})
+        return kind, 'POST', paths['vote'], body.encode(), ip
+
+    def record(self, kind, started, status, errors):
+        # Un voto aceptado redirige a resultados; si la vista atrapa un error
+        # de la base de datos devuelve la página del formulario (200)
+        failed = status >= 500 or (kind == 'vote' and status != 302) or bool(errors)
+        self.samples.append(Sample(kind, time.perf_counter() - started, status, failed, is_locked(errors)))
+
+    def environ(self, method, path, body, ip):
+        """Diccionario environ de WSGI para una petición."""
+        return {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': '',
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'HTTP_HOST': 'testserver',
+            'HTTP_X_FORWARDED_FOR': ip,
+            'HTTP_COOKIE': f'csrftoken={self.csrf_token}' if self.csrf_token else '',
+            'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': self.plan['processes'] > 1,
+            'wsgi.run_once': False,
+        }
+
+    def send_wsgi(self, application, method, path, body, ip):
+        """Llama a la aplicación WSGI y devuelve (estado, cabeceras)."""
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'], response['headers'] = int(status[:3]), headers
+
+        chunks = application(self.environ(method, path, body, ip), start_response)
+        try:
+            for _ in chunks:
+                pass
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+        return response['status'], response['headers']
+
+    def run_wsgi(self, application, deadline):
+        """Envía peticiones a la aplicación WSGI hasta `deadline`."""
+        _, headers = self.send_wsgi(application, *self.csrf_request())
+        self.remember_csrf(headers)
+        while time.perf_counter() < deadline:
+            kind, *request = self.next_request()
+            errors = []
+            request_errors.set(errors)
+            started = time.perf_counter()
+            try:
+                status, _ = self.send_wsgi(application, *request)
+            except Exception as exc:
+                status = 500
+                errors.append(exc)
+            self.record(kind, started, status, errors)
+        return self.samples
+
+    async def send_asgi(self, application, method, path, body, ip):
+        """Llama a la aplicación ASGI y devuelve (estado, cabeceras)."""
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [
+                (b'host', b'testserver'),
+                (b'x-forwarded-for', ip.encode()),
+                (b'content-type', b'application/x-www-form-urlencoded'),
+                (b'content-length', str(len(body)).encode()),
+                (b'cookie', f'csrftoken={self.csrf_token}'.encode()),
+            ],
+            'client': ('127.0.0.1', 0),
+            'server': ('testserver', 80),
+        }
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        response = {}
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # El cliente no se desconecta: se espera hasta que cancelen la tarea
+            await asyncio.Future()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = [(name.decode(), value.decode()) for name, value in message['headers']]
+
+        await application(scope, receive, send)
+        return response['status'], response['headers']
+
+    async def run_asgi(self, application, deadline):
+        """Envía peticiones a la aplicación ASGI hasta `deadline`."""
+        _, headers = await self.send_asgi(application, *self.csrf_request())
+        self.remember_csrf(headers)
+        while time.perf_counter() < deadline:
+            kind, *request = self.next_request()
+            errors = []
+            request_errors.set(errors)
+            started = time.perf_counter()
+            try:
+                status, _ = await self.send_asgi(application, *request)
+            except Exception as exc:
+                status = 500
+                errors.append(exc)
+            self.record(kind, started, status, errors)
+        return self.samples
+
+
+def run_process(plan, process_number):
+    """
+    Corre los trabajadores de un proceso durante plan['duration'] segundos.
+
+    Al terminar escribe los rollups pendientes del proceso (ver
+    rollups.RollupBuffer): los procesos hijos salen sin pasar por atexit.
+
+    Returns:
+        list: Sample de todas las peticiones del proceso
+    """
+    try:
+        return run_workers(plan, process_number)
+    finally:
+        rollups.buffer.flush()
+        connections.close_all()
+
+
+def run_workers(plan, process_number):
+    """Corre los trabajadores (hilos WSGI o tareas ASGI) de un proceso."""
+    numbers = [process_number * plan['threads'] + index for index in range(plan['threads'])]
+    deadline = time.perf_counter() + plan['duration']
+    if plan['server'] == 'asgi':
+        return run_asgi_workers(plan, numbers, deadline)
+    return run_wsgi_workers(plan, numbers, deadline)
+
+
+def run_asgi_workers(plan, numbers, deadline):
+    """Un trabajador por tarea de asyncio contra la aplicación ASGI."""
+    from encuestas_project.asgi import application
+
+    async def run_all():
+        workers = [Worker(number, plan) for number in numbers]
+        results = await asyncio.gather(*(worker.run_asgi(application, deadline) for worker in workers))
+        return [sample for samples in results for sample in samples]
+
+    return asyncio.run(run_all())
+
+
+def run_wsgi_workers(plan, numbers, deadline):
+    """Un trabajador por hilo contra la aplicación WSGI."""
+    from encuestas_project.wsgi import application
+
+    def run_thread(number):
+        try:
+            return Worker(number, plan).run_wsgi(application, deadline)
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=plan['threads'], thread_name_prefix='loadtest') as executor:
+        return [sample for samples in executor.map(run_thread, numbers) for sample in samples]
+
+
+class Command(BaseCommand):
+    """
+    Genera carga concurrente de lectores y votantes contra la aplicación WSGI o ASGI.
+    """
+
+    help = 'Prueba de carga en el mismo proceso: lectores y votantes concurrentes contra WSGI/ASGI'
+
+    def add_arguments(self, parser):
+        """
+        Agrega argumentos opcionales al comando.
+        """
+        parser.add_argument(
+            '--server',
+            choices=['wsgi', 'asgi'],
+            default='wsgi',
+            help='Aplicación a la que se llama (por defecto, wsgi)',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Trabajadores por proceso: hilos con wsgi, tareas con asgi (por defecto 8)',
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help='Procesos (por defecto 1)',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10,
+            help='Segundos de carga (por defecto 10)',
+        )
+        parser.add_argument(
+            '--mix',
+            default=DEFAULT_MIX,
+            help=f'Pesos de cada tipo de petición (por defecto "{DEFAULT_MIX}")',
+        )
+        parser.add_argument(
+            '--questions',
+            type=int,
+            default=20,
+            help='Preguntas del dataset (por defecto 20)',
+        )
+        parser.add_argument(
+            '--seed-votes',
+            type=int,
+            default=1000,
+            help='Votos que ya tiene el dataset antes de la carga (por defecto 1000)',
+        )
+        parser.add_argument(
+            '--hot',
+            type=int,
+            default=1,
+            help='Encuestas que reciben la carga: las de más votos (por defecto 1)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Semilla del dataset y de la elección de peticiones',
+        )
+
+    def handle(self, *args, **options):
+        """
+        Método principal que ejecuta el comando.
+        """
+        mix = parse_mix(options['mix'])
+        if options['threads'] < 1 or options['processes'] < 1 or options['hot'] < 1:
+            raise CommandError('--threads, --processes y --hot deben ser al menos 1')
+
+        setup_test_environment()
+        test_db = None
+        if connection.vendor == 'sqlite':
+            # Varios hilos y procesos necesitan un archivo: la base en memoria
+            # no se comparte entre procesos
+            test_db = os.path.join(tempfile.mkdtemp(), 'loadtest.sqlite3')
+            connection.settings_dict['TEST']['NAME'] = test_db
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        connection_created.connect(watch_connection)
+        try:
+            synthetic.generate(
+                max(options['questions'], options['hot']), votes=options['seed_votes'], seed=options['seed'],
+                log=lambda message: self.stdout.write(f'📊 {message}'),
+            )
+            hot = list(
+                Question.objects.filter(is_active=True, pub_date__lte=timezone.now())
+                .order_by('-votes', 'pk')[:options['hot']]
+            )
+            plan = {
+                'server': options['server'],
+                'threads': options['threads'],
+                'processes': options['processes'],
+                'duration': options['duration'],
+                'mix': mix,
+                'seed': options['seed'],
+                'index': reverse('polls:index'),
+                'paths': [self.paths_for(question) for question in hot],
+            }
+            votes_before = Vote.objects.count()
+
+            self.stdout.write(
+                f"🚀 {options['processes']} proceso(s) × {options['threads']} trabajador(es) "
+                f"{options['server'].upper()} durante {options['duration']:g}s..."
+            )
+            # Los errores se resumen en el informe en lugar de un log por petición
+            request_logger = logging.getLogger('django.request')
+            level = request_logger.level
+            request_logger.setLevel(logging.CRITICAL)
+            try:
+                started = time.perf_counter()
+                samples = self.run(plan)
+                elapsed = time.perf_counter() - started
+            finally:
+                request_logger.setLevel(level)
+
+            self.report(samples, elapsed)
+            self.check_consistency(hot, samples, votes_before)
+        finally:
+            connection_created.disconnect(watch_connection)
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            if test_db:
+                os.rmdir(os.path.dirname(test_db))
+
+    def paths_for(self, question):
+        """Rutas de una encuesta y los IDs de sus opciones."""
+        return {
+            'detail': reverse('polls:detail', args=(question.pk,)),
+            'results': reverse('polls:results', args=(question.pk,)),
+            'live': reverse('polls:live_results_api', args=(question.pk,)),
+            'vote': reverse('polls:vote', args=(question.pk,)),
+            'choices': list(question.choice_set.values_list('pk', flat=True)),
+        }
+
+    def run(self, plan):
+        """Corre la carga en este proceso o en varios (con fork) y junta las muestras."""
+        if plan['processes'] == 1:
+            return run_process(plan, 0)
+        # Las conexiones abiertas no se pueden compartir con los procesos hijos
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=plan['processes'], mp_context=context) as executor:
+            futures = [executor.submit(run_process, plan, number) for number in range(plan['processes'])]
+            return [sample for future in futures for sample in future.result()]
+
+    def report(self, samples, elapsed):
+        """Muestra peticiones por segundo, latencias y errores por tipo de petición."""
+        self.stdout.write(
+            f"{'Tipo':<10}{'peticiones':>11}{'pet/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'errores':>9}{'locked':>8}"
+        )
+        groups = {kind: [sample for sample in samples if sample.kind == kind] for kind in KINDS}
+        groups['total'] = samples
+        for kind, group in groups.items():
+            if not group:
+                continue
+            latencies = [sample.latency for sample in group]
+            failed = sum(sample.failed for sample in group)
+            locked = sum(sample.locked for sample in group)
+            self.stdout.write(
+                f'{kind:<10}{len(group):>11}{len(group) / elapsed:>9.1f}'
+                f'{statistics.median(latencies) * 1000:>9.2f}{percentile(latencies, 95) * 1000:>9.2f}'
+                f'{percentile(latencies, 99) * 1000:>9.2f}'
+                f'{failed / len(group):>9.1%}{locked / len(group):>8.1%}'
+            )
+
+        statuses = Counter(f'{sample.kind} {sample.status}' for sample in samples if sample.failed)
+        if statuses:
+            self.stdout.write(self.style.WARNING(
+                '⚠️  Errores por tipo y código: ' + ', '.join(f'{key} ×{n}' for key, n in statuses.most_common())
+            ))
+
+    def check_consistency(self, questions, samples, votes_before):
+        """
+        Comprueba que los votos aceptados, los contadores y los rollups por día coincidan con las filas de Vote.
+        """
+        accepted = sum(1 for sample in samples if sample.kind == 'vote' and not sample.failed)
+        created = Vote.objects.count() - votes_before
+        problems = []
+        if accepted != created:
+            problems.append(f'{accepted} votos aceptados pero {created} filas nuevas en Vote')
+
+        counters = tally([question.pk for question in questions])
+        for question in questions:
+            rows = count_votes(question)
+            for choice in counters[question.pk].choices:
+                if choice.votes != rows.get(choice.id, 0):
+                    problems.append(
+                        f'"{question}", opción {choice.id}: contador {choice.votes}, '
+                        f'filas de Vote {rows.get(choice.id, 0)}'
+                    )
+            if 'day' in rollups.get_config()['GRANULARITIES']:
+                by_day = Counter()
+                for choice_id, votes in VoteRollup.objects.filter(
+                    question=question, granularity='day'
+                ).values_list('choice_id', 'votes'):
+                    by_day[choice_id] += votes
+                for choice_id, n in rows.items():
+                    if by_day[choice_id] != n:
+                        problems.append(
+                            f'"{question}", opción {choice_id}: rollups por día {by_day[choice_id]}, '
+                            f'filas de Vote {n}'
+                        )
+
+        if problems:
+            for problem in problems:
+                self.stdout.write(self.style.ERROR(f'❌ {problem}'))
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f'🎉 Conteo consistente: {created} votos nuevos, contadores y rollups = filas de Vote')
+            )
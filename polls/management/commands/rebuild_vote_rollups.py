@@ -0,0 +1,60 @@
+"""
+Comando para recalcular los votos por intervalo (rollups) desde los votos.
+
+Los rollups se mantienen solos al votar; este comando sirve para llenarlos
+con los votos que ya existían antes de activarlos, o para repararlos. Lee
+las filas de Vote y, en las encuestas archivadas, el archivo de votos.
+
+Uso:
+    python manage.py rebuild_vote_rollups
+    python manage.py rebuild_vote_rollups --question 5
+    python manage.py rebuild_vote_rollups --granularity day
+"""
+
+from django.core.management.base import BaseCommand
+
+from polls import rollups
+from polls.models import Question, VoteRollup
+
+
+class Command(BaseCommand):
+    """
+    Recalcula los rollups de votos por minuto/hora/día.
+    """
+
+    help = 'Recalcula los votos por intervalo (minuto/hora/día) desde los votos guardados'
+
+    def add_arguments(self, parser):
+        """
+        Agrega argumentos opcionales al comando.
+        """
+        parser.add_argument(
+            '--question',
+            type=int,
+            action='append',
+            help='ID de la pregunta a recalcular (se puede repetir). Por defecto, todas',
+        )
+        parser.add_argument(
+            '--granularity',
+            choices=[value for value, _ in VoteRollup.GRANULARITY_CHOICES],
+            action='append',
+            help='Granularidad a recalcular (se puede repetir). Por defecto, las de POLLS_TIMELINE',
+        )
+
+    def handle(self, *args, **options):
+        """
+        Método principal que ejecuta el comando.
+        """
+        questions = Question.objects.order_by('pk')
+        if options['question']:
+            questions = questions.filter(pk__in=options['question'])
+
+        total = 0
+        for question in questions:
+            created = rollups.rebuild(question, options['granularity'])
+            total += created
+            self.stdout.write(f'✅ "{question}": {created} intervalos')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'🎉 {total} intervalos recalculados en {questions.count()} pregunta(s)')
+        )
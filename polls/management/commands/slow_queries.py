@@ -0,0 +1,116 @@
+"""
+Reporte del registro de consultas lentas (ver polls/slow_queries.py).
+
+Lee el log de consultas lentas (y sus copias rotadas), agrupa las consultas
+por huella (el SQL sin valores concretos) y muestra las que más pesan: cuántas
+veces aparecieron, tiempo total, máximo y medio, desde qué vistas, un
+ejemplo (el más lento) con sus parámetros, los marcos de la pila del
+proyecto y el plan de ejecución.
+
+Uso:
+    python manage.py slow_queries
+    python manage.py slow_queries --top 5 --sort max
+    python manage.py slow_queries --file /var/log/encuestas/slow_queries.log
+    python manage.py slow_queries --clear    # borrar el log después de leerlo
+"""
+
+import os
+
+from django.core.management.base import BaseCommand
+
+from polls import slow_queries
+
+# Campo de cada grupo por el que se ordena
+SORT_KEYS = {
+    'total': 'total_ms',
+    'count': 'count',
+    'max': 'max_ms',
+    'mean': 'mean_ms',
+}
+
+
+class Command(BaseCommand):
+    """
+    Muestra las consultas lentas agrupadas por huella.
+    """
+
+    help = 'Muestra las consultas lentas registradas, agrupadas por huella, con su plan de ejecución'
+
+    def add_arguments(self, parser):
+        """
+        Agrega argumentos opcionales al comando.
+        """
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=10,
+            help='Cuántas huellas mostrar (por defecto 10)',
+        )
+        parser.add_argument(
+            '--sort',
+            choices=list(SORT_KEYS),
+            default='total',
+            help='Ordenar por tiempo total, cantidad, máximo o media (por defecto total)',
+        )
+        parser.add_argument(
+            '--file',
+            help='Log a leer (por defecto LOG_FILE de POLLS_SLOW_QUERIES)',
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Borrar el log y sus copias rotadas después de mostrarlos',
+        )
+
+    def handle(self, *args, **options):
+        """
+        Método principal que ejecuta el comando.
+        """
+        path = os.fspath(options['file'] or slow_queries.get_config()['LOG_FILE'])
+        groups = slow_queries.aggregate(slow_queries.read_log(path))
+        if not groups:
+            self.stdout.write(f'ℹ️  No hay consultas lentas registradas en {path}')
+            return
+
+        key = SORT_KEYS[options['sort']]
+        groups.sort(key=lambda group: group[key], reverse=True)
+        total = sum(group['count'] for group in groups)
+        self.stdout.write(f'🐢 {total} consultas lentas en {len(groups)} huellas ({path})')
+
+        for position, group in enumerate(groups[:options['top']], start=1):
+            self.report(position, group)
+
+        if options['clear']:
+            self.clear(path)
+            self.stdout.write(self.style.SUCCESS('🗑️  Log de consultas lentas borrado'))
+
+    def report(self, position, group):
+        """Muestra una huella: tiempos, vistas, ejemplo, pila y plan."""
+        self.stdout.write('')
+        self.stdout.write(self.style.WARNING(
+            f"#{position} [{group['fingerprint']}] {group['count']} {'vez' if group['count'] == 1 else 'veces'} | "
+            f"total {group['total_ms']:.1f} ms | máx {group['max_ms']:.1f} ms | "
+            f"media {group['mean_ms']:.1f} ms"
+        ))
+        views = sorted(group['views'].items(), key=lambda item: item[1], reverse=True)
+        self.stdout.write('   Vistas: ' + ', '.join(f'{view} ({count})' for view, count in views))
+        self.stdout.write(f"   SQL: {group['sql']}")
+        if group['params'] is not None:
+            self.stdout.write(f"   Parámetros: {group['params']}")
+        if group['stack']:
+            self.stdout.write('   Pila:')
+            for frame in group['stack']:
+                self.stdout.write(f'     {frame}')
+        if group['plan']:
+            self.stdout.write('   Plan:')
+            for row in group['plan']:
+                self.stdout.write(f'     {row}')
+
+    def clear(self, path):
+        """Borra el log y sus copias rotadas."""
+        backups = slow_queries.get_config()['BACKUP_COUNT']
+        for name in [path] + [f'{path}.{number}' for number in range(1, backups + 1)]:
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,326 @@
+"""
+Métricas en formato de texto de Prometheus, compartidas entre procesos.
+
+Con gunicorn o uvicorn hay varios procesos trabajadores y cada petición de
+Prometheus a /metrics la atiende uno solo: si cada proceso guardara sus
+contadores en variables globales, cada lectura vería solo una parte. Aquí
+cada proceso escribe sus métricas en su propio archivo
+(<DIRECTORY>/metrics_<pid>.db), mapeado en memoria con mmap, y /metrics lee
+y suma los archivos de todos los procesos. Escribir es sumar un double en
+una posición del mmap, sin bloqueos entre procesos.
+
+Formato del archivo:
+
+    cabecera   MAGIC, bytes usados (uint32)
+    entradas   largo de la clave (uint32), clave JSON en UTF-8 (rellenada
+               hasta múltiplo de 8), valor (float64)
+
+La clave es [familia, sufijo, etiquetas], por ejemplo
+["polls_votes_total", "", [["result", "accepted"]]]. Las cubetas de los
+histogramas se guardan sin acumular y se acumulan al leer.
+
+Métricas (ver FAMILIES):
+- polls_view_latency_seconds: histograma de latencia por nombre de URL
+  de polls/urls.py (lo mide MetricsMiddleware)
+- polls_db_queries_total: consultas SQL por nombre de URL
+- polls_votes_total: votos por resultado (accepted, duplicate, error)
+- polls_results_cache_total: lecturas de la caché de resultados (hit, miss)
+
+Los archivos de procesos que terminaron se siguen sumando (los contadores
+no deben bajar); al arrancar el servidor hay que vaciar el directorio, por
+ejemplo llamando a reset() desde on_starting de gunicorn. Si un proceso
+nuevo recibe el PID de uno que terminó, sigue sumando sobre el archivo que
+ya existe en lugar de vaciarlo.
+
+Configuración en settings.py:
+    POLLS_METRICS = {
+        'ENABLED': False,
+        'DIRECTORY': BASE_DIR / 'metrics',
+        'BUCKETS': [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+        'ALLOWED_IPS': None,   # IPs (REMOTE_ADDR) que pueden leer /metrics; None = todas
+    }
+"""
+
+import glob
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+
+from django.conf import settings
+
+DEFAULTS = {
+    'ENABLED': False,
+    'DIRECTORY': None,
+    'BUCKETS': [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+    'ALLOWED_IPS': None,
+}
+
+# Familias de métricas: nombre -> (tipo, ayuda)
+FAMILIES = {
+    'polls_view_latency_seconds': ('histogram', 'Latencia de las vistas de polls por nombre de URL'),
+    'polls_db_queries_total': ('counter', 'Consultas SQL de las vistas de polls por nombre de URL'),
+    'polls_votes_total': ('counter', 'Votos recibidos por resultado (accepted, duplicate, error)'),
+    'polls_results_cache_total': ('counter', 'Lecturas de la caché de resultados (hit, miss)'),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+MAGIC = b'PMT1'
+HEADER = struct.Struct('<4sI')
+KEY_LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+INITIAL_SIZE = 64 * 1024
+
+
+def get_config():
+    """Devuelve la configuración de las métricas mezclada con los valores por defecto."""
+    config = {**DEFAULTS, **getattr(settings, 'POLLS_METRICS', {})}
+    if config['DIRECTORY'] is None:
+        config['DIRECTORY'] = settings.BASE_DIR / 'metrics'
+    return config
+
+
+def _padded(size):
+    """Redondea hacia arriba a múltiplo de 8 (los float64 quedan alineados)."""
+    return (size + 7) & ~7
+
+
+class MetricsFile:
+    """
+    Archivo de métricas de un proceso, mapeado en memoria.
+
+    Solo el proceso dueño escribe (con un lock entre sus hilos); los demás
+    lo leen con read_file().
+
+    Si el archivo ya existe (otro proceso con el mismo PID que ya terminó)
+    no se vacía: se conservan sus entradas y se sigue sumando sobre ellas.
+    Solo se empieza de cero si la cabecera no es válida.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._positions = {}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Abrir para lectura y escritura sin truncar ('w+b' borraría los contadores)
+        self._file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), 'r+b')
+        size = max(os.fstat(self._file.fileno()).st_size, INITIAL_SIZE)
+        self._file.truncate(size)
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        magic, used = HEADER.unpack_from(self._mmap)
+        if magic == MAGIC and HEADER.size <= used <= size:
+            self._used = used
+            self._positions = dict(_entries(self._mmap, used))
+        else:
+            self._used = HEADER.size
+            HEADER.pack_into(self._mmap, 0, MAGIC, self._used)
+
+    def inc(self, key, amount):
+        """Suma `amount` al valor de `key` (la crea en 0 si no existe)."""
+        with self._lock:
+            position = self._positions.get(key)
+            if position is None:
+                position = self._add(key)
+            VALUE.pack_into(self._mmap, position, VALUE.unpack_from(self._mmap, position)[0] + amount)
+
+    def _add(self, key):
+        encoded = key.encode('utf-8')
+        size = _padded(KEY_LENGTH.size + len(encoded)) + VALUE.size
+        if self._used + size > len(self._mmap):
+            self._grow(self._used + size)
+        KEY_LENGTH.pack_into(self._mmap, self._used, len(encoded))
+        self._mmap[self._used + KEY_LENGTH.size:self._used + KEY_LENGTH.size + len(encoded)] = encoded
+        position = self._used + size - VALUE.size
+        VALUE.pack_into(self._mmap, position, 0.0)
+        # Los bytes usados se actualizan al final: quien lea al mismo tiempo
+        # nunca ve una entrada a medio escribir
+        self._used += size
+        HEADER.pack_into(self._mmap, 0, MAGIC, self._used)
+        self._positions[key] = position
+        return position
+
+    def _grow(self, needed):
+        size = len(self._mmap)
+        while size < needed:
+            size *= 2
+        self._mmap.close()
+        self._file.truncate(size)
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+
+def _entries(data, used):
+    """Recorre las entradas de un archivo de métricas: (clave, posición del valor)."""
+    position = HEADER.size
+    while position < min(used, len(data)):
+        length = KEY_LENGTH.unpack_from(data, position)[0]
+        key = bytes(data[position + KEY_LENGTH.size:position + KEY_LENGTH.size + length]).decode('utf-8')
+        position += _padded(KEY_LENGTH.size + length)
+        yield key, position
+        position += VALUE.size
+
+
+def read_file(path):
+    """
+    Lee un archivo de métricas.
+
+    Returns:
+        dict: {clave: valor}
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    if len(data) < HEADER.size:
+        return {}
+    magic, used = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        return {}
+    return {key: VALUE.unpack_from(data, position)[0] for key, position in _entries(data, used)}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _get_store():
+    """El archivo de este proceso (uno nuevo si el proceso viene de un fork)."""
+    global _store
+    store = _store
+    if store is None or store.pid != os.getpid():
+        with _store_lock:
+            if _store is None or _store.pid != os.getpid():
+                path = os.path.join(get_config()['DIRECTORY'], f'metrics_{os.getpid()}.db')
+                _store = MetricsFile(path)
+            store = _store
+    return store
+
+
+def _key(family, suffix, labels):
+    return json.dumps([family, suffix, sorted(labels.items())], ensure_ascii=False)
+
+
+def inc(family, amount=1, **labels):
+    """
+    Suma a un contador.
+
+    Ejemplo:
+        metrics.inc('polls_votes_total', result='accepted')
+    """
+    if not get_config()['ENABLED']:
+        return
+    _get_store().inc(_key(family, '', labels), amount)
+
+
+def observe(family, value, **labels):
+    """
+    Agrega una observación a un histograma (por ejemplo, una latencia en segundos).
+    """
+    config = get_config()
+    if not config['ENABLED']:
+        return
+    le = next((bound for bound in config['BUCKETS'] if value <= bound), math.inf)
+    store = _get_store()
+    store.inc(_key(family, '_bucket', {**labels, 'le': _format_value(le)}), 1)
+    store.inc(_key(family, '_sum', labels), value)
+    store.inc(_key(family, '_count', labels), 1)
+
+
+def collect():
+    """
+    Suma las métricas de los archivos de todos los procesos.
+
+    Returns:
+        dict: {(familia, sufijo, etiquetas): valor}, con las etiquetas como tupla de pares
+    """
+    totals = {}
+    for path in glob.glob(os.path.join(get_config()['DIRECTORY'], 'metrics_*.db')):
+        try:
+            values = read_file(path)
+        except OSError:
+            continue
+        for key, value in values.items():
+            family, suffix, labels = json.loads(key)
+            key = (family, suffix, tuple(tuple(pair) for pair in labels))
+            totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def render():
+    """
+    Texto de /metrics en el formato de exposición de Prometheus.
+
+    Las cubetas de los histogramas se acumulan (cada `le` cuenta también
+    las observaciones menores) y siempre terminan en le="+Inf".
+    """
+    samples = collect()
+    lines = []
+    for family, (kind, help_text) in FAMILIES.items():
+        lines.append(f'# HELP {family} {help_text}')
+        lines.append(f'# TYPE {family} {kind}')
+        rows = sorted((suffix, labels, value) for (name, suffix, labels), value in samples.items() if name == family)
+        if kind == 'counter':
+            lines.extend(f'{family}{_format_labels(labels)} {_format_value(value)}' for _, labels, value in rows)
+            continue
+
+        # Histograma: agrupar por etiquetas sin `le`
+        series = {}
+        for suffix, labels, value in rows:
+            base = tuple(pair for pair in labels if pair[0] != 'le')
+            entry = series.setdefault(base, {'buckets': {}, 'sum': 0.0, 'count': 0.0})
+            if suffix == '_bucket':
+                le = dict(labels)['le']
+                entry['buckets'][math.inf if le == '+Inf' else float(le)] = value
+            else:
+                entry[suffix[1:]] = value
+        bounds = sorted({*get_config()['BUCKETS'], math.inf})
+        for base, entry in sorted(series.items()):
+            cumulative = 0.0
+            for bound in sorted({*bounds, *entry['buckets']}):
+                cumulative += entry['buckets'].get(bound, 0.0)
+                labels = _format_labels((*base, ('le', _format_value(bound))))
+                lines.append(f'{family}_bucket{labels} {_format_value(cumulative)}')
+            lines.append(f'{family}_sum{_format_labels(base)} {_format_value(entry["sum"])}')
+            lines.append(f'{family}_count{_format_labels(base)} {_format_value(entry["count"])}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """
+    Borra las métricas de todos los procesos (archivos del directorio).
+
+    Para llamar al arrancar el servidor, antes de crear los trabajadores.
+    """
+    global _store
+    with _store_lock:
+        if _store is not None and _store.pid == os.getpid():
+            _store.close()
+        _store = None
+    for path in glob.glob(os.path.join(get_config()['DIRECTORY'], 'metrics_*.db')):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,329 @@
+"""
+Middleware de perfilado y de métricas por petición.
+
+ProfilingMiddleware: tiempo total, SQL, plantillas y Python de cada petición.
+MetricsMiddleware: latencia y consultas por vista para /metrics (ver metrics.py).
+SlowQueryMiddleware: anota la petición en curso para el registro de
+consultas lentas (ver slow_queries.py).
+
+Cuando una página es lenta, la primera pregunta es dónde se fue el tiempo.
+ProfilingMiddleware mide, en cada petición muestreada:
+
+- total: tiempo de pared de la petición (vista y middleware siguientes)
+- sql: cantidad de consultas y tiempo en la base de datos, con un
+  envoltorio de connection.execute_wrapper
+- tpl: tiempo renderizando plantillas, sin contar las consultas que se
+  hacen mientras se renderiza (esas van a sql)
+- app: el resto, es decir Python (total - sql - tpl)
+
+y lo devuelve en la cabecera Server-Timing, que las herramientas de
+desarrollo del navegador muestran en la pestaña de red:
+
+    Server-Timing: total;dur=35.2, sql;dur=12.1;desc="4 consultas", tpl;dur=8.0, app;dur=15.1
+
+Las peticiones que tardan más de SLOW_MS se registran en el log
+'polls.middleware' con el desglose y la consulta más lenta.
+
+Las medidas de la petición en curso viven en una ContextVar, así también
+se cuentan las consultas de las vistas async (el ORM corre en otro hilo
+con sync_to_async, que copia el contexto). El tiempo de las respuestas que
+se envían por partes (StreamingHttpResponse) no incluye el envío.
+
+Desactivado no cuesta nada: el middleware lanza MiddlewareNotUsed y Django
+lo quita de la cadena al arrancar.
+
+MetricsMiddleware usa las mismas medidas de SQL y suma, por nombre de URL
+de polls/urls.py, la latencia (histograma) y las consultas de cada petición.
+
+Configuración en settings.py:
+    POLLS_PROFILING = {
+        'ENABLED': False,
+        'SAMPLE_RATE': 1.0,      # Parte de las peticiones que se miden (0 a 1)
+        'SERVER_TIMING': True,   # Agregar la cabecera Server-Timing
+        'SLOW_MS': 500,          # Registrar en el log las que tarden más (None = nunca)
+    }
+"""
+
+import contextvars
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.base import Template
+
+from . import metrics, slow_queries
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 1.0,
+    'SERVER_TIMING': True,
+    'SLOW_MS': 500,
+}
+
+# Largo máximo de la consulta más lenta en el log
+MAX_SQL_LENGTH = 500
+
+# Medidas de la petición en curso (None si no se está midiendo)
+current_profile = contextvars.ContextVar('polls_profile', default=None)
+
+
+def get_config():
+    """Devuelve la configuración del perfilado mezclada con los valores por defecto."""
+    return {**DEFAULTS, **getattr(settings, 'POLLS_PROFILING', {})}
+
+
+class RequestProfile:
+    """Medidas de una petición, en segundos."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+        self.slowest_query = (0.0, '')
+
+    def add_query(self, sql, elapsed):
+        self.queries += 1
+        self.sql_time += elapsed
+        if elapsed > self.slowest_query[0]:
+            self.slowest_query = (elapsed, sql)
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    @property
+    def app_time(self):
+        """Tiempo que no fue ni SQL ni plantillas: Python."""
+        return max(0.0, self.total - self.sql_time - self.template_time)
+
+    def server_timing(self):
+        """Valor de la cabecera Server-Timing (duraciones en milisegundos)."""
+        return (
+            f'total;dur={self.total * 1000:.1f}, '
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{self.queries} consultas", '
+            f'tpl;dur={self.template_time * 1000:.1f}, '
+            f'app;dur={self.app_time * 1000:.1f}'
+        )
+
+
+def record_query(execute, sql, params, many, context):
+    """Envoltorio de consultas (connection.execute_wrapper) que suma al perfil en curso."""
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, time.perf_counter() - started)
+
+
+def watch_connection(sender, connection, **kwargs):
+    """Instala record_query en cada conexión nueva, de cualquier hilo."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+_original_render = Template.render
+
+
+def profiled_render(self, context):
+    """
+    Template.render que suma al perfil en curso el tiempo de renderizado.
+
+    Solo mide la plantilla de más afuera (los {% include %} ya están
+    dentro) y le resta el tiempo de las consultas hechas mientras tanto.
+    """
+    profile = current_profile.get()
+    if profile is None or profile.rendering:
+        return _original_render(self, context)
+    profile.rendering = True
+    sql_before = profile.sql_time
+    started = time.perf_counter()
+    try:
+        return _original_render(self, context)
+    finally:
+        profile.rendering = False
+        profile.template_time += time.perf_counter() - started - (profile.sql_time - sql_before)
+
+
+def watch_queries():
+    """Engancha record_query a las conexiones abiertas y a las que se abran."""
+    connection_created.connect(watch_connection, dispatch_uid='polls_profiling')
+    for connection in connections.all(initialized_only=True):
+        watch_connection(None, connection)
+
+
+def install():
+    """Engancha la medición de consultas y de plantillas (una sola vez por proceso)."""
+    watch_queries()
+    Template.render = profiled_render
+
+
+class ProfilingMiddleware:
+    """
+    Mide cada petición muestreada y agrega Server-Timing (ver el docstring del módulo).
+
+    Funciona con vistas síncronas y async sin adaptadores.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.config = get_config()
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        install()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= self.config['SAMPLE_RATE']:
+            return self.get_response(request)
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.process_profile(request, response, profile)
+
+    async def __acall__(self, request):
+        if random.random() >= self.config['SAMPLE_RATE']:
+            return await self.get_response(request)
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.process_profile(request, response, profile)
+
+    def process_profile(self, request, response, profile):
+        """Agrega Server-Timing y registra la petición si fue lenta."""
+        profile.finish()
+        if self.config['SERVER_TIMING']:
+            response['Server-Timing'] = profile.server_timing()
+        slow_ms = self.config['SLOW_MS']
+        if slow_ms is not None and profile.total * 1000 >= slow_ms:
+            slowest_time, slowest_sql = profile.slowest_query
+            logger.warning(
+                'Petición lenta: %s %s (%s) en %.1f ms | SQL: %d consultas, %.1f ms | '
+                'plantillas: %.1f ms | Python: %.1f ms | consulta más lenta (%.1f ms): %s',
+                request.method, request.path, response.status_code, profile.total * 1000,
+                profile.queries, profile.sql_time * 1000, profile.template_time * 1000,
+                profile.app_time * 1000, slowest_time * 1000, slowest_sql[:MAX_SQL_LENGTH],
+            )
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Registra la latencia y las consultas de cada vista de polls en las métricas.
+
+    Usa el perfil de la petición de ProfilingMiddleware si hay uno (o crea
+    uno propio) para contar las consultas. Las peticiones que no son de
+    polls/urls.py (admin, archivos estáticos) no se registran.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not metrics.get_config()['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        watch_queries()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        profile, token = self.start()
+        queries = profile.queries
+        try:
+            response = self.get_response(request)
+        finally:
+            if token is not None:
+                current_profile.reset(token)
+        self.record(request, time.perf_counter() - started, profile.queries - queries)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        profile, token = self.start()
+        queries = profile.queries
+        try:
+            response = await self.get_response(request)
+        finally:
+            if token is not None:
+                current_profile.reset(token)
+        self.record(request, time.perf_counter() - started, profile.queries - queries)
+        return response
+
+    def start(self):
+        """Perfil en curso (el de ProfilingMiddleware o uno nuevo) y su token."""
+        profile = current_profile.get()
+        if profile is not None:
+            return profile, None
+        profile = RequestProfile()
+        return profile, current_profile.set(profile)
+
+    def record(self, request, elapsed, queries):
+        match = getattr(request, 'resolver_match', None)
+        if match is None or match.app_name != 'polls':
+            return
+        metrics.observe('polls_view_latency_seconds', elapsed, view=match.url_name)
+        metrics.inc('polls_db_queries_total', queries, view=match.url_name)
+
+
+class SlowQueryMiddleware:
+    """
+    Anota la petición en curso para que las consultas lentas sepan de qué vista vienen.
+
+    Las consultas las mide slow_queries.record_slow_query; este middleware
+    solo guarda la petición en una ContextVar (que también llega al hilo
+    del ORM de las vistas async).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not slow_queries.get_config()['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        slow_queries.install()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = slow_queries.current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            slow_queries.current_request.reset(token)
+
+    async def __acall__(self, request):
+        token = slow_queries.current_request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            slow_queries.current_request.reset(token)
@@ -0,0 +1,45 @@
+# Generado por Django 4.2.7 el 2026-10-18 16:07
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_vote_counters(apps, schema_editor):
+    """
+    Rellena los contadores nuevos a partir de los votos que ya existen.
+
+    Se usa una sola consulta agrupada por opción en lugar de contar una por una.
+    """
+    Choice = apps.get_model('polls', 'Choice')
+    Question = apps.get_model('polls', 'Question')
+    Vote = apps.get_model('polls', 'Vote')
+
+    totals_by_question = {}
+    rows = Vote.objects.values_list('choice', 'choice__question').annotate(n=Count('id')).order_by()
+    for choice_id, question_id, n in rows:
+        Choice.objects.filter(pk=choice_id).update(votes=n)
+        totals_by_question[question_id] = totals_by_question.get(question_id, 0) + n
+
+    for question_id, total in totals_by_question.items():
+        Question.objects.filter(pk=question_id).update(votes=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='choice',
+            name='votes',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Votos'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='votes',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Total de votos'),
+        ),
+        migrations.RunPython(backfill_vote_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generado por Django 4.2.7 el 2026-10-18 16:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0002_vote_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='counter_shards',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Sube este número para encuestas con muchísimos votos simultáneos', verbose_name='Fragmentos del contador'),
+        ),
+        migrations.CreateModel(
+            name='ChoiceCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField(verbose_name='Fragmento')),
+                ('votes', models.PositiveIntegerField(default=0, verbose_name='Votos')),
+                ('choice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counter_shards', to='polls.choice', verbose_name='Opción')),
+            ],
+            options={
+                'verbose_name': 'Fragmento de contador',
+                'verbose_name_plural': 'Fragmentos de contador',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='choicecountershard',
+            constraint=models.UniqueConstraint(fields=('choice', 'shard'), name='unique_counter_shard_per_choice'),
+        ),
+    ]
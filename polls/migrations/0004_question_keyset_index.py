@@ -0,0 +1,17 @@
+# Generado por Django 4.2.7 el 2026-10-18 16:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0003_counter_shards'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['is_active', '-pub_date', '-id'], name='polls_question_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generado por Django 4.2.7 el 2026-10-18 16:23
+
+from django.db import migrations, models, transaction
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+# Votos que se actualizan por transacción al rellenar la columna nueva
+BACKFILL_CHUNK_SIZE = 5000
+
+
+def backfill_vote_question(apps, schema_editor):
+    """
+    Copia la pregunta de cada voto (choice.question) en la columna nueva.
+
+    Se avanza por rangos de id y cada rango se guarda en su propia
+    transacción, así una tabla grande no queda bloqueada todo el tiempo.
+    """
+    Choice = apps.get_model('polls', 'Choice')
+    Vote = apps.get_model('polls', 'Vote')
+
+    question_of_choice = Subquery(
+        Choice.objects.filter(pk=OuterRef('choice_id')).values('question_id')[:1]
+    )
+    last_id = Vote.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    for start in range(0, last_id + 1, BACKFILL_CHUNK_SIZE):
+        with transaction.atomic():
+            Vote.objects.filter(
+                id__gte=start,
+                id__lt=start + BACKFILL_CHUNK_SIZE,
+                question__isnull=True,
+            ).update(question_id=question_of_choice)
+
+
+class Migration(migrations.Migration):
+
+    # Cada tramo del relleno hace commit por separado (ver backfill_vote_question)
+    atomic = False
+
+    dependencies = [
+        ('polls', '0004_question_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vote',
+            name='question',
+            field=models.ForeignKey(
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to='polls.question',
+                verbose_name='Pregunta',
+            ),
+        ),
+        migrations.RunPython(backfill_vote_question, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,91 @@
+# Generado por Django 4.2.7 el 2026-10-18 16:23
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+import django.db.models.deletion
+
+
+def remove_duplicate_votes(apps, schema_editor):
+    """
+    Deja un solo voto por pregunta y votante antes de agregar las restricciones.
+
+    Hasta ahora la unicidad era por opción: un mismo votante (IP o usuario)
+    pudo votar por dos opciones de la misma pregunta. Se conserva el primer
+    voto (el de menor id), se borran los demás y se recalculan los
+    contadores de las preguntas afectadas.
+    """
+    Choice = apps.get_model('polls', 'Choice')
+    ChoiceCounterShard = apps.get_model('polls', 'ChoiceCounterShard')
+    Question = apps.get_model('polls', 'Question')
+    Vote = apps.get_model('polls', 'Vote')
+
+    affected = set()
+    for field in ('voter_ip', 'user'):
+        duplicates = (
+            Vote.objects.filter(**{f'{field}__isnull': False})
+            .values('question', field)
+            .annotate(n=Count('id'), first_id=Min('id'))
+            .filter(n__gt=1)
+            .order_by()
+        )
+        for row in duplicates:
+            Vote.objects.filter(question=row['question'], **{field: row[field]}).exclude(
+                id=row['first_id']
+            ).delete()
+            affected.add(row['question'])
+
+    for question_id in affected:
+        counts = dict(
+            Vote.objects.filter(question=question_id)
+            .values_list('choice')
+            .annotate(n=Count('id'))
+            .order_by()
+        )
+        ChoiceCounterShard.objects.filter(choice__question=question_id).delete()
+        for choice_id in Choice.objects.filter(question=question_id).values_list('id', flat=True):
+            Choice.objects.filter(pk=choice_id).update(votes=counts.get(choice_id, 0))
+        Question.objects.filter(pk=question_id).update(votes=sum(counts.values()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0005_vote_question'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vote',
+            name='question',
+            field=models.ForeignKey(
+                editable=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to='polls.question',
+                verbose_name='Pregunta',
+            ),
+        ),
+        migrations.RemoveConstraint(
+            model_name='vote',
+            name='unique_user_vote_per_choice',
+        ),
+        migrations.RemoveConstraint(
+            model_name='vote',
+            name='unique_ip_vote_per_choice',
+        ),
+        migrations.RunPython(remove_duplicate_votes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='vote',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('user__isnull', False)),
+                fields=('question', 'user'),
+                name='unique_user_vote_per_question',
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name='vote',
+            constraint=models.UniqueConstraint(
+                fields=('question', 'voter_ip'),
+                name='unique_ip_vote_per_question',
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generado por Django 4.2.7 el 2026-10-18 16:26
+
+from django.db import migrations, models
+
+
+def backfill_voter_key(apps, schema_editor):
+    """
+    Calcula voter_key de los votos que ya existen, por tramos de id
+    (ver polls.voter_identity.rekey_votes).
+    """
+    from polls.voter_identity import rekey_votes
+
+    rekey_votes(apps.get_model('polls', 'Vote'), keep_ips=True)
+
+
+class Migration(migrations.Migration):
+
+    # Cada tramo del relleno hace commit por separado
+    atomic = False
+
+    dependencies = [
+        ('polls', '0006_vote_question_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vote',
+            name='voter_key',
+            field=models.BinaryField(editable=False, max_length=16, null=True, verbose_name='Clave del votante'),
+        ),
+        migrations.RunPython(backfill_voter_key, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generado por Django 4.2.7 el 2026-10-18 16:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0007_vote_voter_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vote',
+            name='voter_key',
+            field=models.BinaryField(editable=False, max_length=16, verbose_name='Clave del votante'),
+        ),
+        migrations.RemoveConstraint(
+            model_name='vote',
+            name='unique_ip_vote_per_question',
+        ),
+        migrations.RemoveIndex(
+            model_name='vote',
+            name='polls_vote_voter_i_115b01_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='vote',
+            constraint=models.UniqueConstraint(
+                fields=('question', 'voter_key'),
+                name='unique_voter_key_per_question',
+            ),
+        ),
+    ]
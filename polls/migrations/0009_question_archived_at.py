@@ -0,0 +1,18 @@
+# Generado por Django 4.2.7 el 2026-10-18 16:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0008_vote_voter_key_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Votos archivados el'),
+        ),
+    ]
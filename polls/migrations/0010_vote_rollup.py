@@ -0,0 +1,34 @@
+# Generado por Django 4.2.7 el 2026-10-18 16:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0009_question_archived_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('minute', 'Minuto'), ('hour', 'Hora'), ('day', 'Día')], max_length=6, verbose_name='Granularidad')),
+                ('bucket', models.DateTimeField(verbose_name='Inicio del intervalo')),
+                ('votes', models.PositiveIntegerField(default=0, verbose_name='Votos')),
+                ('choice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='polls.choice', verbose_name='Opción')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='polls.question', verbose_name='Pregunta')),
+            ],
+            options={
+                'verbose_name': 'Votos por intervalo',
+                'verbose_name_plural': 'Votos por intervalo',
+                'indexes': [models.Index(fields=['question', 'granularity', 'bucket'], name='polls_rollup_timeline_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='voterollup',
+            constraint=models.UniqueConstraint(fields=('choice', 'granularity', 'bucket'), name='unique_rollup_per_bucket'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generado por Django 4.2.7 el 2026-10-18 17:23
+
+from django.db import migrations, models
+
+
+def clear_plaintext_ips(apps, schema_editor):
+    """
+    En modo 'hash' borra las IPs en texto de los votos que ya existen.
+
+    Sus claves ya son el hash (migración 0007); solo faltaba vaciar voter_ip.
+    """
+    from polls.voter_identity import stores_ip
+
+    if not stores_ip():
+        apps.get_model('polls', 'Vote').objects.update(voter_ip=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0011_vote_voted_at_default'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vote',
+            name='voter_ip',
+            field=models.GenericIPAddressField(
+                blank=True,
+                help_text="Dirección IP desde donde se realizó el voto (vacía en modo 'hash')",
+                null=True,
+                verbose_name='IP del votante',
+            ),
+        ),
+        migrations.RunPython(clear_plaintext_ips, migrations.RunPython.noop),
+    ]
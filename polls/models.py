@@ -5,10 +5,17 @@ Los modelos definen la estructura de la base de datos y cómo se relacionan los
 Cada clase representa una tabla en la base de datos.
 """
 
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Sum
 from django.utils import timezone
 from django.contrib.auth.models import User
+from functools import partial
 import datetime
+import random
+
+from . import live, rollups
+from .voter_filter import voter_filters
+from .voter_identity import stored_ip, voter_key
 
 
 class Question(models.Model):
@@ -20,6 +27,9 @@ class Question(models.Model):
     - pub_date: Fecha y hora de publicación
     - created_by: Usuario que creó la pregunta (opcional)
     - is_active: Si la encuesta está activa o no
+    - votes: Contador desnormalizado con el total de votos de la encuesta
+    - counter_shards: En cuántas filas se reparte el contador de cada opción
+    - archived_at: Cuándo se archivaron sus votos (ver vote_archive.py)
     """
     
     # Campo de texto para la pregunta (máximo 200 caracteres)
@@ -55,6 +65,36 @@ class Question(models.Model):
         help_text="Las encuestas inactivas no aparecen en la lista principal"
     )
     
+    # Contador desnormalizado de votos
+    # Se actualiza con F() en la misma transacción que crea el Vote,
+    # así las páginas no tienen que hacer COUNT sobre toda la tabla de votos
+    votes = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Total de votos"
+    )
+    
+    # Número de fragmentos (shards) del contador de votos por opción
+    # Con 1 se incrementan directamente Choice.votes y Question.votes.
+    # Con más de 1, cada voto incrementa una fila ChoiceCounterShard al azar,
+    # así los votos concurrentes de una encuesta muy popular no compiten
+    # por la misma fila. Las lecturas suman los fragmentos.
+    counter_shards = models.PositiveSmallIntegerField(
+        default=1,
+        verbose_name="Fragmentos del contador",
+        help_text="Sube este número para encuestas con muchísimos votos simultáneos"
+    )
+    
+    # Fecha en que sus votos pasaron al archivo por columnas (ver vote_archive.py)
+    # Desde entonces Choice.votes / Question.votes son los totales finales y
+    # las filas de Vote ya no existen
+    archived_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Votos archivados el"
+    )
+    
     # Campos automáticos de auditoría
     created_at = models.DateTimeField(
         auto_now_add=True,
@@ -72,6 +112,12 @@ class Question(models.Model):
         verbose_name = "Pregunta"
         verbose_name_plural = "Preguntas"
         ordering = ['-pub_date']  # Ordenar por fecha de publicación (más recientes primero)
+        
+        # Índice para la paginación por cursor de la lista principal
+        # (filtra por is_active y ordena por -pub_date, -id; ver pagination.py)
+        indexes = [
+            models.Index(fields=['is_active', '-pub_date', '-id'], name='polls_question_keyset_idx'),
+        ]
 
     def __str__(self):
         """
@@ -92,12 +138,96 @@ class Question(models.Model):
 
     def total_votes(self):
         """
-        Calcula el total de votos para esta pregunta.
+        Devuelve el total de votos para esta pregunta.
+        
+        Lee el contador almacenado en la columna `votes`, sin contar filas de Vote.
+        Si la pregunta usa contadores fragmentados, suma también los fragmentos.
         
         Returns:
             int: Número total de votos
         """
-        return Vote.objects.filter(choice__question=self).count()
+        if self.counter_shards > 1:
+            pending = ChoiceCounterShard.objects.filter(
+                choice__question=self
+            ).aggregate(total=Sum('votes'))['total']
+            return self.votes + (pending or 0)
+        return self.votes
+
+    def add_votes(self, choice_id, amount=1, voted_at=None):
+        """
+        Suma votos a los contadores de una opción de esta pregunta.
+        
+        Sin fragmentos se incrementan Choice.votes y Question.votes con F().
+        Con fragmentos se incrementa una fila ChoiceCounterShard elegida al azar.
+        También se suman a los rollups por minuto/hora/día cuando se confirma
+        la transacción (ver rollups.py).
+        Debe llamarse dentro de la misma transacción que inserta los votos;
+        cuando esa transacción se confirma, se incrementa la versión de los
+        resultados en caché y se avisa a las conexiones en vivo (ver live.py).
+        
+        Args:
+            choice_id (int): ID de la opción votada
+            amount (int): Número de votos a sumar
+            voted_at (datetime): Cuándo se votó (por defecto, ahora)
+        """
+        if self.counter_shards > 1:
+            ChoiceCounterShard.increment(choice_id, random.randrange(self.counter_shards), amount)
+        else:
+            Choice.objects.filter(pk=choice_id).update(votes=F('votes') + amount)
+            Question.objects.filter(pk=self.pk).update(votes=F('votes') + amount)
+        rollups.record_votes(self.pk, choice_id, voted_at or timezone.now(), amount)
+        transaction.on_commit(partial(live.results_changed, self.pk))
+
+    def compact_counters(self):
+        """
+        Pasa los votos de los fragmentos a Choice.votes y Question.votes.
+        
+        Resta a cada fragmento lo que se movió (en lugar de borrarlo), así no se
+        pierden los votos que lleguen mientras se compacta. Después borra los
+        fragmentos que quedaron en cero.
+        
+        Returns:
+            int: Número de votos movidos desde los fragmentos
+        """
+        moved = 0
+        with transaction.atomic():
+            shards = ChoiceCounterShard.objects.filter(
+                choice__question=self, votes__gt=0
+            ).values_list('id', 'choice_id', 'votes')
+            for shard_id, choice_id, votes in shards:
+                ChoiceCounterShard.objects.filter(pk=shard_id).update(votes=F('votes') - votes)
+                Choice.objects.filter(pk=choice_id).update(votes=F('votes') + votes)
+                moved += votes
+            if moved:
+                Question.objects.filter(pk=self.pk).update(votes=F('votes') + moved)
+            ChoiceCounterShard.objects.filter(choice__question=self, votes=0).delete()
+        self.votes += moved
+        return moved
+
+    def recount_votes(self):
+        """
+        Recalcula los contadores de la pregunta y sus opciones desde la tabla Vote.
+        
+        Solo hace falta para reparar contadores (por ejemplo, después de borrar
+        votos desde el admin). Usa una única consulta agrupada por opción.
+        Si la pregunta está archivada, cuenta también los votos del archivo
+        (ver vote_archive.py).
+        
+        Returns:
+            int: El nuevo total de votos
+        """
+        # Importación local para evitar una importación circular con results.py
+        from .results import count_votes
+        
+        counts = count_votes(self)
+        with transaction.atomic():
+            ChoiceCounterShard.objects.filter(choice__question=self).delete()
+            for choice in self.choice_set.all():
+                Choice.objects.filter(pk=choice.pk).update(votes=counts.get(choice.pk, 0))
+            self.votes = sum(counts.values())
+            Question.objects.filter(pk=self.pk).update(votes=self.votes)
+            transaction.on_commit(partial(live.results_changed, self.pk))
+        return self.votes
 
     def get_results(self):
         """
@@ -106,19 +236,10 @@ class Question(models.Model):
         Returns:
             dict: Diccionario con los resultados por opción
         """
-        results = {}
-        total_votes = self.total_votes()
+        # Importación local para evitar una importación circular con results.py
+        from .results import tally_question
         
-        for choice in self.choice_set.all():
-            vote_count = choice.vote_count()
-            percentage = (vote_count / total_votes * 100) if total_votes > 0 else 0
-            results[choice.id] = {
-                'choice_text': choice.choice_text,
-                'votes': vote_count,
-                'percentage': round(percentage, 2)
-            }
-        
-        return results
+        return tally_question(self.pk).as_dict()
 
 
 class Choice(models.Model):
@@ -128,6 +249,7 @@ class Choice(models.Model):
     Campos:
     - question: Relación con la pregunta a la que pertenece
     - choice_text: Texto de la opción
+    - votes: Contador desnormalizado de votos de esta opción
     """
     
     # Relación con Question (una pregunta puede tener muchas opciones)
@@ -147,6 +269,13 @@ class Choice(models.Model):
         help_text="Escribe el texto de esta opción de respuesta"
     )
     
+    # Contador desnormalizado de votos (ver Question.votes)
+    votes = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Votos"
+    )
+    
     # Campos automáticos de auditoría
     created_at = models.DateTimeField(
         auto_now_add=True,
@@ -169,12 +298,18 @@ class Choice(models.Model):
 
     def vote_count(self):
         """
-        Cuenta el número de votos para esta opción.
+        Devuelve el número de votos para esta opción.
+        
+        Lee el contador almacenado en la columna `votes` (más los fragmentos
+        si la pregunta usa contadores fragmentados).
         
         Returns:
             int: Número de votos para esta opción
         """
-        return self.vote_set.count()
+        if self.question.counter_shards > 1:
+            pending = self.counter_shards.aggregate(total=Sum('votes'))['total']
+            return self.votes + (pending or 0)
+        return self.votes
 
     def vote_percentage(self):
         """
@@ -189,6 +324,169 @@ class Choice(models.Model):
         return (self.vote_count() / total_votes) * 100
 
 
+class ChoiceCounterShard(models.Model):
+    """
+    Fragmento del contador de votos de una opción.
+    
+    Cuando una pregunta tiene counter_shards > 1, cada voto incrementa uno de
+    estos fragmentos al azar en lugar de la fila de la opción. El total real de
+    una opción es Choice.votes más la suma de sus fragmentos.
+    
+    Nota: en SQLite todas las escrituras se serializan igual (bloqueo de toda la
+    base), así que los fragmentos ayudan sobre todo en bases con bloqueo por fila
+    como PostgreSQL o MySQL.
+    
+    Campos:
+    - choice: Opción a la que pertenece el fragmento
+    - shard: Número de fragmento (0 .. counter_shards - 1)
+    - votes: Votos acumulados en este fragmento
+    """
+    
+    choice = models.ForeignKey(
+        Choice,
+        on_delete=models.CASCADE,
+        related_name='counter_shards',
+        verbose_name="Opción"
+    )
+    shard = models.PositiveSmallIntegerField(verbose_name="Fragmento")
+    votes = models.PositiveIntegerField(default=0, verbose_name="Votos")
+
+    class Meta:
+        """
+        Metadatos del modelo ChoiceCounterShard.
+        """
+        verbose_name = "Fragmento de contador"
+        verbose_name_plural = "Fragmentos de contador"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['choice', 'shard'],
+                name='unique_counter_shard_per_choice'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Opción {self.choice_id} / fragmento {self.shard}: {self.votes}"
+
+    @classmethod
+    def increment(cls, choice_id, shard, amount=1):
+        """
+        Incrementa un fragmento, creándolo si todavía no existe.
+        
+        Args:
+            choice_id (int): ID de la opción
+            shard (int): Número de fragmento
+            amount (int): Votos a sumar
+        """
+        updated = cls.objects.filter(choice_id=choice_id, shard=shard).update(
+            votes=F('votes') + amount
+        )
+        if updated:
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(choice_id=choice_id, shard=shard, votes=amount)
+        except IntegrityError:
+            # Otro voto creó el fragmento al mismo tiempo
+            cls.objects.filter(choice_id=choice_id, shard=shard).update(
+                votes=F('votes') + amount
+            )
+
+
+class VoteRollup(models.Model):
+    """
+    Votos de una opción dentro de un intervalo de tiempo (minuto, hora o día).
+    
+    Se mantienen al votar, por lotes (ver rollups.record_votes), y alimentan el gráfico
+    de evolución de los resultados sin recorrer la tabla Vote.
+    
+    Campos:
+    - question: Pregunta (copiada de choice, para leer un rango con un índice)
+    - choice: Opción votada
+    - granularity: Tamaño del intervalo
+    - bucket: Inicio del intervalo (UTC)
+    - votes: Votos de la opción en ese intervalo
+    """
+    
+    GRANULARITY_CHOICES = [
+        ('minute', 'Minuto'),
+        ('hour', 'Hora'),
+        ('day', 'Día'),
+    ]
+    
+    question = models.ForeignKey(
+        Question,
+        on_delete=models.CASCADE,
+        related_name='rollups',
+        verbose_name="Pregunta"
+    )
+    choice = models.ForeignKey(
+        Choice,
+        on_delete=models.CASCADE,
+        related_name='rollups',
+        verbose_name="Opción"
+    )
+    granularity = models.CharField(
+        max_length=6,
+        choices=GRANULARITY_CHOICES,
+        verbose_name="Granularidad"
+    )
+    bucket = models.DateTimeField(verbose_name="Inicio del intervalo")
+    votes = models.PositiveIntegerField(default=0, verbose_name="Votos")
+
+    class Meta:
+        """
+        Metadatos del modelo VoteRollup.
+        """
+        verbose_name = "Votos por intervalo"
+        verbose_name_plural = "Votos por intervalo"
+        # El endpoint /timeline/ lee (pregunta, granularidad, rango de fechas)
+        indexes = [
+            models.Index(fields=['question', 'granularity', 'bucket'], name='polls_rollup_timeline_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['choice', 'granularity', 'bucket'],
+                name='unique_rollup_per_bucket'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Opción {self.choice_id} / {self.granularity} {self.bucket:%Y-%m-%d %H:%M}: {self.votes}"
+
+
+def recount_questions(question_ids):
+    """
+    Recalcula los contadores de varias preguntas (ver Question.recount_votes).
+    
+    Se usa después de borrar votos: Choice.votes y Question.votes solo se
+    incrementan al votar, así que al borrar hay que volver a contarlos.
+    """
+    for question in Question.objects.filter(pk__in=set(question_ids)):
+        question.recount_votes()
+
+
+class VoteQuerySet(models.QuerySet):
+    """
+    QuerySet de Vote que mantiene los contadores al borrar.
+    """
+    
+    def delete(self, recount=True):
+        """
+        Borra los votos y recalcula los contadores de sus preguntas, en la misma transacción.
+        
+        Args:
+            recount (bool): False si los contadores ya están bien (por ejemplo,
+                al borrar filas ya archivadas, ver vote_archive.py)
+        """
+        if not recount:
+            return super().delete()
+        with transaction.atomic():
+            question_ids = list(self.order_by().values_list('question_id', flat=True).distinct())
+            result = super().delete()
+            recount_questions(question_ids)
+        return result
+
+
 class Vote(models.Model):
     """
     Modelo que representa un voto individual.
@@ -201,7 +499,10 @@ class Vote(models.Model):
     
     Campos:
     - choice: La opción por la que se votó
-    - voter_ip: IP del votante (para prevenir votos duplicados de IPs anónimas)
+    - question: La pregunta de esa opción (copiada de choice al guardar)
+    - voter_ip: IP del votante (para mostrarla en el admin; vacía en el modo
+      'hash' de voter_identity.py)
+    - voter_key: IP en forma binaria compacta (para prevenir votos duplicados)
     - user: Usuario que votó (si está autenticado)
     - voted_at: Cuándo se realizó el voto
     """
@@ -214,10 +515,33 @@ class Vote(models.Model):
         help_text="La opción por la que votó el usuario"
     )
     
+    # Pregunta del voto (desnormalizada: siempre es choice.question)
+    # Permite que la base de datos impida votar dos veces en la misma pregunta
+    # y buscar el voto de alguien sin hacer JOIN con Choice
+    question = models.ForeignKey(
+        Question,
+        on_delete=models.CASCADE,
+        editable=False,
+        verbose_name="Pregunta"
+    )
+    
     # IP del votante (para usuarios anónimos)
+    # Con POLLS_VOTER_IDENTITY['MODE'] = 'hash' no se guarda (queda NULL):
+    # solo queda la clave, de la que no se puede recuperar la IP
     voter_ip = models.GenericIPAddressField(
+        null=True,
+        blank=True,
         verbose_name="IP del votante",
-        help_text="Dirección IP desde donde se realizó el voto"
+        help_text="Dirección IP desde donde se realizó el voto (vacía en modo 'hash')"
+    )
+    
+    # Clave binaria de 16 bytes calculada a partir de la IP (ver voter_identity.py)
+    # Es la que se indexa y se usa para buscar votos e impedir duplicados:
+    # ocupa mucho menos que el texto de la IP en los índices
+    voter_key = models.BinaryField(
+        max_length=16,
+        editable=False,
+        verbose_name="Clave del votante"
     )
     
     # Usuario que votó (opcional, para usuarios autenticados)
@@ -231,10 +555,16 @@ class Vote(models.Model):
     )
     
     # Fecha y hora del voto
+    # Se usa default y no auto_now_add para que import_votes pueda cargar
+    # votos con su fecha original (auto_now_add la pisaría con la actual)
     voted_at = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
+        editable=False,
         verbose_name="Fecha y hora del voto"
     )
+    
+    # Al borrar votos se recalculan los contadores (ver VoteQuerySet.delete)
+    objects = VoteQuerySet.as_manager()
 
     class Meta:
         """
@@ -247,24 +577,25 @@ class Vote(models.Model):
         # Índices para mejorar el rendimiento de las consultas
         indexes = [
             models.Index(fields=['choice', 'voted_at']),
-            models.Index(fields=['voter_ip', 'choice']),
         ]
         
-        # Restricciones simplificadas para evitar votos duplicados
-        # Nota: Para restricciones más complejas que involucren relaciones,
-        # es mejor manejarlas en la lógica de las vistas
+        # Restricciones para evitar votos duplicados en una misma pregunta
+        # Las vistas solo intentan el INSERT: si choca con alguna de estas
+        # restricciones (IntegrityError), el votante ya había votado.
+        # También sirven de índice para buscar el voto de un votante.
         constraints = [
-            # Un usuario autenticado no puede votar dos veces por la misma opción
+            # Un usuario autenticado no puede votar dos veces en la misma pregunta
             models.UniqueConstraint(
-                fields=['choice', 'user'],
+                fields=['question', 'user'],
                 condition=models.Q(user__isnull=False),
-                name='unique_user_vote_per_choice'
+                name='unique_user_vote_per_question'
             ),
-            # Una IP no puede votar dos veces por la misma opción (para usuarios anónimos)
+            # Una IP no puede votar dos veces en la misma pregunta
+            # (con o sin usuario, igual que la regla de la vista vote)
+            # Se compara la clave binaria de la IP, no su texto
             models.UniqueConstraint(
-                fields=['choice', 'voter_ip'],
-                condition=models.Q(user__isnull=True),
-                name='unique_ip_vote_per_choice'
+                fields=['question', 'voter_key'],
+                name='unique_voter_key_per_question'
             ),
         ]
 
@@ -272,9 +603,40 @@ class Vote(models.Model):
         """
         Representación en string del objeto.
         """
-        voter = self.user.username if self.user else f"IP: {self.voter_ip}"
+        voter = self.user.username if self.user else f"IP: {self.voter_ip or 'oculta'}"
         return f"{voter} votó por '{self.choice.choice_text}' en '{self.choice.question.question_text[:30]}...'"
 
+    def save(self, *args, **kwargs):
+        """
+        Guarda el voto y, si es nuevo, incrementa los contadores desnormalizados.
+        
+        Antes copia la pregunta de la opción en `question` y calcula `voter_key`
+        a partir de la IP (en modo 'hash' la IP no se guarda, ver stored_ip). El INSERT del voto y los incrementos (ver Question.add_votes) se hacen en
+        la misma transacción, así los contadores nunca quedan desalineados.
+        """
+        adding = self._state.adding
+        self.question_id = self.choice.question_id
+        if self.voter_ip:
+            self.voter_key = voter_key(self.voter_ip)
+            self.voter_ip = stored_ip(self.voter_ip)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                self.choice.question.add_votes(self.choice_id, voted_at=self.voted_at)
+                voter_filters.add_vote(self.question_id, self.voter_key, self.user_id)
+
+    def delete(self, *args, **kwargs):
+        """
+        Borra el voto y recalcula los contadores de su pregunta, en la misma transacción.
+        
+        Los votos que se borran en cascada (al borrar una opción o un
+        usuario) se recuentan desde signals.py.
+        """
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            recount_questions([self.question_id])
+        return result
+
     def get_question(self):
         """
         Obtiene la pregunta asociada con este voto.
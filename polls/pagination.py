@@ -0,0 +1,174 @@
+"""
+Paginación por cursor (keyset) para la lista de encuestas.
+
+Paginator hace un COUNT(*) en cada petición y pide cada página con OFFSET,
+que obliga a la base de datos a recorrer y descartar todas las filas
+anteriores: cuanto más atrás está la página, más lenta. Aquí cada página
+continúa desde la última fila de la anterior, ordenando por (-pub_date, -id)
+con un índice compuesto que lo cubre (ver Question.Meta.indexes), así que
+cualquier página cuesta lo mismo.
+
+El cursor es opaco para el navegador: codifica la dirección y la clave
+(pub_date, id) de la fila desde la que se sigue.
+
+El total de encuestas se guarda en caché unos segundos en lugar de contarlo
+en cada petición (ver cached_count).
+
+Configuración en settings.py:
+    POLLS_PAGINATION = {
+        'PER_PAGE': 5,          # Encuestas por página
+        'COUNT_TIMEOUT': 60,    # Segundos que se guarda el total en caché
+    }
+"""
+
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from . import results_cache
+
+DEFAULTS = {
+    'PER_PAGE': 5,
+    'COUNT_TIMEOUT': 60,
+}
+
+PUBLISHED_COUNT_KEY = 'polls:questions:published_count'
+
+
+def get_config():
+    """Devuelve la configuración de la paginación mezclada con los valores por defecto."""
+    return {**DEFAULTS, **getattr(settings, 'POLLS_PAGINATION', {})}
+
+
+def encode_cursor(direction, question):
+    """
+    Arma un cursor opaco a partir de una pregunta.
+
+    Args:
+        direction (str): 'n' (siguiente página) o 'p' (página anterior)
+        question (Question): Fila desde la que se sigue
+    """
+    raw = f'{direction}|{question.pub_date.isoformat()}|{question.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Lee un cursor armado por encode_cursor().
+
+    Returns:
+        tuple | None: (dirección, pub_date, id), o None si el cursor no es válido
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        direction, pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in ('n', 'p') or pub_date is None:
+        return None
+    return direction, pub_date, pk
+
+
+class KeysetPage:
+    """
+    Una página de resultados paginados por cursor.
+
+    Se recorre como una lista y tiene los enlaces a la página siguiente y
+    anterior (como cursores), en lugar de números de página.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def paginate(queryset, cursor=None, per_page=None):
+    """
+    Devuelve una página de preguntas ordenadas por (-pub_date, -id).
+
+    Args:
+        queryset: QuerySet de Question (el orden se reemplaza)
+        cursor (str): Cursor recibido en ?cursor=, o None para la primera página
+        per_page (int): Preguntas por página (por defecto PER_PAGE)
+
+    Returns:
+        KeysetPage: La página pedida (la primera si el cursor no es válido)
+    """
+    per_page = per_page or get_config()['PER_PAGE']
+    position = decode_cursor(cursor)
+
+    if position is None:
+        rows = list(queryset.order_by('-pub_date', '-id')[:per_page + 1])
+        has_more, rows = len(rows) > per_page, rows[:per_page]
+        has_before = False
+    else:
+        direction, pub_date, pk = position
+        if direction == 'n':
+            rows = list(
+                queryset.filter(Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk))
+                .order_by('-pub_date', '-id')[:per_page + 1]
+            )
+            has_more, rows = len(rows) > per_page, rows[:per_page]
+            has_before = True
+        else:
+            # Hacia atrás: se piden las filas en orden inverso y se dan vuelta
+            rows = list(
+                queryset.filter(Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, id__gt=pk))
+                .order_by('pub_date', 'id')[:per_page + 1]
+            )
+            has_before, rows = len(rows) > per_page, rows[:per_page][::-1]
+            has_more = True
+
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor('n', rows[-1]) if has_more and rows else None,
+        previous_cursor=encode_cursor('p', rows[0]) if has_before and rows else None,
+    )
+
+
+def cached_count(queryset, key=PUBLISHED_COUNT_KEY):
+    """
+    Cuenta las filas de un QuerySet guardando el resultado en caché COUNT_TIMEOUT segundos.
+
+    El número puede quedar atrasado unos segundos (por ejemplo cuando llega la
+    fecha de publicación de una encuesta), pero se borra al guardar o eliminar
+    una pregunta (ver signals.py).
+    """
+    cache = caches[results_cache.get_config()['ALIAS']]
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, get_config()['COUNT_TIMEOUT'])
+    return count
+
+
+def invalidate_count(key=PUBLISHED_COUNT_KEY):
+    """Borra el total guardado en caché para que se vuelva a contar."""
+    caches[results_cache.get_config()['ALIAS']].delete(key)
@@ -0,0 +1,200 @@
+"""
+Cálculo de resultados de las encuestas.
+
+Este módulo concentra el cálculo de votos y porcentajes para una o varias
+preguntas. Todo sale de una sola consulta sobre Choice (que ya guarda su
+contador de votos) agrupada por opción para sumar los fragmentos del
+contador, así que el número de consultas y la memoria usada no dependen de
+cuántos votos tenga la encuesta.
+
+Uso típico:
+    from polls.results import annotate_results, tally, tally_question
+
+    resultados = tally_question(question.id)
+    por_pregunta = tally([1, 2, 3])
+    preguntas = annotate_results(Question.objects.all())
+
+Para contar votos individuales (por ejemplo, en un rango de fechas) está
+count_votes(), que lee también los votos archivados (ver vote_archive.py).
+"""
+
+from collections import Counter
+from typing import NamedTuple
+
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from . import vote_archive
+from .models import Choice, ChoiceCounterShard, Vote
+
+
+class ChoiceResult(NamedTuple):
+    """
+    Resultado de una opción.
+
+    Tiene `id` y `choice_text` igual que Choice, así las plantillas pueden
+    usarlo en lugar del objeto Choice.
+    """
+    id: int
+    choice_text: str
+    votes: int
+    percentage: float
+
+
+class QuestionResults(NamedTuple):
+    """
+    Resultados inmutables de una pregunta.
+
+    Campos:
+    - question_id: ID de la pregunta
+    - total_votes: Suma de los votos de todas sus opciones
+    - choices: Tupla de ChoiceResult en el orden de las opciones
+    """
+    question_id: int
+    total_votes: int
+    choices: tuple
+
+    def as_dict(self, precision=2):
+        """
+        Devuelve los resultados con el formato de Question.get_results().
+
+        Args:
+            precision (int): Decimales para redondear los porcentajes
+
+        Returns:
+            dict: {choice_id: {'choice_text', 'votes', 'percentage'}}
+        """
+        return {
+            choice.id: {
+                'choice_text': choice.choice_text,
+                'votes': choice.votes,
+                'percentage': round(choice.percentage, precision),
+            }
+            for choice in self.choices
+        }
+
+
+def _build(question_id, rows):
+    """Arma un QuestionResults a partir de filas (id, texto, votos)."""
+    total = sum(votes for _, _, votes in rows)
+    choices = tuple(
+        ChoiceResult(
+            id=choice_id,
+            choice_text=choice_text,
+            votes=votes,
+            percentage=(votes / total * 100) if total > 0 else 0,
+        )
+        for choice_id, choice_text, votes in rows
+    )
+    return QuestionResults(question_id=question_id, total_votes=total, choices=choices)
+
+
+def tally(question_ids):
+    """
+    Calcula los resultados de varias preguntas con una sola consulta.
+
+    Args:
+        question_ids: Iterable con IDs de preguntas
+
+    Returns:
+        dict: {question_id: QuestionResults}. Las preguntas sin opciones
+        (o que no existen) aparecen con total 0 y sin opciones.
+    """
+    question_ids = list(dict.fromkeys(question_ids))
+    if not question_ids:
+        return {}
+
+    rows_by_question = {question_id: [] for question_id in question_ids}
+    rows = (
+        Choice.objects.filter(question_id__in=question_ids)
+        .annotate(shard_votes=Coalesce(Sum('counter_shards__votes'), 0))
+        .order_by('question_id', 'id')
+        .values_list('question_id', 'id', 'choice_text', 'votes', 'shard_votes')
+    )
+    for question_id, choice_id, choice_text, votes, shard_votes in rows:
+        rows_by_question[question_id].append((choice_id, choice_text, votes + shard_votes))
+
+    return {
+        question_id: _build(question_id, rows)
+        for question_id, rows in rows_by_question.items()
+    }
+
+
+def tally_question(question_id):
+    """
+    Calcula los resultados de una sola pregunta.
+
+    Args:
+        question_id (int): ID de la pregunta
+
+    Returns:
+        QuestionResults: Resultados de la pregunta
+    """
+    return tally([question_id])[question_id]
+
+
+def annotate_results(queryset):
+    """
+    Agrega total_votes_count y choices_count a un QuerySet de preguntas.
+    
+    Los dos valores salen como subconsultas de la misma consulta que trae las
+    preguntas, así una página de la lista no hace consultas extra por pregunta.
+    
+    Args:
+        queryset: QuerySet de Question
+        
+    Returns:
+        QuerySet: El mismo QuerySet con las dos anotaciones
+    """
+    choices_count = (
+        Choice.objects.filter(question=OuterRef('pk'))
+        .order_by()
+        .values('question')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    shard_votes = (
+        ChoiceCounterShard.objects.filter(choice__question=OuterRef('pk'))
+        .order_by()
+        .values('choice__question')
+        .annotate(total=Sum('votes'))
+        .values('total')
+    )
+    return queryset.annotate(
+        choices_count=Coalesce(Subquery(choices_count), 0),
+        total_votes_count=F('votes') + Coalesce(Subquery(shard_votes), 0),
+    )
+
+
+def count_votes(question, since=None, until=None):
+    """
+    Cuenta los votos de una pregunta por opción a partir de los votos individuales.
+    
+    Si la pregunta está archivada suma los votos del archivo (leído con mmap,
+    sin cargarlo entero) y las filas de Vote posteriores al archivo, así quien
+    llama no necesita saber dónde están los votos.
+    
+    Args:
+        question (Question): La pregunta
+        since (datetime): Solo votos desde esta fecha (incluida)
+        until (datetime): Solo votos anteriores a esta fecha
+        
+    Returns:
+        Counter: {choice_id: votos}
+    """
+    votes = Vote.objects.filter(question=question)
+    if since is not None:
+        votes = votes.filter(voted_at__gte=since)
+    if until is not None:
+        votes = votes.filter(voted_at__lt=until)
+    
+    counts = Counter()
+    archive = vote_archive.open_archive(question.pk) if question.archived_at else None
+    if archive is not None:
+        with archive:
+            counts.update(archive.tally(since, until))
+            votes = votes.filter(id__gt=archive.last_vote_id)
+    counts.update(dict(
+        votes.order_by().values_list('choice').annotate(n=Count('id'))
+    ))
+    return counts
@@ -0,0 +1,175 @@
+"""
+Caché de resultados por pregunta con versión.
+
+Cada pregunta tiene un número de versión que solo crece y que se incrementa
+cuando se confirma (commit) un voto. Los resultados ya serializados a JSON se
+guardan con la clave (pregunta, versión), así que mientras nadie vote todas
+las pestañas abiertas reciben los mismos bytes sin recalcular nada.
+
+Funciona sobre el framework de caché de Django (file en un servidor; Redis
+o Memcached cuando hay varios servidores).
+
+La caché tiene que ser compartida por todos los procesos: con LocMemCache
+cada proceso tiene la suya, un voto sube la versión solo en el proceso que
+lo recibió y los demás siguen entregando los resultados viejos (y
+respondiendo 304). `manage.py check --deploy` avisa (ver checks.py). El
+filtro de votantes (voter_filter.py) se refresca con estas mismas versiones.
+
+Las claves de versión no vencen: una versión solo cambia cuando llega un
+voto, y así los clientes reciben 304 mientras nadie vota.
+
+Configuración en settings.py:
+    POLLS_RESULTS_CACHE = {
+        'ALIAS': 'default',   # Qué caché de CACHES usar
+        'TIMEOUT': 300,       # Segundos que se guarda cada versión
+    }
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import metrics
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+}
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def get_config():
+    """Devuelve la configuración de la caché mezclada con los valores por defecto."""
+    return {**DEFAULTS, **getattr(settings, 'POLLS_RESULTS_CACHE', {})}
+
+
+def _cache():
+    return caches[get_config()['ALIAS']]
+
+
+def is_process_local():
+    """Indica si la caché de resultados vive en la memoria de cada proceso (LocMemCache)."""
+    return isinstance(_cache(), LocMemCache)
+
+
+def version_key(question_id):
+    return f'polls:results:version:{question_id}'
+
+
+def payload_key(question_id, version):
+    return f'polls:results:payload:{question_id}:{version}'
+
+
+def _initial_version():
+    """
+    Versión inicial cuando la clave no existe (o la caché la perdió).
+
+    Se usan los microsegundos actuales, así una versión nueva siempre es
+    mayor que cualquiera que se haya entregado antes de perder la clave.
+    """
+    return time.time_ns() // 1000
+
+
+def get_version(question_id):
+    """
+    Devuelve la versión actual de los resultados de una pregunta.
+
+    Es una sola lectura de caché: no toca la base de datos.
+    """
+    cache = _cache()
+    version = cache.get(version_key(question_id))
+    if version is None:
+        cache.add(version_key(question_id), _initial_version(), timeout=None)
+        version = cache.get(version_key(question_id))
+    return version
+
+
+async def aget_version(question_id):
+    """Versión asíncrona de get_version(), para vistas async."""
+    cache = _cache()
+    version = await cache.aget(version_key(question_id))
+    if version is None:
+        await cache.aadd(version_key(question_id), _initial_version(), timeout=None)
+        version = await cache.aget(version_key(question_id))
+    return version
+
+
+def get_versions(question_ids):
+    """
+    Devuelve {question_id: versión} para varias preguntas con una lectura múltiple.
+    """
+    question_ids = list(question_ids)
+    cache = _cache()
+    found = cache.get_many([version_key(question_id) for question_id in question_ids])
+    versions = {}
+    for question_id in question_ids:
+        version = found.get(version_key(question_id))
+        versions[question_id] = version if version is not None else get_version(question_id)
+    return versions
+
+
+def bump_version(question_id):
+    """
+    Cambia la versión de una pregunta (se llama cuando se confirma un voto).
+
+    No se usa cache.incr(): en FileBasedCache es leer y escribir, y dos
+    procesos que votan a la vez podrían dejar la misma versión (con
+    resultados guardados sin uno de los votos). Cada cambio guarda en
+    cambio los microsegundos actuales, que no se repiten entre votos, y
+    nunca menos que la versión anterior + 1.
+
+    Returns:
+        int: La nueva versión
+    """
+    cache = _cache()
+    version = max(_initial_version(), (cache.get(version_key(question_id)) or 0) + 1)
+    cache.set(version_key(question_id), version, timeout=None)
+    return version
+
+
+def get_payload(question_id, version):
+    """
+    Busca los resultados serializados de una versión.
+
+    Returns:
+        bytes | None: El JSON guardado, o None si no está en caché
+    """
+    payload = _cache().get(payload_key(question_id, version))
+    with _stats_lock:
+        _stats['hits' if payload is not None else 'misses'] += 1
+    metrics.inc('polls_results_cache_total', result='hit' if payload is not None else 'miss')
+    return payload
+
+
+async def aget_payload(question_id, version):
+    """Versión asíncrona de get_payload()."""
+    payload = await _cache().aget(payload_key(question_id, version))
+    with _stats_lock:
+        _stats['hits' if payload is not None else 'misses'] += 1
+    metrics.inc('polls_results_cache_total', result='hit' if payload is not None else 'miss')
+    return payload
+
+
+def set_payload(question_id, version, payload):
+    """Guarda los resultados serializados de una versión."""
+    _cache().set(payload_key(question_id, version), payload, get_config()['TIMEOUT'])
+
+
+async def aset_payload(question_id, version, payload):
+    """Versión asíncrona de set_payload()."""
+    await _cache().aset(payload_key(question_id, version), payload, get_config()['TIMEOUT'])
+
+
+def stats():
+    """
+    Devuelve los contadores de aciertos y fallos de este proceso.
+
+    Los de todos los procesos están en /metrics (polls_results_cache_total).
+    """
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,306 @@
+"""
+Votos agrupados por intervalos de tiempo (rollups) para los gráficos de evolución.
+
+Contar "votos por minuto y por opción" desde Vote.voted_at en cada petición
+obligaría a recorrer todos los votos de la encuesta. En su lugar, cada voto
+suma 1 a la fila VoteRollup de su minuto, su hora y su día, y el endpoint
+/<id>/timeline/ solo lee esas filas: como mucho una por opción e intervalo.
+
+Esas filas son muy disputadas (todos los votos de un minuto van a la misma),
+así que los votos no las escriben dentro de su transacción: cuando el voto
+se confirma, su incremento se anota en memoria (RollupBuffer) y cada
+FLUSH_SECONDS se escriben juntos, un UPDATE por fila en lugar de uno por
+voto. Si la escritura falla (por ejemplo "database is locked" en SQLite
+durante una ráfaga de votos) los incrementos vuelven al buffer y se
+reintentan. Si el proceso termina de golpe se pueden perder los pendientes;
+rebuild_vote_rollups los recalcula desde Vote.
+
+- record_votes(): incremento al votar (lo llama Question.add_votes, en la
+  misma transacción que el voto; se anota al confirmarse).
+- rebuild(): recalcula los rollups de una pregunta desde Vote y desde el
+  archivo de votos (comando rebuild_vote_rollups).
+- timeline(): lee los rollups de un rango y los devuelve listos para Chart.js.
+
+Los intervalos empiezan en horas exactas UTC (los días, a las 00:00 UTC).
+
+Configuración en settings.py:
+    POLLS_TIMELINE = {
+        'GRANULARITIES': ['minute', 'hour', 'day'],  # Cuáles se mantienen al votar
+        'MAX_BUCKETS': 1500,                         # Intervalos máximos por petición
+        'FLUSH_SECONDS': 1.0,                        # Cada cuánto se escriben (0 = al confirmar)
+    }
+"""
+
+import atexit
+import datetime
+import logging
+import threading
+from collections import Counter
+from functools import partial
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDay, TruncHour, TruncMinute
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'GRANULARITIES': ['minute', 'hour', 'day'],
+    'MAX_BUCKETS': 1500,
+    'FLUSH_SECONDS': 1.0,
+}
+
+# Segundos hasta el reintento cuando falla una escritura con FLUSH_SECONDS = 0
+RETRY_SECONDS = 1.0
+
+# Duración de cada intervalo
+STEPS = {
+    'minute': datetime.timedelta(minutes=1),
+    'hour': datetime.timedelta(hours=1),
+    'day': datetime.timedelta(days=1),
+}
+
+# Rango por defecto de /timeline/ cuando no se manda ?from=
+DEFAULT_SPANS = {
+    'minute': datetime.timedelta(hours=1),
+    'hour': datetime.timedelta(days=2),
+    'day': datetime.timedelta(days=30),
+}
+
+TRUNCATE_FUNCTIONS = {
+    'minute': TruncMinute,
+    'hour': TruncHour,
+    'day': TruncDay,
+}
+
+
+def get_config():
+    """Devuelve la configuración de los rollups mezclada con los valores por defecto."""
+    return {**DEFAULTS, **getattr(settings, 'POLLS_TIMELINE', {})}
+
+
+def truncate(moment, granularity):
+    """Inicio (en UTC) del intervalo de `granularity` que contiene a `moment`."""
+    moment = moment.astimezone(datetime.timezone.utc)
+    if granularity == 'minute':
+        return moment.replace(second=0, microsecond=0)
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f'Granularidad desconocida: {granularity!r}')
+
+
+def write_counts(counts):
+    """
+    Suma votos a las filas VoteRollup, una sola escritura por fila.
+
+    Lo normal es que las filas ya existan, así que se intenta un UPDATE;
+    solo al empezar un intervalo nuevo se crea la fila.
+
+    Args:
+        counts (Counter): {(question_id, choice_id, granularity, bucket): votos}
+    """
+    from .models import VoteRollup
+
+    with transaction.atomic():
+        for (question_id, choice_id, granularity, bucket), amount in counts.items():
+            row = VoteRollup.objects.filter(choice_id=choice_id, granularity=granularity, bucket=bucket)
+            if row.update(votes=F('votes') + amount):
+                continue
+            try:
+                with transaction.atomic():
+                    VoteRollup.objects.create(
+                        question_id=question_id, choice_id=choice_id,
+                        granularity=granularity, bucket=bucket, votes=amount,
+                    )
+            except IntegrityError:
+                # Otro proceso creó la fila al mismo tiempo
+                row.update(votes=F('votes') + amount)
+
+
+class RollupBuffer:
+    """
+    Incrementos de rollups de este proceso que todavía no se escribieron.
+
+    Los votos confirmados se suman en memoria; un temporizador los escribe
+    FLUSH_SECONDS después del primero pendiente (con FLUSH_SECONDS = 0, en
+    el momento). Mil votos de un mismo minuto terminan en tres UPDATE. Si
+    la escritura falla, los incrementos vuelven a quedar pendientes y el
+    temporizador se programa de nuevo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._timer = None
+        self._flush_seconds = 0
+
+    def add(self, question_id, choice_id, moment, amount, granularities, flush_seconds):
+        """Anota un incremento (se llama cuando el voto ya está confirmado)."""
+        with self._lock:
+            for granularity in granularities:
+                self._pending[(question_id, choice_id, granularity, truncate(moment, granularity))] += amount
+            self._flush_seconds = flush_seconds
+            if flush_seconds > 0:
+                self._schedule(flush_seconds)
+        if flush_seconds <= 0:
+            self.flush()
+
+    def _schedule(self, seconds):
+        """Programa el temporizador si no hay uno (se llama con el lock tomado)."""
+        if self._timer is None:
+            self._timer = threading.Timer(seconds, self._flush_from_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # El hilo del temporizador no se vuelve a usar
+            connections.close_all()
+
+    def flush(self):
+        """
+        Escribe los incrementos pendientes.
+
+        Returns:
+            int: Cantidad de filas escritas
+        """
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return 0
+        try:
+            write_counts(pending)
+        except DatabaseError:
+            # Devolver los incrementos al buffer y reintentar más tarde
+            logger.exception('No se pudieron escribir %d rollups pendientes; se reintentará', len(pending))
+            with self._lock:
+                self._pending.update(pending)
+                self._schedule(self._flush_seconds or RETRY_SECONDS)
+            return 0
+        return len(pending)
+
+
+buffer = RollupBuffer()
+atexit.register(buffer.flush)
+
+
+def record_votes(question_id, choice_id, moment, amount=1):
+    """
+    Suma votos a los rollups de una opción en todas las granularidades activas.
+
+    No escribe nada dentro de la transacción del voto: cuando se confirma,
+    el incremento pasa a RollupBuffer, así un voto deshecho no se cuenta.
+
+    Args:
+        question_id (int): ID de la pregunta
+        choice_id (int): ID de la opción votada
+        moment (datetime): Cuándo se votó
+        amount (int): Votos a sumar
+    """
+    config = get_config()
+    if not config['GRANULARITIES']:
+        return
+    transaction.on_commit(partial(
+        buffer.add, question_id, choice_id, moment, amount,
+        list(config['GRANULARITIES']), config['FLUSH_SECONDS'],
+    ))
+
+
+def rebuild(question, granularities=None):
+    """
+    Vuelve a calcular los rollups de una pregunta desde sus votos.
+
+    Cuenta las filas de Vote agrupadas en la base de datos (una consulta por
+    granularidad) y, si la pregunta está archivada, los votos del archivo
+    (ver vote_archive.py).
+
+    Returns:
+        int: Cantidad de filas VoteRollup creadas
+    """
+    from .models import Vote, VoteRollup
+    from . import vote_archive
+
+    granularities = granularities or get_config()['GRANULARITIES']
+    votes = Vote.objects.filter(question=question)
+    counts = {granularity: Counter() for granularity in granularities}
+
+    archive = vote_archive.open_archive(question.pk) if question.archived_at else None
+    if archive is not None:
+        with archive:
+            votes = votes.filter(id__gt=archive.last_vote_id)
+            for choice_id, voted_at in archive.iter_votes():
+                for granularity in granularities:
+                    counts[granularity][(choice_id, truncate(voted_at, granularity))] += 1
+
+    for granularity in granularities:
+        rows = (
+            votes.annotate(bucket=TRUNCATE_FUNCTIONS[granularity]('voted_at', tzinfo=datetime.timezone.utc))
+            .order_by()
+            .values_list('choice_id', 'bucket')
+            .annotate(n=Count('id'))
+        )
+        for choice_id, bucket, n in rows:
+            counts[granularity][(choice_id, bucket)] += n
+
+    rollups = [
+        VoteRollup(question=question, choice_id=choice_id, granularity=granularity, bucket=bucket, votes=n)
+        for granularity, by_bucket in counts.items()
+        for (choice_id, bucket), n in by_bucket.items()
+    ]
+    with transaction.atomic():
+        VoteRollup.objects.filter(question=question, granularity__in=granularities).delete()
+        VoteRollup.objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
+
+
+def timeline(question, granularity, since, until):
+    """
+    Votos por opción e intervalo entre `since` y `until`, leídos solo de los rollups.
+
+    No escribe nada: los votos (de este proceso y de los demás) pueden
+    llegar con hasta FLUSH_SECONDS de atraso.
+
+    Los intervalos sin votos aparecen con 0, así cada serie tiene un valor
+    por etiqueta.
+
+    Returns:
+        dict: {'labels': [inicio de cada intervalo], 'series': [{'choice_id',
+        'choice_text', 'data'}]}
+    """
+    from .models import VoteRollup
+
+    step = STEPS[granularity]
+    labels = []
+    bucket = truncate(since, granularity)
+    while bucket < until:
+        labels.append(bucket)
+        bucket += step
+    positions = {label: index for index, label in enumerate(labels)}
+
+    choices = list(question.choice_set.order_by('id').values_list('id', 'choice_text'))
+    data = {choice_id: [0] * len(labels) for choice_id, _ in choices}
+    if labels:
+        rows = VoteRollup.objects.filter(
+            question=question, granularity=granularity,
+            bucket__gte=labels[0], bucket__lt=until,
+        ).values_list('choice_id', 'bucket', 'votes')
+        for choice_id, bucket, votes in rows:
+            position = positions.get(truncate(bucket, granularity))
+            if position is not None and choice_id in data:
+                data[choice_id][position] += votes
+
+    return {
+        'labels': labels,
+        'series': [
+            {'choice_id': choice_id, 'choice_text': choice_text, 'data': data[choice_id]}
+            for choice_id, choice_text in choices
+        ],
+    }
@@ -0,0 +1,67 @@
+"""
+Receptores de señales de la aplicación de encuestas.
+
+Se conectan al importar este módulo desde PollsConfig.ready() (ver apps.py).
+"""
+
+import os
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import pagination, vote_archive
+from .models import Choice, Question, Vote, recount_questions
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_question_count(**kwargs):
+    """
+    Borra el total de encuestas en caché (ver pagination.cached_count)
+    cuando se crea, edita o elimina una pregunta.
+    """
+    pagination.invalidate_count()
+
+
+@receiver(post_delete, sender=Question)
+def delete_vote_archive(instance, **kwargs):
+    """
+    Borra el archivo de votos de una pregunta eliminada (ver vote_archive.py).
+    """
+    if instance.archived_at:
+        try:
+            os.remove(vote_archive.archive_path(instance.pk))
+        except FileNotFoundError:
+            pass
+
+
+@receiver(post_delete, sender=Choice)
+def recount_after_choice_delete(instance, origin=None, **kwargs):
+    """
+    Recalcula Question.votes cuando se borra una opción (y sus votos en cascada).
+    
+    Si lo que se borra es la pregunta entera, no hace falta.
+    """
+    if isinstance(origin, Question) or (hasattr(origin, 'model') and origin.model is Question):
+        return
+    recount_questions([instance.question_id])
+
+
+@receiver(pre_delete, sender=User)
+def remember_user_votes(instance, **kwargs):
+    """
+    Anota en qué preguntas votó un usuario que se va a borrar: sus votos se
+    borran en cascada y después hay que recontar esas preguntas.
+    """
+    instance._polls_voted_questions = list(
+        Vote.objects.filter(user=instance).order_by().values_list('question_id', flat=True).distinct()
+    )
+
+
+@receiver(post_delete, sender=User)
+def recount_after_user_delete(instance, **kwargs):
+    """
+    Recalcula los contadores de las preguntas en las que votó un usuario borrado.
+    """
+    recount_questions(getattr(instance, '_polls_voted_questions', []))
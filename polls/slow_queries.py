@@ -0,0 +1,303 @@
+"""
+Registro de consultas SQL lentas con su plan de ejecución (EXPLAIN).
+
+Algunas consultas solo se vuelven lentas con muchos datos. Con este
+registro activado, cada consulta que tarda más de THRESHOLD_MS se anota en
+un log local rotativo (un objeto JSON por renglón) con:
+
+- el SQL, sus parámetros y cuánto tardó
+- la huella (fingerprint) de la consulta: el SQL sin valores concretos,
+  así todas las variantes de la misma consulta se agrupan
+- la vista y la ruta de la petición (ver SlowQueryMiddleware) y los últimos
+  marcos de la pila que son código del proyecto
+- el plan de ejecución (EXPLAIN QUERY PLAN en SQLite, EXPLAIN en las
+  demás), una vez por huella y por proceso
+
+El comando slow_queries lee el log (y sus copias rotadas) y muestra las
+huellas que más tiempo suman, por ejemplo después de una prueba de carga.
+
+Las consultas se miden con un envoltorio de connection.execute_wrapper que
+se instala en cada conexión nueva (ver install()), también en los comandos
+de gestión. En las vistas async el ORM corre en otro hilo y la pila no
+llega a la vista: para eso se anota la vista de la petición.
+
+Configuración en settings.py:
+    POLLS_SLOW_QUERIES = {
+        'ENABLED': False,
+        'THRESHOLD_MS': 100,                       # Desde cuántos ms es lenta
+        'LOG_FILE': BASE_DIR / 'slow_queries.log',
+        'MAX_BYTES': 5 * 1024 * 1024,              # Tamaño antes de rotar
+        'BACKUP_COUNT': 3,                         # Copias rotadas que se guardan
+        'EXPLAIN': True,                           # Capturar el plan de ejecución
+        'LOG_PARAMS': True,                        # Guardar los parámetros
+        'STACK_DEPTH': 5,                          # Marcos de la pila del proyecto
+    }
+"""
+
+import contextvars
+import datetime
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import re
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.backends.signals import connection_created
+
+DEFAULTS = {
+    'ENABLED': False,
+    'THRESHOLD_MS': 100,
+    'LOG_FILE': None,
+    'MAX_BYTES': 5 * 1024 * 1024,
+    'BACKUP_COUNT': 3,
+    'EXPLAIN': True,
+    'LOG_PARAMS': True,
+    'STACK_DEPTH': 5,
+}
+
+# Largo máximo de cada parámetro en el log
+MAX_PARAM_LENGTH = 200
+
+# Sus marcos no se muestran en la pila (ver project_stack)
+MIDDLEWARE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'middleware.py')
+
+# Petición en curso (la anota SlowQueryMiddleware)
+current_request = contextvars.ContextVar('polls_slow_query_request', default=None)
+
+# Mientras se hace el EXPLAIN no se miden consultas (sería medir al propio EXPLAIN)
+_explaining = threading.local()
+# Huellas que ya tienen plan en este proceso
+_explained = set()
+_explained_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+logger.propagate = False
+_handler_lock = threading.Lock()
+
+# Partes del SQL que cambian entre ejecuciones de la misma consulta
+LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),                    # cadenas
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),                  # números
+    (re.compile(r'%s|%\(\w+\)s'), '?'),                       # marcadores de parámetros
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),    # listas de IN (...)
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def get_config():
+    """Devuelve la configuración del registro mezclada con los valores por defecto."""
+    config = {**DEFAULTS, **getattr(settings, 'POLLS_SLOW_QUERIES', {})}
+    if config['LOG_FILE'] is None:
+        config['LOG_FILE'] = settings.BASE_DIR / 'slow_queries.log'
+    return config
+
+
+def normalize(sql):
+    """SQL sin valores concretos: 'WHERE id = 5' y 'WHERE id = 7' quedan iguales."""
+    for pattern, replacement in LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(sql):
+    """Huella corta de una consulta normalizada."""
+    return hashlib.sha1(normalize(sql).encode('utf-8')).hexdigest()[:12]
+
+
+def _format_param(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value = bytes(value).hex()
+    text = value if isinstance(value, str) else repr(value)
+    return text if len(text) <= MAX_PARAM_LENGTH else text[:MAX_PARAM_LENGTH] + '…'
+
+
+def format_params(params, many):
+    """Parámetros como texto (con executemany, solo los del primer renglón)."""
+    if many:
+        params = next(iter(params), None)
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: _format_param(value) for key, value in params.items()}
+    return [_format_param(value) for value in params]
+
+
+def project_stack(depth):
+    """
+    Últimos `depth` marcos de la pila que son código del proyecto.
+
+    Solo cuenta lo que hay antes de entrar al ORM (django/db), sin los
+    marcos de middleware.py: así no aparecen los envoltorios de consultas
+    ni el paso de la petición por los middleware.
+    """
+    base_dir = str(settings.BASE_DIR) + os.sep
+    orm_dir = os.path.join('django', 'db', '')
+    frames = []
+    for frame in traceback.extract_stack():
+        if orm_dir in frame.filename:
+            break
+        if (
+            frame.filename.startswith(base_dir)
+            and 'site-packages' not in frame.filename
+            and frame.filename != MIDDLEWARE_FILE
+        ):
+            frames.append(frame)
+    return [
+        f'{os.path.relpath(frame.filename, base_dir)}:{frame.lineno} {frame.name}'
+        for frame in frames[-depth:]
+    ]
+
+
+def explain(connection, sql, params):
+    """
+    Plan de ejecución de una consulta, como lista de renglones de texto.
+
+    Solo SELECT: el EXPLAIN no ejecuta la consulta, pero no vale la pena
+    para escrituras de una fila.
+    """
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+    _explaining.active = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            return [' | '.join(str(column) for column in row) for row in cursor.fetchall()]
+    except DatabaseError as exc:
+        return [f'No se pudo obtener el plan: {exc}']
+    finally:
+        _explaining.active = False
+
+
+def _get_logger(config):
+    """El logger con un RotatingFileHandler para LOG_FILE (se cambia si cambia el archivo)."""
+    path = os.fspath(config['LOG_FILE'])
+    with _handler_lock:
+        handler = logger.handlers[0] if logger.handlers else None
+        if handler is None or handler.baseFilename != os.path.abspath(path):
+            if handler is not None:
+                logger.removeHandler(handler)
+                handler.close()
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=config['MAX_BYTES'], backupCount=config['BACKUP_COUNT'], encoding='utf-8',
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+    return logger
+
+
+def capture(connection, sql, params, many, elapsed, config):
+    """Anota una consulta lenta en el log."""
+    query_fingerprint = fingerprint(sql)
+    entry = {
+        'time': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'duration_ms': round(elapsed * 1000, 3),
+        'fingerprint': query_fingerprint,
+        'sql': sql,
+        'params': format_params(params, many) if config['LOG_PARAMS'] else None,
+        'database': connection.alias,
+        'view': None,
+        'path': None,
+        'stack': project_stack(config['STACK_DEPTH']),
+        'plan': None,
+    }
+    request = current_request.get()
+    if request is not None:
+        match = getattr(request, 'resolver_match', None)
+        entry['view'] = match.view_name if match else None
+        entry['path'] = request.path
+    if config['EXPLAIN'] and not many:
+        key = (connection.alias, query_fingerprint)
+        with _explained_lock:
+            first_time = key not in _explained
+            _explained.add(key)
+        if first_time:
+            entry['plan'] = explain(connection, sql, params)
+    _get_logger(config).info(json.dumps(entry, ensure_ascii=False))
+
+
+def record_slow_query(execute, sql, params, many, context):
+    """Envoltorio de consultas (connection.execute_wrapper) que anota las lentas."""
+    if getattr(_explaining, 'active', False):
+        return execute(sql, params, many, context)
+    config = get_config()
+    if not config['ENABLED']:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    elapsed = time.perf_counter() - started
+    # Solo las que terminaron bien: en PostgreSQL, un EXPLAIN después de un
+    # error dentro de una transacción fallaría también
+    if elapsed * 1000 >= config['THRESHOLD_MS']:
+        capture(context['connection'], sql, params, many, elapsed, config)
+    return result
+
+
+def watch_connection(sender, connection, **kwargs):
+    """Instala record_slow_query en cada conexión nueva, de cualquier hilo."""
+    if record_slow_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_slow_query)
+
+
+def install():
+    """Engancha el registro a las conexiones abiertas y a las que se abran."""
+    connection_created.connect(watch_connection, dispatch_uid='polls_slow_queries')
+    for connection in connections.all(initialized_only=True):
+        watch_connection(None, connection)
+
+
+def read_log(path=None):
+    """
+    Recorre las consultas anotadas en el log y en sus copias rotadas (de la más vieja a la más nueva).
+    """
+    config = get_config()
+    path = os.fspath(path or config['LOG_FILE'])
+    paths = [f'{path}.{number}' for number in range(config['BACKUP_COUNT'], 0, -1)] + [path]
+    for name in paths:
+        try:
+            file = open(name, encoding='utf-8')
+        except FileNotFoundError:
+            continue
+        with file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def aggregate(entries):
+    """
+    Agrupa las consultas por huella.
+
+    Returns:
+        list: Un dict por huella con count, total_ms, max_ms, mean_ms, sql
+        (el ejemplo más lento), views (cuántas veces por vista), stack y plan
+    """
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry['fingerprint'], {
+            'fingerprint': entry['fingerprint'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            'sql': entry['sql'], 'params': entry.get('params'), 'stack': entry.get('stack'),
+            'views': {}, 'plan': None,
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        if entry['duration_ms'] >= group['max_ms']:
+            group['max_ms'] = entry['duration_ms']
+            group['sql'], group['params'], group['stack'] = entry['sql'], entry.get('params'), entry.get('stack')
+        view = entry.get('view') or '(sin petición)'
+        group['views'][view] = group['views'].get(view, 0) + 1
+        if entry.get('plan'):
+            group['plan'] = entry['plan']
+    for group in groups.values():
+        group['mean_ms'] = group['total_ms'] / group['count']
+    return list(groups.values())
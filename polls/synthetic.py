@@ -0,0 +1,243 @@
+"""
+Generador de datos sintéticos a escala de producción.
+
+Crea preguntas, opciones, usuarios y votos con distribuciones parecidas a
+las reales, insertando todo con bulk_create por lotes:
+
+- Popularidad: con skew='zipf' unas pocas encuestas se llevan casi todos
+  los votos (ley de Zipf) y, dentro de cada una, unas pocas opciones
+  también; con skew='uniform' todo se reparte parejo.
+- Tiempo: las encuestas se publican a lo largo de `days` días y sus votos
+  llegan sobre todo en los primeros días después de publicarse (caída
+  exponencial).
+- Votantes: cada voto tiene una IP distinta dentro de su pregunta; una
+  parte de los votos es de usuarios registrados (sin repetirse por pregunta).
+
+Todo sale de un random.Random(seed): con la misma semilla y la misma fecha
+de fin, el resultado es idéntico, así sirve como dataset fijo para
+benchmarks.
+
+Uso (ver el comando load_sample_data):
+    python manage.py load_sample_data --questions 10000 --choices 2-10 \\
+        --votes 5000000 --seed 42 --skew zipf
+"""
+
+import datetime
+import ipaddress
+import itertools
+import random
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from . import pagination, rollups
+from .models import Choice, Question, Vote, VoteRollup
+from .voter_identity import stored_ip, voter_key
+
+# Exponente de la ley de Zipf para encuestas y opciones
+ZIPF_EXPONENT = 1.1
+# Días promedio entre la publicación de una encuesta y sus votos
+MEAN_VOTE_DELAY_DAYS = 2
+# Parte de los votos que vienen de usuarios registrados
+AUTHENTICATED_RATIO = 0.2
+# Parte de las encuestas que quedan inactivas
+INACTIVE_RATIO = 0.1
+# Primera IP de los votantes sintéticos (una por voto dentro de cada pregunta)
+FIRST_VOTER_IP = int(ipaddress.IPv4Address('10.0.0.1'))
+# Granularidades de rollup que se calculan al generar. Los votos sintéticos
+# son del pasado y los de minuto serían casi una fila por voto: si hacen
+# falta, se arman aparte con rebuild_vote_rollups --granularity minute
+ROLLUP_GRANULARITIES = ('hour', 'day')
+
+TOPICS = [
+    'lenguaje de programación', 'framework web', 'base de datos', 'editor de código',
+    'sistema operativo', 'metodología de trabajo', 'herramienta de CI', 'nube',
+    'librería de gráficos', 'formato de datos', 'horario de trabajo', 'navegador',
+]
+
+
+def parse_range(value):
+    """
+    Lee un rango "2-10" (o un número solo, "4").
+
+    Returns:
+        tuple: (mínimo, máximo)
+
+    Raises:
+        ValueError: Si no es un rango válido
+    """
+    low, _, high = str(value).partition('-')
+    low, high = int(low), int(high or low)
+    if low < 1 or high < low:
+        raise ValueError(value)
+    return low, high
+
+
+def popularity_weights(rng, count, skew):
+    """
+    Pesos de popularidad de `count` elementos, en orden aleatorio.
+
+    Con 'zipf' el peso del k-ésimo más popular es 1 / k^ZIPF_EXPONENT.
+    """
+    if skew == 'uniform':
+        return [1.0] * count
+    weights = [1 / rank ** ZIPF_EXPONENT for rank in range(1, count + 1)]
+    rng.shuffle(weights)
+    return weights
+
+
+def cumulative(weights):
+    """Pesos acumulados, para random.choices(cum_weights=...)."""
+    return list(itertools.accumulate(weights))
+
+
+def _bulk_create_returning_ids(model, objects, batch_size):
+    """
+    Inserta por lotes y devuelve los IDs en el orden de inserción.
+
+    No todas las bases devuelven los IDs de bulk_create: se leen después,
+    sabiendo que son los mayores al máximo que había antes.
+    """
+    before = model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    for start in range(0, len(objects), batch_size):
+        with transaction.atomic():
+            model.objects.bulk_create(objects[start:start + batch_size], batch_size=batch_size)
+    return list(model.objects.filter(pk__gt=before).order_by('pk').values_list('pk', flat=True))
+
+
+def generate(questions, choices=(2, 10), votes=0, users=None, seed=42, skew='zipf',
+             days=365, end=None, creator=None, batch_size=5000, with_rollups=True, log=None):
+    """
+    Genera un dataset sintético y devuelve cuántas filas creó de cada cosa.
+
+    Args:
+        questions (int): Cantidad de preguntas
+        choices (tuple): (mínimo, máximo) de opciones por pregunta
+        votes (int): Cantidad total de votos
+        users (int): Usuarios registrados (por defecto, un 5 % de los votos)
+        seed (int): Semilla del generador
+        skew (str): 'zipf' o 'uniform'
+        days (int): Días a lo largo de los que se publican las encuestas
+        end (datetime): Fecha de fin (la última publicación y el último voto)
+        creator (User): Autor de las preguntas
+        batch_size (int): Filas por bulk_create (y por transacción)
+        with_rollups (bool): Crear los rollups por hora y por día de los votos
+        log (callable): Función que recibe mensajes de progreso
+
+    Returns:
+        dict: {'questions', 'choices', 'users', 'votes'}
+    """
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+    end = end or datetime.datetime.now(datetime.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    users = min(votes // 20 if users is None else users, votes)
+    if not questions:
+        votes = 0
+
+    # Preguntas
+    pub_dates = sorted(end - datetime.timedelta(seconds=rng.uniform(0, days * 86400)) for _ in range(questions))
+    question_ids = _bulk_create_returning_ids(Question, [
+        Question(
+            question_text=f'¿Cuál es tu {rng.choice(TOPICS)} favorito? (#{number})',
+            pub_date=pub_date,
+            created_by=creator,
+            is_active=rng.random() >= INACTIVE_RATIO,
+        )
+        for number, pub_date in enumerate(pub_dates, start=1)
+    ], batch_size)
+    log(f'{len(question_ids)} preguntas creadas')
+
+    # Opciones
+    choice_counts = [rng.randint(*choices) for _ in question_ids]
+    choice_ids = _bulk_create_returning_ids(Choice, [
+        Choice(question_id=question_id, choice_text=f'Opción {number}')
+        for question_id, count in zip(question_ids, choice_counts)
+        for number in range(1, count + 1)
+    ], batch_size)
+    choices_by_question = []
+    position = 0
+    for count in choice_counts:
+        choices_by_question.append(choice_ids[position:position + count])
+        position += count
+    log(f'{len(choice_ids)} opciones creadas')
+
+    # Usuarios (contraseña inutilizable: no se puede iniciar sesión con ellos)
+    # Si ya se generaron con esta semilla, se reusan
+    user_prefix = f'sintetico_{seed}_'
+    existing = set(User.objects.filter(username__startswith=user_prefix).values_list('username', flat=True))
+    usernames = [f'{user_prefix}{number}' for number in range(1, users + 1)]
+    _bulk_create_returning_ids(User, [
+        User(username=username, password='!') for username in usernames if username not in existing
+    ], batch_size)
+    ids_by_username = dict(User.objects.filter(username__startswith=user_prefix).values_list('username', 'id'))
+    user_ids = [ids_by_username[username] for username in usernames]
+    log(f'{len(user_ids)} usuarios')
+
+    # Votos
+    question_weights = cumulative(popularity_weights(rng, len(question_ids), skew))
+    choice_weights = [cumulative(popularity_weights(rng, len(ids), skew)) for ids in choices_by_question]
+    user_offsets = [rng.randrange(len(user_ids)) if user_ids else 0 for _ in question_ids]
+    votes_per_question = [0] * len(question_ids)
+    per_choice = Counter()
+    granularities = [g for g in ROLLUP_GRANULARITIES if g in rollups.get_config()['GRANULARITIES']] if with_rollups else []
+    # Los rollups se cuentan en memoria mientras se generan los votos, sin
+    # volver a leerlos de la base: {(pregunta, opción, granularidad, intervalo): votos}
+    rollup_counts = Counter()
+    mean_delay = MEAN_VOTE_DELAY_DAYS * 86400
+    indexes = range(len(question_ids))
+
+    created = 0
+    while created < votes:
+        batch = []
+        picks = rng.choices(indexes, cum_weights=question_weights, k=min(batch_size, votes - created))
+        for index in picks:
+            number = votes_per_question[index]
+            votes_per_question[index] += 1
+            choice_id = rng.choices(choices_by_question[index], cum_weights=choice_weights[index])[0]
+            voter_ip = str(ipaddress.IPv4Address(FIRST_VOTER_IP + number))
+            user_id = None
+            if number < len(user_ids) and rng.random() < AUTHENTICATED_RATIO:
+                # Usuarios distintos dentro de la pregunta: uno por número de voto
+                user_id = user_ids[(user_offsets[index] + number) % len(user_ids)]
+            delay = min(rng.expovariate(1 / mean_delay), (end - pub_dates[index]).total_seconds())
+            voted_at = pub_dates[index] + datetime.timedelta(seconds=delay)
+            batch.append(Vote(
+                question_id=question_ids[index],
+                choice_id=choice_id,
+                voter_ip=stored_ip(voter_ip),
+                voter_key=voter_key(voter_ip),
+                user_id=user_id,
+                voted_at=voted_at,
+            ))
+            per_choice[choice_id] += 1
+            for granularity in granularities:
+                rollup_counts[(question_ids[index], choice_id, granularity, rollups.truncate(voted_at, granularity))] += 1
+        with transaction.atomic():
+            Vote.objects.bulk_create(batch, batch_size=batch_size)
+        created += len(batch)
+        log(f'{created} / {votes} votos')
+
+    # Contadores desnormalizados (Choice.votes / Question.votes)
+    with transaction.atomic():
+        Choice.objects.bulk_update(
+            [Choice(pk=choice_id, votes=count) for choice_id, count in per_choice.items()],
+            ['votes'], batch_size=batch_size,
+        )
+        Question.objects.bulk_update(
+            [Question(pk=question_id, votes=count)
+             for question_id, count in zip(question_ids, votes_per_question) if count],
+            ['votes'], batch_size=batch_size,
+        )
+    if rollup_counts:
+        rows = [
+            VoteRollup(question_id=question_id, choice_id=choice_id, granularity=granularity, bucket=bucket, votes=n)
+            for (question_id, choice_id, granularity, bucket), n in rollup_counts.items()
+        ]
+        for start in range(0, len(rows), batch_size):
+            with transaction.atomic():
+                VoteRollup.objects.bulk_create(rows[start:start + batch_size], batch_size=batch_size)
+        log(f'{len(rows)} rollups creados')
+    pagination.invalidate_count()
+
+    return {'questions': len(question_ids), 'choices': len(choice_ids), 'users': len(user_ids), 'votes': created}
@@ -15,14 +15,60 @@ En la terminal: python manage.py test polls
 """
 
 # Importamos las herramientas necesarias para crear pruebas
-from django.test import TestCase, Client
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, Client, override_settings
 from django.utils import timezone
-from django.urls import reverse
+from django.urls import resolve, reverse
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.cache import cache
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import F, Sum
+from django.db.migrations.executor import MigrationExecutor
+from django.test.utils import CaptureQueriesContext
+from io import StringIO
+from unittest import mock
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+import asyncio
+import csv
 import datetime
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
 
 # Importamos nuestros modelos para probarlos
-from .models import Question, Choice, Vote
+from .models import Question, Choice, ChoiceCounterShard, Vote, VoteRollup
+from .results import count_votes, tally, tally_question
+from .vote_writer import VoteWriter, DuplicateVote
+from .voter_filter import BloomFilter, VoterFilterCache, voter_filters
+from .voter_identity import key_to_ip, rekey_votes, voter_key
+from .management.commands import import_votes, loadtest
+from . import urls as polls_urls
+from . import async_views, benchmarks, checks, export, live, metrics, results_cache, rollups, slow_queries, synthetic, views, vote_archive
+
+
+# URLs con las vistas síncronas (False) o async (True) de detail, vote y
+# live-results, para probar las dos en el mismo proceso (ver polls.urls)
+URLCONFS = {False: 'encuestas_project.urls_sync', True: 'encuestas_project.urls_async'}
+
+# En las pruebas los rollups se escriben al confirmarse el voto, sin el
+# temporizador de rollups.RollupBuffer (su hilo no puede escribir mientras
+# la prueba tiene abierta su transacción)
+_rollups_override = override_settings(POLLS_TIMELINE={**rollups.get_config(), 'FLUSH_SECONDS': 0})
+
+
+def setUpModule():
+    _rollups_override.enable()
+
+
+def tearDownModule():
+    _rollups_override.disable()
 
 
 class QuestionModelTest(TestCase):
@@ -201,6 +247,8 @@ class VoteTest(TestCase):
         )
         
         # Verificar que el contador aumentó
+        # (el contador se actualiza en la base de datos, hay que recargar la opción)
+        self.choice1.refresh_from_db()
         self.assertEqual(self.choice1.vote_count(), initial_votes + 1)
     
     def test_vote_via_post_request(self):
@@ -218,7 +266,1885 @@ class VoteTest(TestCase):
         )
         
         # Verificar que el voto se registró
+        self.choice1.refresh_from_db()
         self.assertEqual(self.choice1.vote_count(), 1)
+    
+    def test_vote_updates_stored_counters(self):
+        """
+        PRUEBA: Votar debe actualizar los contadores guardados en Choice y Question
+        """
+        url = reverse('polls:vote', args=(self.question.id,))
+        self.client.post(url, {'choice': self.choice1.id}, REMOTE_ADDR='10.0.0.1')
+        self.client.post(url, {'choice': self.choice2.id}, REMOTE_ADDR='10.0.0.2')
+        
+        self.question.refresh_from_db()
+        self.choice1.refresh_from_db()
+        self.assertEqual(self.question.votes, 2)
+        self.assertEqual(self.choice1.votes, 1)
+        
+        # Leer el total no debe hacer ninguna consulta COUNT
+        with self.assertNumQueries(0):
+            self.assertEqual(self.question.total_votes(), 2)
+    
+    def test_recount_votes_repairs_counters(self):
+        """
+        PRUEBA: recount_votes() debe dejar los contadores igual que la tabla Vote
+        """
+        Vote.objects.create(choice=self.choice1, voter_ip="10.0.0.1")
+        Vote.objects.filter(choice=self.choice1).delete()
+        
+        self.assertEqual(self.question.recount_votes(), 0)
+        self.choice1.refresh_from_db()
+        self.assertEqual(self.choice1.votes, 0)
+    
+    def test_deleting_votes_keeps_counters(self):
+        """
+        PRUEBA: Borrar votos (uno, un QuerySet o en cascada por opción o usuario) deja los contadores al día
+        """
+        user = User.objects.create_user(username="borrable")
+        Vote.objects.create(choice=self.choice1, voter_ip="10.0.0.1", user=user)
+        Vote.objects.create(choice=self.choice1, voter_ip="10.0.0.2")
+        single = Vote.objects.create(choice=self.choice2, voter_ip="10.0.0.3")
+        Vote.objects.create(choice=self.choice2, voter_ip="10.0.0.4")
+        
+        def counters():
+            self.question.refresh_from_db()
+            self.choice1.refresh_from_db()
+            return self.question.total_votes(), self.choice1.votes
+        
+        self.assertEqual(counters(), (4, 2))
+        single.delete()
+        self.assertEqual(counters(), (3, 2))
+        user.delete()
+        self.assertEqual(counters(), (2, 1))
+        Vote.objects.filter(voter_ip="10.0.0.2").delete()
+        self.assertEqual(counters(), (1, 0))
+        self.choice2.delete()
+        self.assertEqual(counters(), (0, 0))
+        
+        # Borrar la pregunta entera no necesita recontar
+        self.question.delete()
+        self.assertFalse(Question.objects.filter(pk=self.question.pk).exists())
+    
+    def test_database_rejects_second_vote_in_question(self):
+        """
+        PRUEBA: La base de datos impide votar dos veces en la misma pregunta
+        (aunque sea por otra opción)
+        """
+        user = User.objects.create_user(username="votante")
+        first = Vote.objects.create(choice=self.choice1, voter_ip="10.0.0.1", user=user)
+        self.assertEqual(first.question, self.question)
+        
+        for voter_ip, voter in (("10.0.0.1", None), ("10.0.0.2", user)):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                Vote.objects.create(choice=self.choice2, voter_ip=voter_ip, user=voter)
+        
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.votes, 1)
+    
+    def test_duplicate_vote_via_post_request(self):
+        """
+        PRUEBA: El segundo voto de la misma IP se rechaza, con vistas síncronas y async
+        """
+        url = reverse('polls:vote', args=(self.question.id,))
+        for async_views_enabled, voter_ip in ((False, "10.0.0.1"), (True, "10.0.0.2")):
+            with self.settings(ROOT_URLCONF=URLCONFS[async_views_enabled]):
+                self.client.post(url, {'choice': self.choice1.id}, REMOTE_ADDR=voter_ip)
+                response = self.client.post(url, {'choice': self.choice2.id}, REMOTE_ADDR=voter_ip, follow=True)
+                self.assertContains(response, "Ya has votado en esta encuesta.")
+        
+        self.assertEqual(Vote.objects.filter(question=self.question).count(), 2)
+        self.choice2.refresh_from_db()
+        self.assertEqual(self.choice2.votes, 0)
+
+
+class ResultsTest(TestCase):
+    """
+    PRUEBAS PARA EL MÓDULO DE RESULTADOS (polls/results.py)
+    """
+    
+    def setUp(self):
+        self.question = create_question("¿Pregunta con votos?", days=-1)
+        self.choice1 = Choice.objects.create(question=self.question, choice_text="A")
+        self.choice2 = Choice.objects.create(question=self.question, choice_text="B")
+        Vote.objects.create(choice=self.choice1, voter_ip="10.0.0.1")
+        Vote.objects.create(choice=self.choice1, voter_ip="10.0.0.2")
+        Vote.objects.create(choice=self.choice1, voter_ip="10.0.0.3")
+        Vote.objects.create(choice=self.choice2, voter_ip="10.0.0.4")
+    
+    def test_tally_question(self):
+        """
+        PRUEBA: tally_question() debe devolver votos y porcentajes correctos
+        """
+        question_results = tally_question(self.question.id)
+        
+        self.assertEqual(question_results.total_votes, 4)
+        self.assertEqual(
+            [(choice.choice_text, choice.votes, choice.percentage) for choice in question_results.choices],
+            [("A", 3, 75.0), ("B", 1, 25.0)],
+        )
+        # La estructura es inmutable
+        with self.assertRaises(AttributeError):
+            question_results.total_votes = 0
+    
+    def test_tally_many_questions_uses_one_query(self):
+        """
+        PRUEBA: tally() debe calcular varias preguntas con una sola consulta
+        """
+        empty_question = create_question("¿Pregunta sin opciones?", days=-1)
+        
+        with self.assertNumQueries(1):
+            results_by_question = tally([self.question.id, empty_question.id])
+        
+        self.assertEqual(results_by_question[self.question.id].total_votes, 4)
+        self.assertEqual(results_by_question[empty_question.id].total_votes, 0)
+        self.assertEqual(results_by_question[empty_question.id].choices, ())
+    
+    def test_get_results_format(self):
+        """
+        PRUEBA: Question.get_results() mantiene su formato de diccionario
+        """
+        self.assertEqual(
+            self.question.get_results()[self.choice2.id],
+            {'choice_text': "B", 'votes': 1, 'percentage': 25.0},
+        )
+    
+    # Sin el filtro de "¿ya votó?", que puede ahorrar la búsqueda del voto
+    # según lo que tenga en memoria de otras pruebas
+    @override_settings(POLLS_VOTER_FILTER={'ENABLED': False})
+    def test_results_view_query_count_does_not_depend_on_votes(self):
+        """
+        PRUEBA: La página de resultados hace las mismas consultas con más votos
+        """
+        url = reverse('polls:results', args=(self.question.id,))
+        with self.assertNumQueries(3):
+            self.client.get(url)
+        
+        for i in range(10):
+            Vote.objects.create(choice=self.choice2, voter_ip=f"10.0.1.{i}")
+        
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.context['total_votes'], 14)
+    
+    def test_results_page_has_live_updates_and_timeline(self):
+        """
+        PRUEBA: La página de resultados trae el gráfico de evolución y las actualizaciones en vivo
+        """
+        response = self.client.get(reverse('polls:results', args=(self.question.id,)))
+        self.assertTemplateUsed(response, 'polls/results.html')
+        self.assertContains(response, 'id="timelineChart"')
+        self.assertContains(response, reverse('polls:timeline_api', args=(self.question.id,)))
+        self.assertContains(response, reverse('polls:live_results_stream', args=(self.question.id,)))
+        self.assertContains(response, reverse('polls:live_results_api', args=(self.question.id,)))
+
+
+class CounterShardTest(TestCase):
+    """
+    PRUEBAS PARA LOS CONTADORES FRAGMENTADOS (encuestas muy populares)
+    """
+    
+    def setUp(self):
+        self.question = create_question("¿Pregunta popular?", days=-1)
+        self.question.counter_shards = 4
+        self.question.save()
+        self.choice1 = Choice.objects.create(question=self.question, choice_text="A")
+        self.choice2 = Choice.objects.create(question=self.question, choice_text="B")
+    
+    def test_votes_go_to_shards(self):
+        """
+        PRUEBA: Con fragmentos, los votos no tocan la fila de la opción
+        """
+        for i in range(8):
+            Vote.objects.create(choice=self.choice1, voter_ip=f"10.0.0.{i}")
+        Vote.objects.create(choice=self.choice2, voter_ip="10.0.1.1")
+        
+        self.question.refresh_from_db()
+        self.choice1.refresh_from_db()
+        self.assertEqual(self.question.votes, 0)
+        self.assertEqual(self.choice1.votes, 0)
+        self.assertLessEqual(ChoiceCounterShard.objects.filter(choice=self.choice1).count(), 4)
+        
+        # Las lecturas suman los fragmentos
+        self.assertEqual(self.question.total_votes(), 9)
+        self.assertEqual(self.choice1.vote_count(), 8)
+        self.assertEqual(tally_question(self.question.id).total_votes, 9)
+    
+    def test_compact_counters(self):
+        """
+        PRUEBA: compact_counters() pasa los votos de los fragmentos a las opciones
+        """
+        for i in range(5):
+            Vote.objects.create(choice=self.choice1, voter_ip=f"10.0.0.{i}")
+        
+        self.assertEqual(self.question.compact_counters(), 5)
+        
+        self.question.refresh_from_db()
+        self.choice1.refresh_from_db()
+        self.assertEqual(self.question.votes, 5)
+        self.assertEqual(self.choice1.votes, 5)
+        self.assertFalse(ChoiceCounterShard.objects.exists())
+        self.assertEqual(self.question.total_votes(), 5)
+    
+    def test_compact_command(self):
+        """
+        PRUEBA: El comando compact_vote_counters compacta y puede quitar los fragmentos
+        """
+        Vote.objects.create(choice=self.choice2, voter_ip="10.0.0.1")
+        
+        call_command('compact_vote_counters', '--reset-shards', stdout=StringIO())
+        
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.counter_shards, 1)
+        self.assertEqual(self.question.votes, 1)
+        self.assertFalse(ChoiceCounterShard.objects.exists())
+
+
+class VoteWriterTest(TransactionTestCase):
+    """
+    PRUEBAS PARA EL ESCRITOR DE VOTOS POR LOTES
+    
+    Usamos TransactionTestCase porque el escritor guarda desde otro hilo
+    (con su propia conexión a la base de datos).
+    """
+    
+    def setUp(self):
+        self.question = create_question("¿Pregunta por lotes?", days=-1)
+        self.choice1 = Choice.objects.create(question=self.question, choice_text="A")
+        self.choice2 = Choice.objects.create(question=self.question, choice_text="B")
+        self.writer = VoteWriter(max_batch=50, max_delay_ms=50)
+        self.writer.start()
+    
+    def tearDown(self):
+        self.writer.stop()
+    
+    def test_batch_insert_and_counters(self):
+        """
+        PRUEBA: Los votos encolados se guardan en un lote y actualizan los contadores
+        """
+        futures = [
+            self.writer.submit(Vote(choice=self.choice1, voter_ip=f"10.0.0.{i}"))
+            for i in range(5)
+        ]
+        futures.append(self.writer.submit(Vote(choice=self.choice2, voter_ip="10.0.1.1")))
+        
+        for future in futures:
+            self.assertIsNotNone(future.result(timeout=5).pk)
+        
+        self.question.refresh_from_db()
+        self.choice1.refresh_from_db()
+        self.assertEqual(Vote.objects.count(), 6)
+        self.assertEqual(self.question.votes, 6)
+        self.assertEqual(self.choice1.votes, 5)
+        self.assertGreaterEqual(self.writer.stats()['max_batch_size'], 2)
+    
+    def test_duplicates_reach_the_caller(self):
+        """
+        PRUEBA: Un voto duplicado (en el mismo lote o ya guardado) devuelve DuplicateVote
+        """
+        Vote.objects.create(choice=self.choice1, voter_ip="10.0.0.1")
+        
+        already_voted = self.writer.submit(Vote(choice=self.choice2, voter_ip="10.0.0.1"))
+        first = self.writer.submit(Vote(choice=self.choice1, voter_ip="10.0.0.2"))
+        same_batch = self.writer.submit(Vote(choice=self.choice2, voter_ip="10.0.0.2"))
+        
+        self.assertIsNotNone(first.result(timeout=5).pk)
+        with self.assertRaises(DuplicateVote):
+            already_voted.result(timeout=5)
+        with self.assertRaises(DuplicateVote):
+            same_batch.result(timeout=5)
+        self.assertEqual(self.writer.stats()['duplicates'], 2)
+    
+    def test_stop_flushes_pending_votes(self):
+        """
+        PRUEBA: Al detener el escritor se guardan los votos pendientes
+        """
+        future = self.writer.submit(Vote(choice=self.choice1, voter_ip="10.0.0.9"))
+        self.writer.stop()
+        
+        self.assertTrue(future.done())
+        self.assertEqual(Vote.objects.count(), 1)
+
+
+class ResultsCacheTest(TestCase):
+    """
+    PRUEBAS PARA LA CACHÉ DE RESULTADOS EN VIVO
+    """
+    
+    def setUp(self):
+        # La caché sobrevive entre pruebas: empezar siempre limpia
+        cache.clear()
+        self.question = create_question("¿Pregunta en caché?", days=-1)
+        self.choice = Choice.objects.create(question=self.question, choice_text="A")
+        self.url = reverse('polls:live_results_api', args=(self.question.id,))
+    
+    def test_second_request_is_served_from_cache(self):
+        """
+        PRUEBA: La segunda petición no debe tocar la base de datos
+        """
+        before = results_cache.stats()
+        first = self.client.get(self.url)
+        
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        
+        self.assertEqual(first.content, second.content)
+        after = results_cache.stats()
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+    
+    def test_vote_bumps_version(self):
+        """
+        PRUEBA: Al confirmarse un voto sube la versión y los resultados se recalculan
+        """
+        first = self.client.get(self.url).json()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.objects.create(choice=self.choice, voter_ip="10.0.0.1")
+        
+        second = self.client.get(self.url).json()
+        self.assertGreater(second['version'], first['version'])
+        self.assertEqual(first['total_votes'], 0)
+        self.assertEqual(second['total_votes'], 1)
+    
+    def test_conditional_get_returns_304(self):
+        """
+        PRUEBA: Con el mismo ETag se responde 304 sin tocar la base de datos
+        """
+        first = self.client.get(self.url)
+        etag = first['ETag']
+        self.assertTrue(etag.startswith('"'))
+        
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+        
+        # Después de un voto el ETag cambia y vuelve el JSON completo
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.objects.create(choice=self.choice, voter_ip="10.0.0.1")
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+    
+    def test_deploy_check_warns_about_locmem(self):
+        """
+        PRUEBA: `check --deploy` avisa si la caché de resultados es propia de cada proceso
+        """
+        # La caché por defecto (archivos en disco) la comparten todos los procesos
+        self.assertEqual(checks.check_results_cache_is_shared(None), [])
+        local = {
+            'default': settings.CACHES['default'],
+            'local': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        }
+        with self.settings(CACHES=local, POLLS_RESULTS_CACHE={'ALIAS': 'local'}):
+            self.assertEqual(
+                [message.id for message in checks.check_results_cache_is_shared(None)],
+                ['polls.W001'],
+            )
+    
+    def test_version_does_not_change_without_votes(self):
+        """
+        PRUEBA: Sin votos la versión no cambia (los clientes siguen recibiendo 304)
+        """
+        first = self.client.get(self.url)
+        
+        # Una hora después, sin votos de por medio
+        with mock.patch('time.time', return_value=time.time() + 3600):
+            again = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+
+@override_settings(POLLS_LIVE_STREAM={'HEARTBEAT_SECONDS': 0.2, 'MAX_SECONDS': 3, 'RETRY_MS': 1000})
+class LiveResultsStreamTest(TransactionTestCase):
+    """
+    PRUEBAS PARA EL STREAM DE RESULTADOS (Server-Sent Events)
+    
+    Se ejecuta la aplicación ASGI real dentro del mismo proceso, con muchas
+    conexiones abiertas a la vez. Usamos TransactionTestCase porque cada
+    petición ASGI usa su propio hilo (y su propia conexión a la base de datos).
+    """
+    
+    subscribers = 25
+    
+    def setUp(self):
+        cache.clear()
+        self.question = create_question("¿Pregunta en vivo?", days=-1)
+        self.choice = Choice.objects.create(question=self.question, choice_text="A")
+    
+    def open_stream(self, application):
+        path = reverse('polls:live_results_stream', args=(self.question.id,))
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [(b'host', b'testserver')],
+            'client': ('127.0.0.1', 12345),
+            'server': ('testserver', 80),
+        }
+        return ApplicationCommunicator(application, scope)
+    
+    async def next_event(self, communicator):
+        """Lee mensajes del stream hasta recibir un evento `results`."""
+        while True:
+            message = await communicator.receive_output(timeout=5)
+            body = message.get('body', b'').decode()
+            if 'event: results' in body:
+                data = body.split('data: ', 1)[1].split('\n', 1)[0]
+                return json.loads(data)
+    
+    async def test_many_subscribers_receive_one_change(self):
+        """
+        PRUEBA: Un solo voto llega como evento a todas las conexiones abiertas
+        """
+        from encuestas_project.asgi import application
+        
+        communicators = [self.open_stream(application) for _ in range(self.subscribers)]
+        for communicator in communicators:
+            await communicator.send_input({'type': 'http.request', 'body': b''})
+        
+        for communicator in communicators:
+            start = await communicator.receive_output(timeout=5)
+            self.assertEqual(start['status'], 200)
+            self.assertIn((b'Content-Type', b'text/event-stream'), start['headers'])
+        
+        first_events = await asyncio.gather(*(self.next_event(c) for c in communicators))
+        self.assertTrue(all(event['total_votes'] == 0 for event in first_events))
+        self.assertEqual(live.broadcaster.subscriber_count(self.question.id), self.subscribers)
+        
+        # Un voto (con su commit) debe llegar a todos los suscriptores
+        await sync_to_async(Vote.objects.create)(choice=self.choice, voter_ip="10.0.0.1")
+        
+        second_events = await asyncio.gather(*(self.next_event(c) for c in communicators))
+        self.assertTrue(all(event['total_votes'] == 1 for event in second_events))
+        
+        # Los streams terminan solos después de MAX_SECONDS
+        for communicator in communicators:
+            await communicator.wait(timeout=5)
+        self.assertEqual(live.broadcaster.subscriber_count(self.question.id), 0)
+    
+    def test_stream_requires_asgi(self):
+        """
+        PRUEBA: Con WSGI el stream responde 501 (la página vuelve a preguntar cada 5 s)
+        """
+        url = reverse('polls:live_results_stream', args=(self.question.id,))
+        self.assertEqual(self.client.get(url).status_code, 501)
+
+
+@override_settings(ROOT_URLCONF=URLCONFS[True])
+class LongPollTest(TestCase):
+    """
+    PRUEBAS PARA EL LONG POLLING DE /<id>/live-results/?since=<versión>
+    
+    El long polling solo espera con las vistas async.
+    """
+    
+    def setUp(self):
+        cache.clear()
+        self.question = create_question("¿Pregunta con long polling?", days=-1)
+        self.choice = Choice.objects.create(question=self.question, choice_text="A")
+        self.url = reverse('polls:live_results_api', args=(self.question.id,))
+    
+    async def test_waits_until_version_changes(self):
+        """
+        PRUEBA: La petición espera y devuelve los resultados cuando cambia la versión
+        """
+        first = await self.async_client.get(self.url)
+        version = first.json()['version']
+        
+        async def vote_later():
+            await asyncio.sleep(0.1)
+            await sync_to_async(live.results_changed)(self.question.id)
+        
+        response, _ = await asyncio.gather(
+            self.async_client.get(self.url, {'since': version, 'timeout': 5}),
+            vote_later(),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(response.json()['version'], version)
+        self.assertEqual(response['X-Results-Version'], str(response.json()['version']))
+    
+    async def test_timeout_returns_no_change(self):
+        """
+        PRUEBA: Si no hay cambios antes del tiempo límite se responde 204 vacío
+        """
+        first = await self.async_client.get(self.url)
+        version = first.json()['version']
+        
+        with self.settings(POLLS_LIVE_STREAM={'HEARTBEAT_SECONDS': 0.1, 'LONG_POLL_SECONDS': 0.3}):
+            response = await self.async_client.get(self.url, {'since': version})
+        
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(live.broadcaster.subscriber_count(self.question.id), 0)
+    
+    def test_old_version_returns_immediately(self):
+        """
+        PRUEBA: Si el cliente tiene una versión vieja recibe los resultados enseguida
+        """
+        response = self.client.get(self.url, {'since': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_votes'], 0)
+
+
+@override_settings(ROOT_URLCONF=URLCONFS[True])
+class AsyncViewsTest(TestCase):
+    """
+    PRUEBAS PARA LAS VISTAS ASYNC (async_views.py)
+    """
+    
+    def setUp(self):
+        self.question = create_question("¿Pregunta async?", days=-1)
+        self.choice = Choice.objects.create(question=self.question, choice_text="A")
+        self.vote_url = reverse('polls:vote', args=(self.question.id,))
+        self.detail_url = reverse('polls:detail', args=(self.question.id,))
+    
+    def test_urls_follow_setting(self):
+        """
+        PRUEBA: POLLS_ASYNC_VIEWS elige entre las vistas síncronas y las async
+        """
+        self.assertIs(resolve(self.vote_url).func, async_views.vote)
+        with self.settings(ROOT_URLCONF=URLCONFS[False]):
+            self.assertIs(resolve(self.vote_url).func, views.vote)
+            self.assertIs(resolve(self.detail_url).func, views.detail)
+        
+        # polls/urls.py usa el valor de POLLS_ASYNC_VIEWS
+        callbacks = {pattern.name: pattern.callback for pattern in polls_urls.urlpatterns}
+        expected = async_views if settings.POLLS_ASYNC_VIEWS else views
+        self.assertIs(callbacks['live_results_api'], expected.live_results_api)
+        callbacks = {pattern.name: pattern.callback for pattern in polls_urls.get_urlpatterns(use_async=True)}
+        self.assertIs(callbacks['live_results_api'], async_views.live_results_api)
+    
+    async def test_vote_and_duplicate(self):
+        """
+        PRUEBA: La vista async registra el voto una sola vez por votante
+        """
+        response = await self.async_client.post(self.vote_url, {'choice': self.choice.id})
+        self.assertRedirects(response, reverse('polls:results', args=(self.question.id,)),
+                             fetch_redirect_response=False)
+        await self.async_client.post(self.vote_url, {'choice': self.choice.id})
+        
+        self.assertEqual(await Vote.objects.filter(choice=self.choice).acount(), 1)
+        await self.choice.arefresh_from_db()
+        self.assertEqual(self.choice.votes, 1)
+        
+        detail = await self.async_client.get(self.detail_url)
+        self.assertTrue(detail.context['user_has_voted'])
+        self.assertEqual(detail.context['user_vote_choice'], self.choice)
+    
+    async def test_vote_requires_post(self):
+        """
+        PRUEBA: Votar con GET responde 405, igual que la vista síncrona
+        """
+        response = await self.async_client.get(self.vote_url)
+        self.assertEqual(response.status_code, 405)
+
+
+@override_settings(ROOT_URLCONF=URLCONFS[True])
+class AsyncLiveResultsWsgiTest(TransactionTestCase):
+    """
+    PRUEBAS PARA LAS VISTAS ASYNC SERVIDAS POR WSGI EN VARIOS HILOS
+    
+    Con WSGI, async_to_sync corre cada petición en su propio event loop.
+    Usamos TransactionTestCase porque cada hilo usa su propia conexión.
+    """
+    
+    def setUp(self):
+        cache.clear()
+        self.question = create_question("¿Pregunta con hilos?", days=-1)
+        Choice.objects.create(question=self.question, choice_text="A")
+    
+    def test_concurrent_cache_misses_in_threads(self):
+        """
+        PRUEBA: Dos peticiones que calculan los mismos resultados a la vez en hilos distintos responden 200
+        """
+        # Las dos peticiones tienen que estar calculando al mismo tiempo
+        barrier = threading.Barrier(2, timeout=5)
+        build = async_views.build_live_results_payload
+        
+        def build_together(question, version):
+            barrier.wait()
+            return build(question, version)
+        
+        url = reverse('polls:live_results_api', args=(self.question.id,))
+        statuses = []
+        
+        def fetch():
+            try:
+                statuses.append(Client().get(url).status_code)
+            finally:
+                connection.close()
+        
+        with mock.patch.object(async_views, 'build_live_results_payload', build_together):
+            threads = [threading.Thread(target=fetch) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        
+        self.assertEqual(statuses, [200, 200])
+
+
+class BatchLiveResultsTest(TestCase):
+    """
+    PRUEBAS PARA /live-results/?ids=... (resultados de muchas preguntas a la vez)
+    """
+    
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('polls:live_results_batch_api')
+        self.questions = []
+        for number in range(3):
+            question = create_question(f"¿Pregunta del tablero {number}?", days=-1)
+            choice = Choice.objects.create(question=question, choice_text="A")
+            Choice.objects.create(question=question, choice_text="B")
+            for vote_number in range(number):
+                Vote.objects.create(choice=choice, voter_ip=f"10.0.{number}.{vote_number}")
+            self.questions.append(question)
+        self.ids = ','.join(str(question.id) for question in self.questions)
+    
+    def test_many_questions_in_one_request(self):
+        """
+        PRUEBA: Todas las preguntas salen de un número fijo de consultas
+        """
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'ids': self.ids + ',999999'})
+        data = response.json()
+        self.assertEqual(len(data['results']), 3)
+        self.assertEqual(data['missing'], [999999])
+        totals = [data['results'][str(question.id)]['total_votes'] for question in self.questions]
+        self.assertEqual(totals, [0, 1, 2])
+    
+    def test_unchanged_versions_are_skipped(self):
+        """
+        PRUEBA: Las preguntas cuya versión ya tiene el cliente no se recalculan
+        """
+        first = self.client.get(self.url, {'ids': self.ids}).json()
+        body = {
+            'ids': [question.id for question in self.questions],
+            'since': {key: value['version'] for key, value in first['results'].items()},
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.objects.create(choice=self.questions[0].choice_set.first(), voter_ip="10.9.9.9")
+        
+        response = self.client.post(self.url, json.dumps(body), content_type='application/json')
+        data = response.json()
+        self.assertEqual(list(data['results']), [str(self.questions[0].id)])
+        self.assertEqual(data['unchanged'], [question.id for question in self.questions[1:]])
+    
+    @override_settings(POLLS_LIVE_STREAM={'BATCH_MAX_IDS': 2})
+    def test_too_many_ids(self):
+        """
+        PRUEBA: Pedir más preguntas que BATCH_MAX_IDS responde 400
+        """
+        response = self.client.get(self.url, {'ids': self.ids})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'ids': 'a,b'}).status_code, 400)
+
+
+class IndexQueryCountTest(TestCase):
+    """
+    PRUEBAS PARA LA LISTA DE ENCUESTAS SIN CONSULTAS POR TARJETA
+    """
+    
+    def setUp(self):
+        cache.clear()
+    
+    def create_polls(self, count):
+        for number in range(count):
+            question = create_question(f"¿Encuesta {number}?", days=-1)
+            choice = Choice.objects.create(question=question, choice_text="A")
+            Choice.objects.create(question=question, choice_text="B")
+            Vote.objects.create(choice=choice, voter_ip=f"10.1.0.{number}")
+    
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+    
+    def test_query_count_does_not_depend_on_page_size(self):
+        """
+        PRUEBA: index y la vista de lista hacen las mismas consultas con 1 o 5 encuestas
+        """
+        for url in (reverse('polls:index'), reverse('polls:question_list')):
+            cache.clear()
+            Question.objects.all().delete()
+            self.create_polls(1)
+            with_one, _ = self.count_queries(url)
+            cache.clear()
+            self.create_polls(4)
+            with_five, response = self.count_queries(url)
+            self.assertEqual(with_one, with_five)
+            self.assertEqual([q.total_votes_count for q in response.context['questions']], [1] * 5)
+            self.assertEqual([q.choices_count for q in response.context['questions']], [2] * 5)
+    
+    def test_card_cache_follows_results_version(self):
+        """
+        PRUEBA: La tarjeta en caché se renueva cuando alguien vota
+        """
+        question = create_question("¿Encuesta en caché?", days=-1)
+        choice = Choice.objects.create(question=question, choice_text="A")
+        self.client.get(reverse('polls:index'))
+        
+        # Cambiar el texto sin subir la versión: la tarjeta sigue en caché
+        Question.objects.filter(pk=question.pk).update(question_text="Texto nuevo")
+        self.assertNotContains(self.client.get(reverse('polls:index')), "Texto nuevo")
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.objects.create(choice=choice, voter_ip="10.2.0.1")
+        self.assertContains(self.client.get(reverse('polls:index')), "Texto nuevo")
+
+
+class KeysetPaginationTest(TestCase):
+    """
+    PRUEBAS PARA LA PAGINACIÓN POR CURSOR DE LA LISTA DE ENCUESTAS
+    """
+    
+    def setUp(self):
+        cache.clear()
+        # Varias preguntas con la misma fecha para probar el desempate por id
+        same_time = timezone.now() - datetime.timedelta(days=1)
+        self.questions = [create_question(f"¿Encuesta {n}?", days=-2 - n) for n in range(6)]
+        self.questions += [
+            Question.objects.create(question_text=f"¿Empate {n}?", pub_date=same_time)
+            for n in range(6)
+        ]
+        self.expected = [
+            q.id for q in sorted(self.questions, key=lambda q: (q.pub_date, q.id), reverse=True)
+        ]
+    
+    def test_walk_forward_and_back(self):
+        """
+        PRUEBA: Recorrer todas las páginas hacia adelante y hacia atrás
+        """
+        url = reverse('polls:index')
+        pages, cursor = [], None
+        while True:
+            response = self.client.get(url, {'cursor': cursor} if cursor else {})
+            page = response.context['questions']
+            pages.append([q.id for q in page])
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(sum(pages, []), self.expected)
+        self.assertEqual([len(ids) for ids in pages], [5, 5, 2])
+        
+        # Desde la última página, volver hacia atrás
+        back = self.client.get(url, {'cursor': page.previous_cursor}).context['questions']
+        self.assertEqual([q.id for q in back], pages[1])
+        first = self.client.get(url, {'cursor': back.previous_cursor}).context['questions']
+        self.assertEqual([q.id for q in first], pages[0])
+        self.assertFalse(first.has_previous())
+    
+    def test_invalid_cursor_shows_first_page(self):
+        """
+        PRUEBA: Un cursor inválido muestra la primera página
+        """
+        response = self.client.get(reverse('polls:question_list'), {'cursor': 'no-es-un-cursor'})
+        self.assertEqual([q.id for q in response.context['questions']], self.expected[:5])
+    
+    def test_total_is_cached(self):
+        """
+        PRUEBA: El total de encuestas no se cuenta en cada petición
+        """
+        self.client.get(reverse('polls:index'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('polls:index'))
+        self.assertEqual(response.context['total_questions'], 12)
+        self.assertFalse(any('COUNT(*)' in query['sql'] for query in queries.captured_queries))
+        
+        create_question("¿Nueva?", days=-1)
+        self.assertEqual(self.client.get(reverse('polls:index')).context['total_questions'], 13)
+
+
+class VoterFilterTest(TestCase):
+    """
+    PRUEBAS PARA EL FILTRO EN MEMORIA DE "¿YA VOTÓ?" (voter_filter.py)
+    """
+    
+    def setUp(self):
+        cache.clear()
+        voter_filters.clear()
+        self.question = create_question("¿Pregunta con filtro?", days=-1)
+        self.choice = Choice.objects.create(question=self.question, choice_text="A")
+        Vote.objects.create(choice=self.choice, voter_ip="10.3.0.1")
+        self.detail_url = reverse('polls:detail', args=(self.question.id,))
+    
+    def test_bloom_filter_has_no_false_negatives(self):
+        """
+        PRUEBA: Todas las claves agregadas están y los falsos positivos son pocos
+        """
+        bloom = BloomFilter(2000, 0.01)
+        for number in range(2000):
+            bloom.add(f'ip:10.0.{number // 256}.{number % 256}')
+        self.assertTrue(all(f'ip:10.0.{n // 256}.{n % 256}' in bloom for n in range(2000)))
+        false_positives = sum(f'ip:172.16.{n // 256}.{n % 256}' in bloom for n in range(10000))
+        self.assertLess(false_positives / 10000, 0.03)
+    
+    def vote_queries(self, **extra):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.detail_url, **extra)
+        return response, [q for q in queries.captured_queries if 'polls_vote' in q['sql']]
+    
+    def test_new_visitor_skips_vote_query(self):
+        """
+        PRUEBA: Un visitante que no votó no genera consultas a la tabla de votos
+        """
+        for async_views_enabled in (False, True):
+            with self.settings(ROOT_URLCONF=URLCONFS[async_views_enabled]):
+                self.vote_queries(REMOTE_ADDR="10.3.0.9")  # Arma el filtro
+                response, queries = self.vote_queries(REMOTE_ADDR="10.3.0.9")
+                self.assertFalse(response.context['user_has_voted'])
+                self.assertEqual(queries, [])
+        
+        # Quien ya votó sí se busca en la base de datos
+        response, queries = self.vote_queries(REMOTE_ADDR="10.3.0.1")
+        self.assertTrue(response.context['user_has_voted'])
+        self.assertEqual(len(queries), 1)
+    
+    def test_new_vote_is_added_to_filter(self):
+        """
+        PRUEBA: Un voto nuevo se ve enseguida, sin esperar a que se arme de nuevo el filtro
+        """
+        self.assertFalse(voter_filters.might_have_voted(self.question.id, "10.3.0.2"))
+        Vote.objects.create(choice=self.choice, voter_ip="10.3.0.2")
+        self.assertTrue(voter_filters.might_have_voted(self.question.id, "10.3.0.2"))
+        self.assertTrue(self.vote_queries(REMOTE_ADDR="10.3.0.2")[0].context['user_has_voted'])
+    
+    def test_eviction(self):
+        """
+        PRUEBA: Se respeta el límite de memoria y se descartan los filtros sin uso
+        """
+        filters = VoterFilterCache()
+        other = create_question("¿Otra pregunta?", days=-1)
+        with self.settings(POLLS_VOTER_FILTER={'MIN_CAPACITY': 1000, 'MEMORY_BYTES': 1500}):
+            filters.might_have_voted(self.question.id, "10.3.0.9")
+            filters.might_have_voted(other.id, "10.3.0.9")
+            self.assertEqual(filters.stats()['filters'], 1)
+        with self.settings(POLLS_VOTER_FILTER={'IDLE_SECONDS': 0}):
+            filters.might_have_voted(self.question.id, "10.3.0.9")
+            self.assertEqual(filters.stats()['evictions'], 2)
+
+
+class VoterIdentityTest(TestCase):
+    """
+    PRUEBAS PARA LA CLAVE BINARIA DEL VOTANTE (voter_identity.py)
+    """
+    
+    def setUp(self):
+        voter_filters.clear()
+        self.question = create_question("¿Pregunta con clave?", days=-1)
+        self.choice = Choice.objects.create(question=self.question, choice_text="A")
+    
+    def test_packed_key(self):
+        """
+        PRUEBA: Las claves ocupan 16 bytes y las formas de una misma IPv6 dan la misma clave
+        """
+        self.assertEqual(len(voter_key("192.168.1.1")), 16)
+        self.assertEqual(voter_key("::1"), voter_key("0:0::1"))
+        self.assertEqual(voter_key("2001:DB8::1"), voter_key("2001:db8:0:0::1"))
+        self.assertNotEqual(voter_key("10.0.0.1"), voter_key("10.0.0.2"))
+        self.assertEqual(key_to_ip(voter_key("192.168.1.1")), "192.168.1.1")
+    
+    def test_hash_mode(self):
+        """
+        PRUEBA: En modo 'hash' la clave depende de la sal y no revela la IP
+        """
+        packed = voter_key("192.168.1.1")
+        with self.settings(POLLS_VOTER_IDENTITY={'MODE': 'hash', 'SALT': 'sal-1'}):
+            hashed = voter_key("192.168.1.1")
+            self.assertIsNone(key_to_ip(hashed))
+        with self.settings(POLLS_VOTER_IDENTITY={'MODE': 'hash', 'SALT': 'sal-2'}):
+            other_salt = voter_key("192.168.1.1")
+        self.assertEqual(len(hashed), 16)
+        self.assertNotEqual(hashed, packed)
+        self.assertNotEqual(hashed, other_salt)
+    
+    def test_vote_stores_key(self):
+        """
+        PRUEBA: Al guardar un voto se calcula su clave, y rekey_votes la recalcula
+        """
+        vote = Vote.objects.create(choice=self.choice, voter_ip="10.4.0.1")
+        self.assertEqual(bytes(Vote.objects.get(pk=vote.pk).voter_key), voter_key("10.4.0.1"))
+        with self.settings(POLLS_VOTER_IDENTITY={'MODE': 'hash', 'SALT': 'sal'}):
+            self.assertEqual(rekey_votes(Vote), 1)
+            self.assertEqual(bytes(Vote.objects.get(pk=vote.pk).voter_key), voter_key("10.4.0.1"))
+        # Al pasar a 'hash' también se borra la IP en texto
+        self.assertIsNone(Vote.objects.get(pk=vote.pk).voter_ip)
+    
+    def test_hash_mode_does_not_store_ip(self):
+        """
+        PRUEBA: En modo 'hash' el voto guarda solo la clave, sin la IP en texto, y sigue impidiendo duplicados
+        """
+        with self.settings(POLLS_VOTER_IDENTITY={'MODE': 'hash', 'SALT': 'sal'}):
+            response = self.client.post(
+                reverse('polls:vote', args=(self.question.id,)), {'choice': self.choice.id}, REMOTE_ADDR='10.4.1.1',
+            )
+            self.assertEqual(response.status_code, 302)
+            vote = Vote.objects.get(question=self.question)
+            self.assertIsNone(vote.voter_ip)
+            self.assertEqual(bytes(vote.voter_key), voter_key("10.4.1.1"))
+            
+            self.client.post(
+                reverse('polls:vote', args=(self.question.id,)), {'choice': self.choice.id}, REMOTE_ADDR='10.4.1.1',
+            )
+            self.assertEqual(Vote.objects.filter(question=self.question).count(), 1)
+            self.assertTrue(
+                self.client.get(reverse('polls:results', args=(self.question.id,)), REMOTE_ADDR='10.4.1.1')
+                .context['user_vote']
+            )
+    
+    def test_same_ipv6_written_differently_is_duplicate(self):
+        """
+        PRUEBA: La misma IPv6 escrita de otra forma no puede votar dos veces
+        """
+        Vote.objects.create(choice=self.choice, voter_ip="2001:db8::1")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Vote.objects.create(choice=self.choice, voter_ip="2001:DB8:0:0::1")
+    
+    def test_admin_search_by_ip(self):
+        """
+        PRUEBA: En el admin se puede buscar un voto por su IP
+        """
+        Vote.objects.create(choice=self.choice, voter_ip="::1")
+        User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        self.client.login(username='admin', password='clave')
+        response = self.client.get(reverse('admin:polls_vote_changelist'), {'q': '0:0::1'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        
+        # La búsqueda por IP respeta los filtros de la lista
+        other = create_question("¿Otra pregunta?", days=-1)
+        Vote.objects.create(choice=other.choice_set.create(choice_text="B"), voter_ip="::1")
+        response = self.client.get(
+            reverse('admin:polls_vote_changelist'), {'q': '0:0::1', 'question__id__exact': other.id},
+        )
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertEqual(response.context['cl'].result_list[0].question, other)
+    
+    def test_invalid_forwarded_for(self):
+        """
+        PRUEBA: Un X-Forwarded-For que no es una IP ("unknown") no rompe las vistas: se usa REMOTE_ADDR
+        """
+        Vote.objects.create(choice=self.choice, voter_ip="127.0.0.1")
+        for async_views_enabled in (False, True):
+            with self.settings(ROOT_URLCONF=URLCONFS[async_views_enabled]):
+                detail = self.client.get(
+                    reverse('polls:detail', args=(self.question.id,)), HTTP_X_FORWARDED_FOR='unknown',
+                )
+                self.assertEqual(detail.status_code, 200)
+                self.assertTrue(detail.context['user_has_voted'])
+        results = self.client.get(
+            reverse('polls:results', args=(self.question.id,)), HTTP_X_FORWARDED_FOR='unknown, 10.0.0.1',
+        )
+        self.assertEqual(results.status_code, 200)
+        self.assertEqual(results.context['user_vote'], self.choice)
+    
+    def test_vote_without_valid_ip_is_rejected(self):
+        """
+        PRUEBA: Sin ninguna IP válida la página se muestra como "no votó" y el voto se rechaza con 400
+        """
+        for async_views_enabled in (False, True):
+            with self.settings(ROOT_URLCONF=URLCONFS[async_views_enabled]):
+                detail = self.client.get(reverse('polls:detail', args=(self.question.id,)), REMOTE_ADDR='')
+                self.assertEqual(detail.status_code, 200)
+                self.assertFalse(detail.context['user_has_voted'])
+                response = self.client.post(
+                    reverse('polls:vote', args=(self.question.id,)), {'choice': self.choice.id},
+                    REMOTE_ADDR='', HTTP_X_FORWARDED_FOR='unknown',
+                )
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            self.client.get(reverse('polls:results', args=(self.question.id,)), REMOTE_ADDR='').status_code, 200,
+        )
+        self.assertFalse(Vote.objects.exists())
+
+
+class VoteArchiveTest(TestCase):
+    """
+    PRUEBAS PARA EL ARCHIVO DE VOTOS POR COLUMNAS (vote_archive.py)
+    """
+    
+    def setUp(self):
+        voter_filters.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = self.settings(POLLS_VOTE_ARCHIVE={'DIRECTORY': directory, 'BATCH_SIZE': 2})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        
+        self.question = create_question("¿Pregunta vieja?", days=-200)
+        self.choice_a = Choice.objects.create(question=self.question, choice_text="A")
+        self.choice_b = Choice.objects.create(question=self.question, choice_text="B")
+        self.start = timezone.now()
+        for number in range(5):
+            Vote.objects.create(choice=self.choice_a if number < 3 else self.choice_b, voter_ip=f"10.5.0.{number}")
+        Vote.objects.filter(voter_ip="10.5.0.0").update(voted_at=self.start - datetime.timedelta(days=1))
+        self.recent = create_question("¿Pregunta reciente?", days=-1)
+        Vote.objects.create(choice=Choice.objects.create(question=self.recent, choice_text="C"), voter_ip="10.5.0.9")
+    
+    def test_command_archives_old_questions(self):
+        """
+        PRUEBA: El comando archiva solo las encuestas viejas, cierra la encuesta y borra sus votos
+        """
+        out = StringIO()
+        call_command('archive_votes', stdout=out)
+        self.assertIn('5 votos archivados, 5 filas borradas', out.getvalue())
+        
+        self.question.refresh_from_db()
+        self.assertIsNotNone(self.question.archived_at)
+        self.assertFalse(self.question.is_active)
+        self.assertFalse(Vote.objects.filter(question=self.question).exists())
+        self.assertEqual(Vote.objects.filter(question=self.recent).count(), 1)
+        self.assertEqual(self.question.get_results()[self.choice_a.id]['votes'], 3)
+        self.assertEqual(self.question.total_votes(), 5)
+    
+    def test_archive_file_is_read_by_columns(self):
+        """
+        PRUEBA: El archivo se lee con mmap: totales, rangos de fechas y recuento
+        """
+        vote_archive.archive_question(self.question)
+        with vote_archive.open_archive(self.question.id) as archive:
+            self.assertEqual(len(archive), 5)
+            self.assertEqual(archive.tally(), {self.choice_a.id: 3, self.choice_b.id: 2})
+            self.assertEqual(archive.tally(since=self.start), {self.choice_a.id: 2, self.choice_b.id: 2})
+            first, last = archive.date_range()
+            self.assertLess(first, self.start)
+            self.assertEqual([choice_id for choice_id, _ in archive.iter_votes(until=self.start)], [self.choice_a.id])
+        
+        # recount_votes y count_votes leen el archivo
+        Choice.objects.filter(pk=self.choice_a.pk).update(votes=0)
+        self.assertEqual(self.question.recount_votes(), 5)
+        self.assertEqual(count_votes(self.question, since=self.start)[self.choice_b.id], 2)
+        
+        response = self.client.get(reverse('polls:results', args=(self.question.id,)))
+        self.assertContains(response, 'Encuesta archivada')
+        self.assertEqual(response.context['total_votes'], 5)
+    
+    def test_resume_after_interrupted_delete(self):
+        """
+        PRUEBA: Si el borrado se interrumpe, volver a correr el comando termina de borrar
+        """
+        with mock.patch.object(vote_archive, 'delete_archived_rows', return_value=0):
+            vote_archive.archive_question(self.question)
+        self.assertEqual(Vote.objects.filter(question=self.question).count(), 5)
+        
+        call_command('archive_votes', stdout=StringIO())
+        self.assertFalse(Vote.objects.filter(question=self.question).exists())
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.recount_votes(), 5)
+    
+    def test_deleting_question_removes_file(self):
+        """
+        PRUEBA: Al eliminar una pregunta archivada se borra su archivo
+        """
+        vote_archive.archive_question(self.question)
+        path = vote_archive.archive_path(self.question.id)
+        self.assertTrue(os.path.exists(path))
+        self.question.delete()
+        self.assertFalse(os.path.exists(path))
+
+
+class VoteRollupTest(TestCase):
+    """
+    PRUEBAS PARA LOS VOTOS POR INTERVALO Y EL ENDPOINT /timeline/ (rollups.py)
+    """
+    
+    def setUp(self):
+        voter_filters.clear()
+        self.question = create_question("¿Pregunta con evolución?", days=-3)
+        self.choice_a = Choice.objects.create(question=self.question, choice_text="A")
+        self.choice_b = Choice.objects.create(question=self.question, choice_text="B")
+        self.url = reverse('polls:timeline_api', args=(self.question.id,))
+    
+    def test_votes_update_rollups(self):
+        """
+        PRUEBA: Cada voto suma a su minuto, hora y día
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.objects.create(choice=self.choice_a, voter_ip="10.6.0.1")
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.objects.create(choice=self.choice_a, voter_ip="10.6.0.2")
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.objects.create(choice=self.choice_b, voter_ip="10.6.0.3")
+        
+        rows = VoteRollup.objects.filter(choice=self.choice_a)
+        self.assertEqual(sorted(rows.values_list('granularity', flat=True)), ['day', 'hour', 'minute'])
+        self.assertTrue(all(votes == 2 for votes in rows.values_list('votes', flat=True)))
+        self.assertEqual(VoteRollup.objects.get(choice=self.choice_b, granularity='day').votes, 1)
+    
+    def test_rebuild_command(self):
+        """
+        PRUEBA: El comando recalcula los rollups desde los votos existentes
+        """
+        now = timezone.now()
+        for number, hours_ago in enumerate([0, 0, 5]):
+            vote = Vote.objects.create(choice=self.choice_a, voter_ip=f"10.6.1.{number}")
+            Vote.objects.filter(pk=vote.pk).update(voted_at=now - datetime.timedelta(hours=hours_ago))
+        VoteRollup.objects.all().delete()
+        
+        call_command('rebuild_vote_rollups', question=[self.question.id], stdout=StringIO())
+        hours = dict(VoteRollup.objects.filter(granularity='hour').values_list('bucket', 'votes'))
+        self.assertEqual(sorted(hours.values()), [1, 2])
+        self.assertEqual(hours[rollups.truncate(now, 'hour')], 2)
+    
+    def test_timeline_reads_only_rollups(self):
+        """
+        PRUEBA: /timeline/ devuelve una serie por opción, con ceros, sin consultar la tabla de votos
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.objects.create(choice=self.choice_a, voter_ip="10.6.2.1")
+            Vote.objects.create(choice=self.choice_b, voter_ip="10.6.2.2")
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'bucket': 'hour'})
+        self.assertFalse([q for q in queries.captured_queries if 'polls_vote"' in q['sql']])
+        data = response.json()
+        self.assertTrue(data['success'])
+        # Dos días de horas: 48 intervalos más la hora en curso
+        self.assertEqual(len(data['labels']), 49)
+        self.assertEqual([serie['choice_text'] for serie in data['series']], ["A", "B"])
+        self.assertEqual(data['series'][0]['data'][-1], 1)
+        self.assertEqual(sum(data['series'][0]['data']), 1)
+        
+        response = self.client.get(self.url, {'bucket': 'day', 'from': '2020-01-01T00:00Z', 'to': '2020-01-03T00:00Z'})
+        self.assertEqual(response.json()['series'][0]['data'], [0, 0])
+    
+    def test_votes_are_buffered(self):
+        """
+        PRUEBA: Los votos no escriben rollups en su transacción; se escriben juntos (un UPDATE por fila) al vaciar el buffer
+        """
+        self.addCleanup(rollups.buffer.flush)
+        with self.settings(POLLS_TIMELINE={'GRANULARITIES': ['hour'], 'FLUSH_SECONDS': 60}):
+            with CaptureQueriesContext(connection) as queries:
+                with self.captureOnCommitCallbacks(execute=True):
+                    Vote.objects.create(choice=self.choice_a, voter_ip="10.6.3.1")
+            self.assertFalse([q for q in queries.captured_queries if 'polls_voterollup' in q['sql']])
+            for number in range(2, 6):
+                with self.captureOnCommitCallbacks(execute=True):
+                    Vote.objects.create(choice=self.choice_a, voter_ip=f"10.6.3.{number}")
+            self.assertFalse(VoteRollup.objects.exists())
+            
+            # Un voto deshecho nunca llega al buffer
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                with transaction.atomic():
+                    Vote.objects.create(choice=self.choice_b, voter_ip="10.6.3.9")
+                    transaction.set_rollback(True)
+            self.assertEqual(callbacks, [])
+            
+            self.assertEqual(rollups.buffer.flush(), 1)
+        self.assertEqual(VoteRollup.objects.get(choice=self.choice_a, granularity='hour').votes, 5)
+        self.assertFalse(VoteRollup.objects.filter(choice=self.choice_b).exists())
+    
+    def test_timeline_does_not_write(self):
+        """
+        PRUEBA: Leer /timeline/ no escribe los rollups pendientes
+        """
+        self.addCleanup(rollups.buffer.flush)
+        with self.settings(POLLS_TIMELINE={'GRANULARITIES': ['hour'], 'FLUSH_SECONDS': 60}):
+            with self.captureOnCommitCallbacks(execute=True):
+                Vote.objects.create(choice=self.choice_a, voter_ip="10.6.5.1")
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(self.url, {'bucket': 'hour'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries.captured_queries if not q['sql'].startswith('SELECT')])
+    
+    def test_failed_flush_is_retried(self):
+        """
+        PRUEBA: Si la escritura falla (base bloqueada) los incrementos no se pierden y se reintentan
+        """
+        self.addCleanup(rollups.buffer.flush)
+        with self.settings(POLLS_TIMELINE={'GRANULARITIES': ['hour'], 'FLUSH_SECONDS': 60}):
+            with self.captureOnCommitCallbacks(execute=True):
+                Vote.objects.create(choice=self.choice_a, voter_ip="10.6.4.1")
+            
+            locked = OperationalError('database is locked')
+            with mock.patch.object(rollups, 'write_counts', side_effect=locked), \
+                    self.assertLogs('polls.rollups', level='ERROR'):
+                self.assertEqual(rollups.buffer.flush(), 0)
+            # El temporizador quedó programado para reintentar
+            self.assertIsNotNone(rollups.buffer._timer)
+            
+            with self.captureOnCommitCallbacks(execute=True):
+                Vote.objects.create(choice=self.choice_a, voter_ip="10.6.4.2")
+            self.assertEqual(rollups.buffer.flush(), 1)
+        self.assertEqual(VoteRollup.objects.get(choice=self.choice_a, granularity='hour').votes, 2)
+    
+    def test_timeline_validation(self):
+        """
+        PRUEBA: Parámetros inválidos responden 400
+        """
+        self.assertEqual(self.client.get(self.url, {'bucket': 'week'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'from': 'ayer'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'from': '2024-01-02', 'to': '2024-01-01'}).status_code, 400)
+        self.assertEqual(
+            self.client.get(self.url, {'bucket': 'minute', 'from': '2020-01-01', 'to': '2024-01-01'}).status_code,
+            400
+        )
+
+
+class ExportTest(TestCase):
+    """
+    PRUEBAS PARA LA EXPORTACIÓN DE VOTOS EN CSV / NDJSON (export.py)
+    """
+    
+    def setUp(self):
+        voter_filters.clear()
+        self.question = create_question("¿Pregunta exportada?", days=-1)
+        self.choice_a = Choice.objects.create(question=self.question, choice_text="Sí, claro")
+        self.choice_b = Choice.objects.create(question=self.question, choice_text="No")
+        self.user = User.objects.create_user('votante', password='clave')
+        Vote.objects.create(choice=self.choice_a, voter_ip="10.7.0.1", user=self.user)
+        Vote.objects.create(choice=self.choice_a, voter_ip="10.7.0.2")
+        Vote.objects.create(choice=self.choice_b, voter_ip="10.7.0.3")
+        self.staff = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+    
+    def download(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8-sig')
+    
+    def test_only_staff(self):
+        """
+        PRUEBA: Los visitantes no pueden exportar
+        """
+        response = self.client.get(reverse('polls:export_csv', args=(self.question.id,)))
+        self.assertEqual(response.status_code, 302)
+    
+    def test_csv_and_ndjson(self):
+        """
+        PRUEBA: CSV y NDJSON traen un renglón por voto
+        """
+        self.client.force_login(self.staff)
+        content = self.download(self.client.get(reverse('polls:export_csv', args=(self.question.id,))))
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['choice_text'], "Sí, claro")
+        self.assertEqual(rows[0]['user'], 'votante')
+        self.assertEqual(rows[1]['voter_ip'], '10.7.0.2')
+        
+        response = self.client.get(reverse('polls:export_ndjson', args=(self.question.id,)))
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in self.download(response).splitlines()]
+        self.assertEqual([line['choice_id'] for line in lines], [self.choice_a.id, self.choice_a.id, self.choice_b.id])
+    
+    def test_totals(self):
+        """
+        PRUEBA: Con ?totals=1 se exporta un renglón por opción
+        """
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('polls:export_csv', args=(self.question.id,)), {'totals': '1'})
+        rows = list(csv.DictReader(StringIO(self.download(response))))
+        self.assertEqual([(row['choice_text'], row['votes']) for row in rows], [("Sí, claro", '2'), ("No", '1')])
+    
+    def test_admin_action(self):
+        """
+        PRUEBA: La acción del admin exporta las preguntas elegidas
+        """
+        other = create_question("¿Otra?", days=-1)
+        Vote.objects.create(choice=Choice.objects.create(question=other, choice_text="X"), voter_ip="10.7.0.9")
+        self.client.force_login(self.staff)
+        response = self.client.post(reverse('admin:polls_question_changelist'), {
+            'action': 'export_votes_csv',
+            '_selected_action': [self.question.id, other.id],
+        })
+        rows = list(csv.DictReader(StringIO(self.download(response))))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[-1]['question_id'], str(other.id))
+    
+    def test_hash_mode_omits_ip(self):
+        """
+        PRUEBA: En modo 'hash' la exportación no trae la columna voter_ip
+        """
+        self.client.force_login(self.staff)
+        with self.settings(POLLS_VOTER_IDENTITY={'MODE': 'hash', 'SALT': 'sal'}):
+            content = self.download(self.client.get(reverse('polls:export_csv', args=(self.question.id,))))
+            lines = self.download(self.client.get(reverse('polls:export_ndjson', args=(self.question.id,)))).splitlines()
+        self.assertNotIn('voter_ip', next(csv.reader(StringIO(content))))
+        self.assertNotIn('10.7.0.2', content)
+        self.assertNotIn('voter_ip', json.loads(lines[0]))
+        self.assertEqual(json.loads(lines[0])['user'], 'votante')
+    
+    def test_streams_in_chunks(self):
+        """
+        PRUEBA: Los votos se leen por tandas de CHUNK_SIZE, sin cargarlos todos
+        """
+        with self.settings(POLLS_EXPORT={'CHUNK_SIZE': 1}):
+            rows = export.vote_rows([self.question])
+            self.assertEqual(next(rows)[3], "Sí, claro")
+            self.assertEqual(len(list(rows)), 2)
+
+
+class ImportVotesTest(TestCase):
+    """
+    PRUEBAS PARA EL COMANDO import_votes
+    """
+    
+    def setUp(self):
+        voter_filters.clear()
+        self.question = create_question("¿Pregunta importada?", days=-10)
+        self.choice_a = Choice.objects.create(question=self.question, choice_text="Papel")
+        self.choice_b = Choice.objects.create(question=self.question, choice_text="Kiosco")
+        User.objects.create_user('kiosco1', password='clave')
+        Vote.objects.create(choice=self.choice_a, voter_ip="10.8.0.1")
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.directory = directory
+    
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+    
+    def test_import_csv(self):
+        """
+        PRUEBA: Importa por ID o por texto, saltea duplicados y rechaza renglones inválidos
+        """
+        path = self.write('votos.csv', (
+            "question,choice,voter_ip,user,voted_at\n"
+            f"{self.question.id},{self.choice_a.id},10.8.0.2,,2024-03-01T10:00:00Z\n"
+            f"{self.question.id},kiosco,10.8.0.3,kiosco1,2024-03-01T10:05:00Z\n"
+            f"{self.question.id},Kiosco,10.8.0.3,,\n"             # Misma IP: duplicado
+            f"{self.question.id},Papel,10.8.0.1,,\n"              # Ya votó: duplicado
+            f"{self.question.id},Otra,10.8.0.4,,\n"               # Opción desconocida
+            f"{self.question.id},Papel,no-es-ip,,\n"              # IP inválida
+            f"{self.question.id},Papel,10.8.0.5,nadie,\n"         # Usuario desconocido
+        ))
+        out = StringIO()
+        call_command('import_votes', path, batch_size=2, stdout=out)
+        output = out.getvalue()
+        self.assertIn('2 votos importados', output)
+        self.assertIn('2 duplicados salteados, 3 rechazados', output)
+        self.assertIn('opción desconocida', output)
+        
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.votes, 3)
+        imported = Vote.objects.get(voter_ip="10.8.0.3")
+        self.assertEqual(imported.user.username, 'kiosco1')
+        self.assertEqual(imported.voted_at, datetime.datetime(2024, 3, 1, 10, 5, tzinfo=datetime.timezone.utc))
+        self.assertEqual(VoteRollup.objects.filter(granularity='day', bucket__year=2024).count(), 2)
+    
+    def test_import_ndjson_with_question_option(self):
+        """
+        PRUEBA: NDJSON con --question resuelve las opciones por texto
+        """
+        path = self.write('votos.ndjson', (
+            '{"choice": "Kiosco", "voter_ip": "2001:db8::1"}\n'
+            '\n'
+            '{"choice_text": "Papel", "voter_ip": "2001:DB8::2"}\n'
+            'no es json\n'
+        ))
+        out = StringIO()
+        call_command('import_votes', path, question=self.question.id, stdout=out)
+        self.assertIn('2 votos importados', out.getvalue())
+        self.assertIn('1 rechazados', out.getvalue())
+        self.assertEqual(self.question.get_results()[self.choice_b.id]['votes'], 1)
+    
+    def test_conflicts_dropped_by_insert_are_not_counted(self):
+        """
+        PRUEBA: Los votos que descarta la restricción única (ignore_conflicts) no cuentan como importados
+        
+        Simula otro proceso que votó entre la búsqueda de duplicados y el INSERT.
+        """
+        path = self.write('votos.csv', (
+            "choice_id,voter_ip\n"
+            f"{self.choice_a.id},10.8.0.1\n"                     # Ya votó
+            f"{self.choice_b.id},10.8.0.2\n"
+        ))
+        out = StringIO()
+        with mock.patch.object(import_votes.Command, 'remove_duplicates', lambda self, votes: votes):
+            call_command('import_votes', path, stdout=out)
+        self.assertIn('1 votos importados', out.getvalue())
+        self.assertIn('1 duplicados salteados', out.getvalue())
+        self.assertEqual(Vote.objects.filter(question=self.question).count(), 2)
+    
+    def test_vote_saved_by_another_process_during_insert(self):
+        """
+        PRUEBA: Un voto de otro proceso guardado justo antes del INSERT no se cuenta como importado
+        """
+        path = self.write('votos.csv', (
+            "choice_id,voter_ip\n"
+            f"{self.choice_a.id},10.8.0.2\n"
+            f"{self.choice_b.id},10.8.0.3\n"
+        ))
+        bulk_create = Vote.objects.bulk_create
+        
+        def bulk_create_after_other_vote(votes, **kwargs):
+            Vote.objects.create(choice=self.choice_a, voter_ip="10.8.0.3")
+            return bulk_create(votes, **kwargs)
+        
+        out = StringIO()
+        with mock.patch.object(Vote.objects, 'bulk_create', bulk_create_after_other_vote):
+            call_command('import_votes', path, stdout=out)
+        self.assertIn('1 votos importados', out.getvalue())
+        self.assertIn('1 duplicados salteados', out.getvalue())
+        self.assertEqual(Vote.objects.get(voter_ip="10.8.0.3").choice, self.choice_a)
+    
+    def test_round_trip_with_export(self):
+        """
+        PRUEBA: Lo que genera la exportación se puede importar en otra base
+        """
+        content = b''.join(export.stream_export([self.question], 'csv').streaming_content).decode('utf-8-sig')
+        Vote.objects.all().delete()
+        path = self.write('export.csv', content)
+        call_command('import_votes', path, stdout=StringIO())
+        self.assertEqual(Vote.objects.filter(question=self.question, voter_ip="10.8.0.1").count(), 1)
+
+
+class SyntheticDataTest(TestCase):
+    """
+    PRUEBAS PARA EL MODO SINTÉTICO DE load_sample_data (synthetic.py)
+    """
+    
+    def generate(self, seed=42, skew='zipf'):
+        call_command(
+            'load_sample_data', delete=True, questions=20, choices='2-4', votes=600,
+            seed=seed, skew=skew, end='2024-06-01', stdout=StringIO(),
+        )
+        return [
+            (question.question_text, question.pub_date, question.votes,
+             list(question.choice_set.values_list('votes', flat=True)))
+            for question in Question.objects.order_by('pub_date', 'id')
+        ]
+    
+    def test_generates_consistent_data(self):
+        """
+        PRUEBA: Se crean las filas pedidas y los contadores coinciden con los votos
+        """
+        dataset = self.generate()
+        self.assertEqual(len(dataset), 20)
+        self.assertEqual(Vote.objects.count(), 600)
+        self.assertTrue(all(2 <= len(choices) <= 4 for _, _, _, choices in dataset))
+        self.assertTrue(all(total == sum(choices) for _, _, total, choices in dataset))
+        self.assertEqual(sum(total for _, _, total, _ in dataset), 600)
+        self.assertTrue(Vote.objects.filter(user__isnull=False).exists())
+        
+        # Los votos llegan después de la publicación y antes del fin
+        end = datetime.datetime(2024, 6, 1, tzinfo=datetime.timezone.utc)
+        self.assertFalse(Vote.objects.filter(voted_at__gt=end).exists())
+        self.assertFalse(Vote.objects.filter(voted_at__lt=F('question__pub_date')).exists())
+        
+        # Los rollups por hora y por día quedan igual que si se recalcularan
+        self.assertEqual(
+            VoteRollup.objects.filter(granularity='day').aggregate(total=Sum('votes'))['total'], 600
+        )
+        rows = lambda: sorted(VoteRollup.objects.values_list('choice_id', 'granularity', 'bucket', 'votes'))
+        generated = rows()
+        for question in Question.objects.all():
+            rollups.rebuild(question, ['hour', 'day'])
+        self.assertEqual(rows(), generated)
+    
+    def test_same_seed_same_dataset(self):
+        """
+        PRUEBA: Con la misma semilla se genera exactamente lo mismo
+        """
+        first = self.generate(seed=7)
+        self.assertEqual(self.generate(seed=7), first)
+        self.assertNotEqual(self.generate(seed=8), first)
+    
+    def test_zipf_skew(self):
+        """
+        PRUEBA: Con zipf unas pocas encuestas concentran los votos
+        """
+        totals = sorted((total for _, _, total, _ in self.generate(skew='zipf')), reverse=True)
+        self.assertGreater(sum(totals[:4]), 300)
+
+
+
+class QueryBudgetTest(TestCase):
+    """
+    PRUEBAS DEL PRESUPUESTO DE CONSULTAS DE LOS CAMINOS MÁS USADOS (benchmarks.py)
+    """
+    
+    def setUp(self):
+        synthetic.generate(20, choices=(3, 5), votes=400, seed=3)
+    
+    def test_views_within_query_budget(self):
+        """
+        PRUEBA: Ningún caso hace más consultas que su presupuesto
+        
+        Si falla, alguna vista o método empezó a hacer consultas de más
+        (por ejemplo, una por opción): revisar el cambio o, si es a propósito,
+        actualizar QUERY_BUDGETS.
+        """
+        results = benchmarks.run(iterations=3)
+        self.assertEqual(set(results), set(benchmarks.QUERY_BUDGETS))
+        self.assertEqual(benchmarks.over_budget(results), [])
+    
+    def test_over_budget_is_reported(self):
+        """
+        PRUEBA: Un caso que se pasa de su presupuesto aparece en over_budget
+        """
+        with mock.patch.dict(benchmarks.QUERY_BUDGETS, {'detail': 0}):
+            results = benchmarks.run(iterations=2, cases=['detail'])
+        self.assertEqual(benchmarks.over_budget(results), [('detail', 2, 0)])
+
+
+class LoadTestCommandTest(SimpleTestCase):
+    """
+    PRUEBAS PARA EL COMANDO loadtest (sin correr la carga)
+    """
+    
+    def test_parse_mix(self):
+        """
+        PRUEBA: --mix se lee como pesos y rechaza tipos o pesos inválidos
+        """
+        self.assertEqual(loadtest.parse_mix('index=1, vote=2.5,live'), {'index': 1.0, 'vote': 2.5, 'live': 1.0})
+        for value in ('foo=1', 'vote=x', 'vote=-1', 'vote=0'):
+            with self.assertRaises(CommandError):
+                loadtest.parse_mix(value)
+    
+    def test_voters_use_distinct_ips(self):
+        """
+        PRUEBA: Cada voto de cada trabajador sale con una IP distinta
+        """
+        plan = {
+            'seed': 1, 'mix': {'vote': 1}, 'index': '/', 'processes': 1,
+            'paths': [{'vote': '/1/vote/', 'choices': [1, 2]}],
+        }
+        ips = set()
+        for number in range(3):
+            worker = loadtest.Worker(number, plan)
+            for _ in range(100):
+                kind, method, path, body, ip = worker.next_request()
+                self.assertEqual((kind, method, path), ('vote', 'POST', '/1/vote/'))
+                ips.add(ip)
+        self.assertEqual(len(ips), 300)
+
+
+@override_settings(POLLS_PROFILING={'ENABLED': True, 'SLOW_MS': None})
+class ProfilingMiddlewareTest(TestCase):
+    """
+    PRUEBAS PARA EL MIDDLEWARE DE PERFILADO (middleware.py)
+    """
+    
+    def setUp(self):
+        self.question = create_question('¿Perfilado?', days=-1)
+        self.question.choice_set.create(choice_text='Sí')
+    
+    def server_timing(self, response):
+        """Devuelve {métrica: (milisegundos, descripción)} de la cabecera Server-Timing."""
+        metrics = {}
+        for entry in response['Server-Timing'].split(','):
+            name, *params = entry.strip().split(';')
+            values = dict(param.split('=', 1) for param in params)
+            metrics[name] = (float(values['dur']), values.get('desc', '').strip('"'))
+        return metrics
+    
+    def test_server_timing_header(self):
+        """
+        PRUEBA: La respuesta trae el desglose total / SQL / plantillas / Python
+        """
+        response = Client().get(reverse('polls:results', args=(self.question.id,)))
+        metrics = self.server_timing(response)
+        self.assertEqual(set(metrics), {'total', 'sql', 'tpl', 'app'})
+        self.assertGreater(int(metrics['sql'][1].split()[0]), 0)
+        self.assertGreater(metrics['tpl'][0], 0)
+        self.assertLessEqual(metrics['sql'][0] + metrics['tpl'][0], metrics['total'][0] + 0.2)
+    
+    def test_async_view_queries_are_counted(self):
+        """
+        PRUEBA: Las consultas de las vistas async (ORM en otro contexto) también se cuentan
+        """
+        with override_settings(ROOT_URLCONF=URLCONFS[True]):
+            response = Client().get(reverse('polls:detail', args=(self.question.id,)))
+        self.assertGreater(int(self.server_timing(response)['sql'][1].split()[0]), 0)
+    
+    def test_disabled_or_not_sampled(self):
+        """
+        PRUEBA: Desactivado o fuera de la muestra, no hay cabecera
+        """
+        url = reverse('polls:index')
+        with override_settings(POLLS_PROFILING={'ENABLED': False}):
+            self.assertNotIn('Server-Timing', Client().get(url))
+        with override_settings(POLLS_PROFILING={'ENABLED': True, 'SAMPLE_RATE': 0}):
+            self.assertNotIn('Server-Timing', Client().get(url))
+    
+    def test_slow_requests_are_logged(self):
+        """
+        PRUEBA: Las peticiones que superan SLOW_MS se registran con su consulta más lenta
+        """
+        with override_settings(POLLS_PROFILING={'ENABLED': True, 'SLOW_MS': 0, 'SERVER_TIMING': False}):
+            with self.assertLogs('polls.middleware', 'WARNING') as logs:
+                response = Client().get(reverse('polls:results', args=(self.question.id,)))
+        self.assertNotIn('Server-Timing', response)
+        self.assertIn('Petición lenta: GET', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+
+def increment_vote_metric_in_child():
+    """Suma un voto a las métricas desde otro proceso (para MetricsTest)."""
+    metrics.inc('polls_votes_total', 2, result='accepted')
+
+
+class MetricsTest(TestCase):
+    """
+    PRUEBAS PARA LAS MÉTRICAS DE PROMETHEUS (metrics.py y /metrics)
+    """
+    
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = self.settings(POLLS_METRICS={'ENABLED': True, 'DIRECTORY': directory})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.question = create_question('¿Métricas?', days=-1)
+        self.choice = self.question.choice_set.create(choice_text='Sí')
+    
+    def scrape(self):
+        """Lee /metrics y devuelve {línea sin valor: valor}."""
+        response = Client().get(reverse('polls:metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if line and not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+    
+    def test_votes_latency_and_queries(self):
+        """
+        PRUEBA: /metrics cuenta votos aceptados y duplicados, latencia y consultas por vista
+        """
+        client = Client()
+        url = reverse('polls:vote', args=(self.question.id,))
+        client.post(url, {'choice': self.choice.id})
+        client.post(url, {'choice': self.choice.id})
+        client.get(reverse('polls:live_results_api', args=(self.question.id,)))
+        client.get(reverse('polls:live_results_api', args=(self.question.id,)))
+        
+        samples = self.scrape()
+        self.assertEqual(samples['polls_votes_total{result="accepted"}'], 1)
+        self.assertEqual(samples['polls_votes_total{result="duplicate"}'], 1)
+        self.assertEqual(samples['polls_view_latency_seconds_count{view="vote"}'], 2)
+        self.assertEqual(samples['polls_view_latency_seconds_bucket{view="vote",le="+Inf"}'], 2)
+        self.assertGreater(samples['polls_db_queries_total{view="vote"}'], 0)
+        self.assertGreaterEqual(samples['polls_results_cache_total{result="hit"}'], 1)
+        
+        # Las cubetas son acumulativas
+        buckets = [value for name, value in samples.items() if name.startswith('polls_view_latency_seconds_bucket{view="vote"')]
+        self.assertEqual(buckets, sorted(buckets))
+    
+    def test_aggregates_across_processes(self):
+        """
+        PRUEBA: Las métricas de otro proceso se suman a las de este
+        """
+        metrics.inc('polls_votes_total', result='accepted')
+        child = multiprocessing.get_context('fork').Process(target=increment_vote_metric_in_child)
+        child.start()
+        child.join()
+        self.assertEqual(child.exitcode, 0)
+        self.assertEqual(len(os.listdir(metrics.get_config()['DIRECTORY'])), 2)
+        self.assertEqual(self.scrape()['polls_votes_total{result="accepted"}'], 3)
+    
+    def test_store_grows(self):
+        """
+        PRUEBA: El archivo crece cuando se llena y se sigue leyendo bien
+        """
+        for number in range(3000):
+            metrics.inc('polls_db_queries_total', number, view=f'vista_{number}')
+        values = metrics.collect()
+        self.assertEqual(values[('polls_db_queries_total', '', (('view', 'vista_2999'),))], 2999)
+    
+    def test_reused_pid_keeps_counters(self):
+        """
+        PRUEBA: Reabrir el archivo de un PID reciclado no borra sus contadores
+        """
+        path = os.path.join(metrics.get_config()['DIRECTORY'], 'metrics_reciclado.db')
+        first = metrics.MetricsFile(path)
+        first.inc('votos', 2)
+        first.close()
+        
+        second = metrics.MetricsFile(path)
+        second.inc('votos', 1)
+        second.inc('otra', 5)
+        second.close()
+        self.assertEqual(metrics.read_file(path), {'votos': 3, 'otra': 5})
+        
+        # Un archivo con la cabecera dañada se vuelve a empezar
+        with open(path, 'r+b') as file:
+            file.write(b'XXXX')
+        third = metrics.MetricsFile(path)
+        third.inc('votos', 1)
+        third.close()
+        self.assertEqual(metrics.read_file(path), {'votos': 1})
+    
+    def test_disabled_or_forbidden(self):
+        """
+        PRUEBA: /metrics da 404 desactivado y 403 desde una IP no permitida
+        """
+        url = reverse('polls:metrics')
+        with override_settings(POLLS_METRICS={'ENABLED': False}):
+            self.assertEqual(Client().get(url).status_code, 404)
+        config = {**metrics.get_config(), 'ALLOWED_IPS': ['10.0.0.1']}
+        with override_settings(POLLS_METRICS=config):
+            self.assertEqual(Client().get(url).status_code, 403)
+
+class SlowQueryTest(TestCase):
+    """
+    PRUEBAS PARA EL REGISTRO DE CONSULTAS LENTAS (slow_queries.py)
+    """
+    
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.log_file = os.path.join(directory, 'slow_queries.log')
+        # Umbral 0: todas las consultas cuentan como lentas
+        self.question = create_question('¿Lenta?', days=-1)
+        self.question.choice_set.create(choice_text='Sí')
+        settings_override = self.settings(POLLS_SLOW_QUERIES={
+            'ENABLED': True, 'THRESHOLD_MS': 0, 'LOG_FILE': self.log_file,
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(self.close_log)
+        slow_queries._explained.clear()
+        slow_queries.install()
+    
+    def close_log(self):
+        for handler in slow_queries.logger.handlers[:]:
+            slow_queries.logger.removeHandler(handler)
+            handler.close()
+    
+    def test_request_queries_are_logged_with_origin_and_plan(self):
+        """
+        PRUEBA: Las consultas de una vista quedan en el log con su vista, pila y plan (una vez por huella)
+        """
+        url = reverse('polls:results', args=(self.question.id,))
+        Client().get(url)
+        Client().get(url)
+        
+        entries = [entry for entry in slow_queries.read_log() if entry['view'] == 'polls:results']
+        self.assertTrue(entries)
+        entry = entries[0]
+        self.assertEqual(entry['path'], url)
+        self.assertEqual(entry['fingerprint'], slow_queries.fingerprint(entry['sql']))
+        self.assertIsNotNone(entry['params'])
+        self.assertTrue(any(frame.startswith('polls' + os.sep) for frame in entry['stack']))
+        self.assertTrue(entry['plan'])
+        
+        # El plan se captura solo la primera vez que aparece cada huella
+        planned = [e['fingerprint'] for e in slow_queries.read_log() if e['plan']]
+        self.assertEqual(len(planned), len(set(planned)))
+        
+        groups = {group['fingerprint']: group for group in slow_queries.aggregate(entries)}
+        self.assertEqual(groups[entry['fingerprint']]['count'], 2)
+        self.assertEqual(groups[entry['fingerprint']]['views'], {'polls:results': 2})
+    
+    def test_threshold_and_disabled(self):
+        """
+        PRUEBA: No se registra nada por debajo del umbral ni con el registro desactivado
+        """
+        with self.settings(POLLS_SLOW_QUERIES={'ENABLED': True, 'THRESHOLD_MS': 60000, 'LOG_FILE': self.log_file}):
+            Question.objects.count()
+        with self.settings(POLLS_SLOW_QUERIES={'ENABLED': False, 'THRESHOLD_MS': 0, 'LOG_FILE': self.log_file}):
+            Question.objects.count()
+        self.assertEqual(list(slow_queries.read_log()), [])
+        
+        Question.objects.count()
+        [entry] = slow_queries.read_log()
+        self.assertIsNone(entry['view'])
+        self.assertIn('test_threshold_and_disabled', entry['stack'][-1])
+    
+    def test_normalize_groups_variants(self):
+        """
+        PRUEBA: La huella ignora los valores concretos y el largo de las listas de IN
+        """
+        self.assertEqual(
+            slow_queries.fingerprint("SELECT * FROM t WHERE id = 5 AND name = 'a''b'"),
+            slow_queries.fingerprint('SELECT *  FROM t WHERE id = 17 AND name = %s'),
+        )
+        self.assertEqual(
+            slow_queries.normalize('SELECT * FROM t WHERE id IN (1, 2, 3)'),
+            slow_queries.normalize('SELECT * FROM t WHERE id IN (%s)'),
+        )
+        self.assertNotEqual(
+            slow_queries.fingerprint('SELECT * FROM t WHERE id = 1'),
+            slow_queries.fingerprint('SELECT * FROM u WHERE id = 1'),
+        )
+    
+    def test_command_report(self):
+        """
+        PRUEBA: El comando slow_queries muestra las huellas con su vista, SQL y plan
+        """
+        Client().get(reverse('polls:results', args=(self.question.id,)))
+        self.close_log()
+        
+        out = StringIO()
+        call_command('slow_queries', '--top', '3', '--sort', 'count', '--clear', stdout=out)
+        output = out.getvalue()
+        self.assertIn('consultas lentas en', output)
+        self.assertIn('polls:results', output)
+        self.assertIn('Plan:', output)
+        self.assertIn('borrado', output)
+        self.assertFalse(os.path.exists(self.log_file))
+        
+        out = StringIO()
+        call_command('slow_queries', stdout=out)
+        self.assertIn('No hay consultas lentas', out.getvalue())
+
+
+class DuplicateVoteMigrationTest(TransactionTestCase):
+    """
+    PRUEBAS PARA LA MIGRACIÓN 0006 (un voto por pregunta)
+    
+    Se vuelve la base de datos a la migración 0005, donde un votante podía
+    votar por dos opciones de la misma pregunta, y se aplica la 0006.
+    """
+    
+    before = [('polls', '0005_vote_question')]
+    after = [('polls', '0006_vote_question_constraints')]
+    
+    def tearDown(self):
+        # Dejar la base de datos con todas las migraciones para las demás pruebas
+        call_command('migrate', 'polls', verbosity=0)
+    
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+    
+    def test_duplicate_votes_are_removed(self):
+        """
+        PRUEBA: Los votos repetidos se borran (queda el primero) y los contadores se recalculan
+        """
+        apps = self.migrate(self.before)
+        OldQuestion = apps.get_model('polls', 'Question')
+        OldChoice = apps.get_model('polls', 'Choice')
+        OldVote = apps.get_model('polls', 'Vote')
+        OldUser = apps.get_model('auth', 'User')
+        
+        question = OldQuestion.objects.create(question_text="¿Repetida?", pub_date=timezone.now(), votes=4)
+        choice_a = OldChoice.objects.create(question=question, choice_text="A", votes=2)
+        choice_b = OldChoice.objects.create(question=question, choice_text="B", votes=2)
+        user = OldUser.objects.create(username="repetido")
+        first = OldVote.objects.create(question=question, choice=choice_a, voter_ip="10.0.0.1")
+        OldVote.objects.create(question=question, choice=choice_b, voter_ip="10.0.0.1")
+        by_user = OldVote.objects.create(question=question, choice=choice_a, user=user, voter_ip="10.0.0.2")
+        OldVote.objects.create(question=question, choice=choice_b, user=user, voter_ip="10.0.0.3")
+        
+        apps = self.migrate(self.after)
+        NewQuestion = apps.get_model('polls', 'Question')
+        NewChoice = apps.get_model('polls', 'Choice')
+        NewVote = apps.get_model('polls', 'Vote')
+        
+        self.assertEqual(
+            sorted(NewVote.objects.values_list('id', flat=True)),
+            [first.id, by_user.id],
+        )
+        self.assertEqual(NewChoice.objects.get(pk=choice_a.pk).votes, 2)
+        self.assertEqual(NewChoice.objects.get(pk=choice_b.pk).votes, 0)
+        self.assertEqual(NewQuestion.objects.get(pk=question.pk).votes, 2)
 
 
 # FUNCIONES AUXILIARES PARA LAS PRUEBAS
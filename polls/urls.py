@@ -5,40 +5,80 @@ Este archivo define todas las URLs (rutas) de la aplicación de encuestas
 y las conecta con sus respectivas vistas.
 """
 
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 # Namespace de la aplicación para evitar conflictos con otras aplicaciones
 app_name = 'polls'
 
-urlpatterns = [
-    # URL principal: /
-    # Muestra la lista de todas las encuestas disponibles
-    path('', views.index, name='index'),
-    
-    # URL alternativa usando vista basada en clase: /list/
-    # Misma funcionalidad que index pero usando Class-Based View
-    path('list/', views.QuestionListView.as_view(), name='question_list'),
-    
-    # URL para ver detalles de una encuesta específica: /5/
-    # Donde 5 es el ID de la pregunta
-    path('<int:question_id>/', views.detail, name='detail'),
-    
-    # URL para procesar votos: /5/vote/
-    # Procesa el voto enviado desde el formulario de la encuesta
-    path('<int:question_id>/vote/', views.vote, name='vote'),
-    
-    # URL para ver resultados de una encuesta: /5/results/
-    # Muestra los resultados con gráficos y estadísticas
-    path('<int:question_id>/results/', views.results, name='results'),
+
+def get_urlpatterns(use_async):
+    """
+    Devuelve las URLs de la aplicación.
     
-    # API endpoint para obtener resultados en tiempo real: /5/live-results/
-    # Devuelve datos JSON para actualizar resultados sin recargar la página
-    path('<int:question_id>/live-results/', views.live_results_api, name='live_results_api'),
+    detail, vote y live-results existen en views.py y en async_views.py con
+    el mismo nombre: con use_async=True se usan las async. urlpatterns
+    (más abajo) elige según POLLS_ASYNC_VIEWS; encuestas_project/urls_sync.py
+    y urls_async.py fijan una u otra (pruebas y bench_async_views las eligen
+    con override_settings(ROOT_URLCONF=...)).
+    """
+    hot_views = async_views if use_async else views
     
-    # Página de información sobre la aplicación: /about/
-    path('about/', views.about, name='about'),
-]
+    return [
+        # URL principal: /
+        # Muestra la lista de todas las encuestas disponibles
+        path('', views.index, name='index'),
+        
+        # URL alternativa usando vista basada en clase: /list/
+        # Misma funcionalidad que index pero usando Class-Based View
+        path('list/', views.QuestionListView.as_view(), name='question_list'),
+        
+        # URL para ver detalles de una encuesta específica: /5/
+        # Donde 5 es el ID de la pregunta
+        # (detail, vote y live-results usan la vista síncrona o la async según POLLS_ASYNC_VIEWS)
+        path('<int:question_id>/', hot_views.detail, name='detail'),
+        
+        # URL para procesar votos: /5/vote/
+        # Procesa el voto enviado desde el formulario de la encuesta
+        path('<int:question_id>/vote/', hot_views.vote, name='vote'),
+        
+        # URL para ver resultados de una encuesta: /5/results/
+        # Muestra los resultados con gráficos y estadísticas
+        path('<int:question_id>/results/', views.results, name='results'),
+        
+        # API endpoint para obtener resultados en tiempo real: /5/live-results/
+        # Devuelve datos JSON para actualizar resultados sin recargar la página
+        # Con ?since=<versión> la versión async espera (long polling) hasta que los resultados cambien
+        path('<int:question_id>/live-results/', hot_views.live_results_api, name='live_results_api'),
+        
+        # API de resultados en tiempo real de varias preguntas: /live-results/?ids=1,2,3
+        # Para tableros que muestran muchas encuestas a la vez (una sola petición)
+        path('live-results/', views.live_results_batch_api, name='live_results_batch_api'),
+        
+        # Stream de resultados en tiempo real (Server-Sent Events): /5/live-results/stream/
+        # Envía un evento cada vez que cambian los resultados (necesita el servidor ASGI)
+        path('<int:question_id>/live-results/stream/', async_views.live_results_stream, name='live_results_stream'),
+        
+        # API de evolución de los votos: /5/timeline/?bucket=hour&from=...&to=...
+        # Votos por opción e intervalo, leídos de los rollups (gráfico de líneas de results.html)
+        path('<int:question_id>/timeline/', views.timeline_api, name='timeline_api'),
+        
+        # Exportación de votos (solo personal del admin): /5/export.csv y /5/export.ndjson
+        # Con ?totals=1 exporta los totales por opción en lugar de cada voto
+        path('<int:question_id>/export.csv', views.export_votes, {'fmt': 'csv'}, name='export_csv'),
+        path('<int:question_id>/export.ndjson', views.export_votes, {'fmt': 'ndjson'}, name='export_ndjson'),
+        
+        # Métricas para Prometheus: /metrics (con POLLS_METRICS activado)
+        # Latencia por vista, votos, aciertos de la caché y consultas de todos los procesos
+        path('metrics', views.metrics_view, name='metrics'),
+        
+        # Página de información sobre la aplicación: /about/
+        path('about/', views.about, name='about'),
+    ]
+
+
+urlpatterns = get_urlpatterns(settings.POLLS_ASYNC_VIEWS)
 
 """
 Explicación de los patrones de URL:
@@ -68,5 +108,6 @@ Flujo típico de uso:
 1. Usuario visita / → ve lista de encuestas (index)
 2. Usuario hace clic en una encuesta → va a /5/ (detail)
 3. Usuario vota → POST a /5/vote/ (vote) → redirige a /5/results/ (results)
-4. JavaScript llama a /5/live-results/ cada pocos segundos para actualizar datos
+4. JavaScript abre /5/live-results/stream/ (EventSource) para recibir los cambios;
+   si no puede, llama a /5/live-results/ cada pocos segundos para actualizar datos
 """
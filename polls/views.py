@@ -6,39 +6,126 @@ Cada vista representa una página o funcionalidad específica de la aplicación.
 """
 
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse, JsonResponse, HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, HttpResponseRedirect, HttpResponseNotModified
 from django.urls import reverse
 from django.views import generic
 from django.utils import timezone
 from django.contrib import messages
-from django.db.models import Count, F
-from django.core.paginator import Paginator
-from django.views.decorators.http import require_POST
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.core.serializers.json import DjangoJSONEncoder
+from django.views.decorators.http import require_GET, require_POST, require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from django.contrib.admin.views.decorators import staff_member_required
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import parse_etags
+import datetime
 import json
 
 from .models import Question, Choice, Vote
+from .results import annotate_results, tally, tally_question
+from . import export, live, metrics, pagination, results_cache, rollups, vote_archive, vote_writer
+from .voter_filter import voter_filters
+from .voter_identity import valid_ip, voter_key
 
 
 def get_client_ip(request):
     """
     Obtiene la dirección IP del cliente que hace la petición.
     
+    Solo devuelve IPs válidas: si X-Forwarded-For trae otra cosa (por
+    ejemplo "unknown"), se usa REMOTE_ADDR.
+    
     Args:
         request: Objeto HttpRequest de Django
         
     Returns:
-        str: Dirección IP del cliente
+        str | None: Dirección IP del cliente, o None si no hay una válida
     """
     # Primero verifica si viene a través de un proxy
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
     if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        # IP directa
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
+        ip = valid_ip(x_forwarded_for.split(',')[0])
+        if ip:
+            return ip
+    # IP directa
+    return valid_ip(request.META.get('REMOTE_ADDR'))
+
+
+def find_voter_vote(question, client_ip, user=None):
+    """
+    Busca el voto de un votante en una pregunta, con una sola consulta.
+    
+    Sigue la regla de la vista vote: cuenta el voto de la misma IP (con o
+    sin usuario) y, si el usuario está autenticado, también el de su cuenta.
+    La IP se compara por su clave binaria (ver voter_identity.py). Usa las
+    restricciones únicas (question, voter_key) y (question, user) como
+    índices, sin JOIN con Choice.
+    
+    Args:
+        question: Pregunta (o su ID)
+        client_ip (str): IP del votante, o None si no se conoce
+        user: Usuario autenticado, o None
+        
+    Returns:
+        QuerySet: Los votos encontrados (a lo sumo uno por restricción), con su opción
+    """
+    condition = Q()
+    if client_ip:
+        condition |= Q(voter_key=voter_key(client_ip))
+    if user is not None:
+        condition |= Q(user=user)
+    if not condition:
+        return Vote.objects.none()
+    return Vote.objects.filter(condition, question=question).select_related('choice')
+
+
+def get_voter_vote(question, client_ip, user=None):
+    """
+    Devuelve el voto de un votante en una pregunta, o None si no votó.
+    
+    Primero pregunta al filtro en memoria (ver voter_filter.py): si responde
+    que seguro no votó, no se consulta la base de datos.
+    """
+    if not voter_filters.might_have_voted(question.id, client_ip, user.pk if user else None):
+        return None
+    return find_voter_vote(question, client_ip, user).first()
+
+
+def add_card_cache_keys(questions):
+    """
+    Agrega `results_version` a cada pregunta para el caché de fragmentos de index.html.
+    
+    Cada tarjeta se guarda en caché con la versión de los resultados de su
+    pregunta (ver results_cache.py), así cambia sola cuando alguien vota o se
+    edita la pregunta. Todas las versiones salen de una sola lectura de caché.
+    
+    Args:
+        questions: Iterable de objetos Question (por ejemplo, una página)
+        
+    Returns:
+        dict: Variables de contexto para la etiqueta {% cache %} de la plantilla
+    """
+    questions = list(questions)
+    versions = results_cache.get_versions(question.id for question in questions)
+    for question in questions:
+        question.results_version = versions[question.id]
+    config = results_cache.get_config()
+    return {
+        'card_cache_timeout': config['TIMEOUT'],
+        'card_cache_alias': config['ALIAS'],
+    }
+
+
+def published_questions():
+    """
+    Preguntas activas y ya publicadas (las que aparecen en la lista principal).
+    """
+    return Question.objects.filter(
+        is_active=True,
+        pub_date__lte=timezone.now()  # Solo encuestas ya publicadas
+    )
 
 
 def index(request):
@@ -48,7 +135,7 @@ def index(request):
     Esta vista:
     1. Obtiene todas las encuestas activas
     2. Las ordena por fecha de publicación (más recientes primero)
-    3. Implementa paginación para manejar muchas encuestas
+    3. Implementa paginación por cursor para manejar muchas encuestas
     4. Renderiza la plantilla con la lista de encuestas
     
     Args:
@@ -58,29 +145,22 @@ def index(request):
         HttpResponse: Página HTML con la lista de encuestas
     """
     
-    # Obtener todas las preguntas activas, ordenadas por fecha de publicación
+    # Obtener todas las preguntas activas
     # select_related('created_by') optimiza las consultas a la base de datos
-    # prefetch_related('choice_set') precarga las opciones relacionadas
-    question_list = Question.objects.filter(
-        is_active=True,
-        pub_date__lte=timezone.now()  # Solo encuestas ya publicadas
-    ).select_related('created_by').prefetch_related('choice_set').order_by('-pub_date')
+    # annotate_results agrega total_votes_count y choices_count en la misma consulta
+    question_list = annotate_results(published_questions().select_related('created_by'))
     
-    # Implementar paginación (5 encuestas por página)
-    paginator = Paginator(question_list, 5)
-    page_number = request.GET.get('page')
-    questions = paginator.get_page(page_number)
-    
-    # Agregar información adicional a cada pregunta
-    for question in questions:
-        question.total_votes_count = question.total_votes()
-        question.choices_count = question.choice_set.count()
+    # Paginación por cursor (5 encuestas por página, ordenadas por fecha y id):
+    # cada página sigue desde la última fila de la anterior, sin OFFSET
+    questions = pagination.paginate(question_list, request.GET.get('cursor'))
     
     # Contexto que se pasa a la plantilla
     context = {
         'questions': questions,
         'title': 'Encuestas Disponibles',
-        'total_questions': question_list.count(),
+        # Total guardado en caché unos segundos (no un COUNT por petición)
+        'total_questions': pagination.cached_count(published_questions()),
+        **add_card_cache_keys(questions),
     }
     
     return render(request, 'polls/index.html', context)
@@ -112,22 +192,14 @@ def detail(request, question_id):
     )
     
     # Verificar si el usuario ya votó en esta encuesta
+    # (por IP o por cuenta, con una sola consulta)
     user_has_voted = False
     user_vote_choice = None
-    client_ip = get_client_ip(request)
-    
-    # Verificar si ya existe un voto desde esta IP (independientemente del usuario)
-    existing_vote = Vote.objects.filter(
-        choice__question=question,
-        voter_ip=client_ip
-    ).first()
-    
-    # Si es usuario autenticado, también verificar por usuario
-    if request.user.is_authenticated and not existing_vote:
-        existing_vote = Vote.objects.filter(
-            choice__question=question,
-            user=request.user
-        ).first()
+    existing_vote = get_voter_vote(
+        question,
+        get_client_ip(request),
+        request.user if request.user.is_authenticated else None,
+    )
     
     if existing_vote:
         user_has_voted = True
@@ -151,8 +223,8 @@ def vote(request, question_id):
     
     Esta vista:
     1. Valida que se haya seleccionado una opción
-    2. Verifica que el usuario no haya votado antes
-    3. Registra el voto en la base de datos
+    2. Registra el voto en la base de datos
+    3. Si la base de datos lo rechaza por duplicado, avisa que ya votó
     4. Redirige a la página de resultados
     
     Args:
@@ -178,37 +250,49 @@ def vote(request, question_id):
             'error_message': "No seleccionaste una opción.",
         })
     
-    # Verificar si el usuario ya votó
     client_ip = get_client_ip(request)
-    
-    # Verificar si ya existe un voto desde esta IP (independientemente del usuario)
-    existing_vote = Vote.objects.filter(
-        choice__question=question,
-        voter_ip=client_ip
-    ).first()
-    
-    # Si es usuario autenticado, también verificar por usuario
-    if request.user.is_authenticated and not existing_vote:
-        existing_vote = Vote.objects.filter(
-            choice__question=question,
-            user=request.user
-        ).first()
-    
-    if existing_vote:
-        # Si ya votó, mostrar mensaje y redirigir a resultados
-        messages.warning(request, 'Ya has votado en esta encuesta.')
-        return HttpResponseRedirect(reverse('polls:results', args=(question.id,)))
+    if client_ip is None:
+        # Sin IP no se puede impedir que vote dos veces
+        return render(request, 'polls/detail_simple.html', {
+            'question': question,
+            'error_message': "No pudimos identificar tu conexión para registrar el voto.",
+        }, status=400)
     
     # Crear el nuevo voto
+    # No se consulta antes si ya votó: las restricciones únicas de Vote
+    # (una por IP y otra por usuario en cada pregunta) rechazan el INSERT
+    # duplicado, sin carreras entre dos peticiones al mismo tiempo.
+    # El INSERT y los incrementos F() de Choice.votes / Question.votes
+    # van en la misma transacción (ver Vote.save)
+    # Con POLLS_VOTE_WRITER activado, el voto se guarda en el próximo lote
+    # del escritor (ver vote_writer.py) y esperamos su resultado
     try:
         new_vote = Vote(
             choice=selected_choice,
             voter_ip=client_ip,
             user=request.user if request.user.is_authenticated else None
         )
-        new_vote.save()
+        if vote_writer.is_enabled():
+            try:
+                vote_writer.get_vote_writer().submit(new_vote).result(
+                    timeout=vote_writer.get_config()['TIMEOUT']
+                )
+            except vote_writer.DuplicateVote:
+                metrics.inc('polls_votes_total', result='duplicate')
+                messages.warning(request, 'Ya has votado en esta encuesta.')
+                return HttpResponseRedirect(reverse('polls:results', args=(question.id,)))
+        else:
+            try:
+                with transaction.atomic():
+                    new_vote.save()
+            except IntegrityError:
+                # Ya existía un voto de esta IP o de este usuario en la pregunta
+                metrics.inc('polls_votes_total', result='duplicate')
+                messages.warning(request, 'Ya has votado en esta encuesta.')
+                return HttpResponseRedirect(reverse('polls:results', args=(question.id,)))
         
         # Mensaje de éxito
+        metrics.inc('polls_votes_total', result='accepted')
         messages.success(request, f'¡Gracias por votar! Tu voto por "{selected_choice.choice_text}" ha sido registrado.')
         
         # Redirigir a la página de resultados
@@ -216,6 +300,7 @@ def vote(request, question_id):
         
     except Exception as e:
         # Si hay algún error al guardar el voto
+        metrics.inc('polls_votes_total', result='error')
         messages.error(request, 'Hubo un error al procesar tu voto. Por favor inténtalo de nuevo.')
         return render(request, 'polls/detail.html', {
             'question': question,
@@ -240,46 +325,49 @@ def results(request, question_id):
         HttpResponse: Página HTML con los resultados
     """
     
-    # Obtener la pregunta con todas sus opciones y votos
-    question = get_object_or_404(
-        Question.objects.prefetch_related('choice_set__vote_set'),
-        pk=question_id
-    )
+    # Obtener la pregunta
+    question = get_object_or_404(Question, pk=question_id)
     
-    # Calcular estadísticas para cada opción
-    choices_with_stats = []
-    total_votes = question.total_votes()
+    # Calcular estadísticas para cada opción (una sola consulta)
+    question_results = tally_question(question.id)
+    total_votes = question_results.total_votes
     
-    for choice in question.choice_set.all():
-        vote_count = choice.vote_count()
-        percentage = (vote_count / total_votes * 100) if total_votes > 0 else 0
-        
-        choices_with_stats.append({
+    choices_with_stats = [
+        {
             'choice': choice,
-            'votes': vote_count,
-            'percentage': round(percentage, 1),
-        })
-    
-    # Verificar si el usuario actual votó
+            'votes': choice.votes,
+            'percentage': round(choice.percentage, 1),
+        }
+        for choice in question_results.choices
+    ]
+    
+    # Encuesta archivada: las fechas del primer y último voto salen del
+    # archivo por columnas (ver vote_archive.py), las filas ya no existen
+    archive_range = None
+    if question.archived_at:
+        archive = vote_archive.open_archive(question.id)
+        if archive is not None:
+            with archive:
+                archive_range = archive.date_range()
+    
+    # Verificar si el usuario actual votó (una consulta por índice, que se
+    # evita si el filtro en memoria sabe que no votó)
     user_vote = None
-    if request.user.is_authenticated:
-        try:
-            user_vote = Vote.objects.get(
-                choice__question=question,
-                user=request.user
-            ).choice
-        except Vote.DoesNotExist:
-            pass
-    else:
-        client_ip = get_client_ip(request)
-        try:
-            user_vote = Vote.objects.get(
-                choice__question=question,
-                voter_ip=client_ip,
+    client_ip = get_client_ip(request)
+    user = request.user if request.user.is_authenticated else None
+    voter_known = user is not None or client_ip is not None
+    if voter_known and voter_filters.might_have_voted(question.id, client_ip, user.pk if user else None):
+        if user is not None:
+            existing_vote = Vote.objects.filter(question=question, user=user)
+        else:
+            existing_vote = Vote.objects.filter(
+                question=question,
+                voter_key=voter_key(client_ip),
                 user__isnull=True
-            ).choice
-        except Vote.DoesNotExist:
-            pass
+            )
+        existing_vote = existing_vote.select_related('choice').first()
+        if existing_vote:
+            user_vote = existing_vote.choice
     
     # Contexto para la plantilla
     context = {
@@ -287,9 +375,75 @@ def results(request, question_id):
         'choices_with_stats': choices_with_stats,
         'total_votes': total_votes,
         'user_vote': user_vote,
+        'archive_range': archive_range,
     }
     
-    return render(request, 'polls/results_simple.html', context)
+    return render(request, 'polls/results.html', context)
+
+
+def results_etag(question_id, version):
+    """
+    ETag fuerte para los resultados de una pregunta en una versión dada.
+    """
+    return f'"q{question_id}-v{version}"'
+
+
+def etag_matches(request, etag):
+    """
+    Indica si el ETag coincide con alguno de los que manda el cliente en If-None-Match.
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    client_etags = parse_etags(if_none_match)
+    return '*' in client_etags or etag in client_etags
+
+
+def parse_since(request):
+    """
+    Lee el parámetro `?since=<versión>` de la petición.
+    
+    Returns:
+        int | None: La versión que ya tiene el cliente, o None si no la mandó
+    """
+    since = request.GET.get('since', '')
+    return int(since) if since.isdigit() else None
+
+
+def no_change_response(question_id, version):
+    """
+    Respuesta vacía de "sin cambios" (204) con la versión actual en las cabeceras.
+    """
+    response = HttpResponse(status=204)
+    response['ETag'] = results_etag(question_id, version)
+    response['X-Results-Version'] = str(version)
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def build_live_results_payload(question, version):
+    """
+    Calcula los resultados de una pregunta y los serializa a JSON.
+    
+    Args:
+        question (Question): La pregunta
+        version (int): Versión de los resultados (ver results_cache.py)
+        
+    Returns:
+        bytes: Resultados en formato JSON
+    """
+    # Obtener resultados actualizados (una sola consulta)
+    question_results = tally_question(question.id)
+    
+    response_data = {
+        'success': True,
+        'version': version,
+        'total_votes': question_results.total_votes,
+        'results': question_results.as_dict(),
+        'question_text': question.question_text,
+        'timestamp': timezone.now().isoformat(),
+    }
+    return json.dumps(response_data, cls=DjangoJSONEncoder).encode()
 
 
 def live_results_api(request, question_id):
@@ -299,31 +453,47 @@ def live_results_api(request, question_id):
     Esta vista es llamada por JavaScript para actualizar los resultados
     sin recargar la página completa.
     
+    La respuesta lleva un ETag con la versión de los resultados. Si el
+    navegador manda ese mismo ETag en If-None-Match, se responde 304 sin
+    cuerpo y sin tocar la base de datos.
+    
+    Esta versión síncrona no mantiene peticiones abiertas: con `?since=<versión>`
+    igual a la actual responde enseguida "sin cambios" (204). La espera larga
+    (long polling) la hace la versión async (ver async_views.py).
+    
     Args:
         request: Objeto HttpRequest de Django
         question_id: ID de la pregunta
         
     Returns:
-        JsonResponse: Resultados en formato JSON
+        HttpResponse: Resultados en formato JSON (o 304 / 204 si no cambiaron)
     """
     
     try:
-        question = get_object_or_404(Question, pk=question_id)
+        # Los resultados se guardan ya serializados por (pregunta, versión);
+        # la versión sube cada vez que se confirma un voto
+        version = results_cache.get_version(question_id)
+        if parse_since(request) == version:
+            return no_change_response(question_id, version)
+        etag = results_etag(question_id, version)
         
-        # Obtener resultados actualizados
-        results = question.get_results()
-        total_votes = question.total_votes()
+        if etag_matches(request, etag):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
         
-        # Preparar la respuesta JSON
-        response_data = {
-            'success': True,
-            'total_votes': total_votes,
-            'results': results,
-            'question_text': question.question_text,
-            'timestamp': timezone.now().isoformat(),
-        }
+        payload = results_cache.get_payload(question_id, version)
+        
+        if payload is None:
+            question = get_object_or_404(Question, pk=question_id)
+            payload = build_live_results_payload(question, version)
+            results_cache.set_payload(question_id, version, payload)
         
-        return JsonResponse(response_data)
+        response = HttpResponse(payload, content_type='application/json')
+        response['ETag'] = etag
+        # El navegador siempre debe preguntar, pero puede reusar lo que tiene si recibe 304
+        response['Cache-Control'] = 'no-cache'
+        return response
         
     except Exception as e:
         return JsonResponse({
@@ -332,6 +502,238 @@ def live_results_api(request, question_id):
         }, status=500)
 
 
+def parse_batch_request(request):
+    """
+    Lee los IDs pedidos a live_results_batch_api y las versiones que ya tiene el cliente.
+    
+    Acepta:
+    - GET  /live-results/?ids=1,2,3&since=1:1700000000000001,2:1700000000000005
+    - POST /live-results/ con JSON {"ids": [1, 2, 3], "since": {"1": 1700000000000001}}
+    
+    Returns:
+        tuple: (lista de IDs sin repetir, {question_id: versión})
+        
+    Raises:
+        ValueError: Si los IDs o las versiones no son números
+    """
+    if request.method == 'POST':
+        data = json.loads(request.body or b'{}')
+        ids = [int(question_id) for question_id in data.get('ids', [])]
+        since = {int(question_id): int(version) for question_id, version in data.get('since', {}).items()}
+    else:
+        ids = [int(question_id) for question_id in request.GET.get('ids', '').split(',') if question_id]
+        since = {}
+        for item in request.GET.get('since', '').split(','):
+            if item:
+                question_id, version = item.split(':')
+                since[int(question_id)] = int(version)
+    return list(dict.fromkeys(ids)), since
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+def live_results_batch_api(request):
+    """
+    API que devuelve los resultados en tiempo real de muchas preguntas a la vez.
+    
+    Pensada para los tableros que muestran muchas encuestas: en lugar de una
+    petición por pregunta, se pide `/live-results/?ids=1,2,3` y se recibe
+    todo junto. Los votos de todas las preguntas salen de una sola consulta
+    agregada (ver results.tally).
+    
+    El cliente puede mandar la versión que ya tiene de cada pregunta
+    (`since`); las que no cambiaron solo aparecen en `unchanged`, sin datos.
+    La cantidad de IDs por petición está limitada por BATCH_MAX_IDS.
+    
+    Args:
+        request: Objeto HttpRequest de Django
+        
+    Returns:
+        JsonResponse: {'success', 'results': {id: {...}}, 'unchanged', 'missing'}
+    """
+    try:
+        question_ids, since = parse_batch_request(request)
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({
+            'success': False,
+            'error': 'Los IDs y las versiones deben ser números.'
+        }, status=400)
+    
+    max_ids = live.get_config()['BATCH_MAX_IDS']
+    if not question_ids:
+        return JsonResponse({'success': False, 'error': 'Falta el parámetro ids.'}, status=400)
+    if len(question_ids) > max_ids:
+        return JsonResponse({
+            'success': False,
+            'error': f'Se pueden pedir como máximo {max_ids} preguntas por petición.'
+        }, status=400)
+    
+    # Versiones de todas las preguntas con una sola lectura de caché
+    versions = results_cache.get_versions(question_ids)
+    changed_ids = [
+        question_id for question_id in question_ids
+        if since.get(question_id) != versions[question_id]
+    ]
+    unchanged = [question_id for question_id in question_ids if question_id not in changed_ids]
+    
+    results_data = {}
+    missing = []
+    if changed_ids:
+        question_texts = dict(
+            Question.objects.filter(pk__in=changed_ids).values_list('id', 'question_text')
+        )
+        results_by_question = tally(question_texts.keys())
+        for question_id in changed_ids:
+            if question_id not in question_texts:
+                missing.append(question_id)
+                continue
+            question_results = results_by_question[question_id]
+            results_data[str(question_id)] = {
+                'version': versions[question_id],
+                'total_votes': question_results.total_votes,
+                'results': question_results.as_dict(),
+                'question_text': question_texts[question_id],
+            }
+    
+    response = JsonResponse({
+        'success': True,
+        'results': results_data,
+        'unchanged': unchanged,
+        'missing': missing,
+        'timestamp': timezone.now().isoformat(),
+    })
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def parse_timeline_date(value):
+    """
+    Lee una fecha de ?from= / ?to= (ISO 8601, con o sin hora).
+    
+    Las fechas sin zona horaria se toman en la zona de settings.TIME_ZONE.
+    
+    Returns:
+        datetime | None: None si no se mandó
+        
+    Raises:
+        ValueError: Si no es una fecha válida
+    """
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        moment = datetime.datetime.combine(day, datetime.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+@require_GET
+def timeline_api(request, question_id):
+    """
+    API con la evolución de los votos de una pregunta: votos por opción e intervalo.
+    
+    /5/timeline/?bucket=hour&from=2024-01-01&to=2024-01-02
+    
+    - bucket: minute, hour o day (por defecto hour)
+    - from / to: rango en ISO 8601; por defecto el último rango típico del
+      bucket (una hora de minutos, dos días de horas, 30 días de días)
+    
+    Solo lee los rollups (ver rollups.py), nunca la tabla de votos, así que
+    el costo depende de la cantidad de intervalos y no de la de votos.
+    
+    Returns:
+        JsonResponse: {'success', 'bucket', 'from', 'to', 'labels', 'series'}
+    """
+    question = get_object_or_404(Question, pk=question_id)
+    config = rollups.get_config()
+    
+    granularity = request.GET.get('bucket', 'hour')
+    if granularity not in config['GRANULARITIES']:
+        return JsonResponse({
+            'success': False,
+            'error': f"bucket debe ser uno de: {', '.join(config['GRANULARITIES'])}."
+        }, status=400)
+    
+    try:
+        until = parse_timeline_date(request.GET.get('to')) or timezone.now()
+        since = parse_timeline_date(request.GET.get('from')) or until - rollups.DEFAULT_SPANS[granularity]
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Las fechas deben estar en formato ISO 8601.'}, status=400)
+    
+    if since >= until:
+        return JsonResponse({'success': False, 'error': 'from debe ser anterior a to.'}, status=400)
+    if (until - since) / rollups.STEPS[granularity] > config['MAX_BUCKETS']:
+        return JsonResponse({
+            'success': False,
+            'error': f"Se pueden pedir como máximo {config['MAX_BUCKETS']} intervalos por petición."
+        }, status=400)
+    
+    data = rollups.timeline(question, granularity, since, until)
+    return JsonResponse({
+        'success': True,
+        'question_id': question.id,
+        'bucket': granularity,
+        'from': since.isoformat(),
+        'to': until.isoformat(),
+        'labels': [label.isoformat() for label in data['labels']],
+        'series': data['series'],
+    })
+
+
+@staff_member_required
+@require_GET
+def export_votes(request, question_id, fmt):
+    """
+    Descarga los votos de una encuesta en CSV o NDJSON (solo personal del admin).
+    
+    /5/export.csv y /5/export.ndjson mandan un renglón por voto;
+    con ?totals=1 mandan un renglón por opción con su total.
+    La respuesta se envía por partes (ver export.py): no se cargan todos
+    los votos en memoria.
+    
+    Args:
+        request: Objeto HttpRequest de Django
+        question_id: ID de la pregunta
+        fmt: 'csv' o 'ndjson' (viene de la URL)
+        
+    Returns:
+        StreamingHttpResponse: El archivo
+    """
+    question = get_object_or_404(Question, pk=question_id)
+    kind = 'totals' if request.GET.get('totals') in ('1', 'true') else 'votes'
+    return export.stream_export([question], fmt, kind, filename=f'encuesta-{question.id}')
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Métricas en el formato de texto de Prometheus (para que las lea el monitoreo).
+    
+    Suma las métricas de todos los procesos del servidor (ver metrics.py).
+    Responde 404 si POLLS_METRICS no está activado y 403 si la IP no está
+    en ALLOWED_IPS. Se compara REMOTE_ADDR y no X-Forwarded-For, que lo
+    puede mandar cualquiera.
+    
+    Args:
+        request: Objeto HttpRequest de Django
+        
+    Returns:
+        HttpResponse: Las métricas en text/plain
+    """
+    config = metrics.get_config()
+    if not config['ENABLED']:
+        raise Http404('Las métricas no están activadas')
+    if config['ALLOWED_IPS'] is not None and request.META.get('REMOTE_ADDR') not in config['ALLOWED_IPS']:
+        return HttpResponseForbidden()
+    response = HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
 class QuestionListView(generic.ListView):
     """
     Vista basada en clase para mostrar la lista de preguntas.
@@ -343,29 +745,27 @@ class QuestionListView(generic.ListView):
     model = Question
     template_name = 'polls/index.html'
     context_object_name = 'questions'
-    paginate_by = 5
     
     def get_queryset(self):
         """
         Personaliza la consulta para obtener solo encuestas activas y publicadas.
         """
-        return Question.objects.filter(
-            is_active=True,
-            pub_date__lte=timezone.now()
-        ).select_related('created_by').prefetch_related('choice_set').order_by('-pub_date')
+        return annotate_results(published_questions().select_related('created_by'))
     
     def get_context_data(self, **kwargs):
         """
         Agrega contexto adicional a la plantilla.
+        
+        En lugar de paginate_by (Paginator con COUNT y OFFSET) se usa la
+        misma paginación por cursor que la vista index.
         """
         context = super().get_context_data(**kwargs)
+        context['questions'] = pagination.paginate(self.object_list, self.request.GET.get('cursor'))
         context['title'] = 'Encuestas Disponibles'
-        context['total_questions'] = self.get_queryset().count()
+        context['total_questions'] = pagination.cached_count(published_questions())
         
-        # Agregar estadísticas a cada pregunta
-        for question in context['questions']:
-            question.total_votes_count = question.total_votes()
-            question.choices_count = question.choice_set.count()
+        # Claves del caché de fragmentos de cada tarjeta
+        context.update(add_card_cache_keys(context['questions']))
         
         return context
 
@@ -0,0 +1,291 @@
+"""
+Archivo de los votos de encuestas cerradas en archivos por columnas.
+
+Las encuestas viejas conservan cada fila de Vote para siempre: la tabla
+crece y todos sus índices se vuelven más lentos también para las encuestas
+que siguen abiertas. El comando archive_votes pasa los votos de una
+encuesta cerrada a un archivo compacto, deja los totales finales en los
+contadores (Choice.votes / Question.votes) y borra las filas.
+
+Formato del archivo (<DIRECTORY>/question_<id>.votes, enteros little-endian):
+
+    cabecera     MAGIC, versión, nº de opciones, nº de votos, último id de Vote
+    opciones     nº de opciones × int64: ID de cada opción
+    fechas       nº de votos × int64: voted_at en microsegundos desde 1970 (UTC)
+    elecciones   nº de votos × uint16: posición de la opción votada en la tabla de opciones
+
+Los votos están ordenados por fecha, así un rango de fechas se busca con
+búsqueda binaria. El archivo se lee con mmap: el sistema operativo trae a
+memoria solo las páginas que se recorren, sin cargar el archivo entero.
+
+Configuración en settings.py:
+    POLLS_VOTE_ARCHIVE = {
+        'DIRECTORY': BASE_DIR / 'vote_archive',
+        'AFTER_DAYS': 90,       # Archivar encuestas publicadas hace más de N días
+        'BATCH_SIZE': 5000,     # Votos por consulta al escribir y por DELETE al borrar
+    }
+"""
+
+import bisect
+import datetime
+import mmap
+import os
+import struct
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+DEFAULTS = {
+    'DIRECTORY': None,
+    'AFTER_DAYS': 90,
+    'BATCH_SIZE': 5000,
+}
+
+MAGIC = b'PVA1'
+VERSION = 1
+# MAGIC, versión, nº de opciones, nº de votos, último id de Vote (24 bytes,
+# así las columnas de int64 quedan alineadas)
+HEADER = struct.Struct('<4sHHqq')
+CHOICE_ID = struct.Struct('<q')
+TIMESTAMP_SIZE = 8
+CHOICE_INDEX_SIZE = 2
+MAX_CHOICES = 65535
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def get_config():
+    """Devuelve la configuración del archivo de votos mezclada con los valores por defecto."""
+    config = {**DEFAULTS, **getattr(settings, 'POLLS_VOTE_ARCHIVE', {})}
+    if config['DIRECTORY'] is None:
+        config['DIRECTORY'] = settings.BASE_DIR / 'vote_archive'
+    return config
+
+
+def archive_path(question_id):
+    """Ruta del archivo de votos de una pregunta."""
+    return os.path.join(get_config()['DIRECTORY'], f'question_{question_id}.votes')
+
+
+def to_timestamp(moment):
+    """Fecha (aware) a microsegundos desde 1970 en UTC."""
+    return (moment - EPOCH) // MICROSECOND
+
+
+def from_timestamp(timestamp):
+    """Microsegundos desde 1970 a una fecha aware en UTC."""
+    return EPOCH + datetime.timedelta(microseconds=timestamp)
+
+
+class ArchivedVotes:
+    """
+    Votos archivados de una pregunta, leídos con mmap.
+
+    Las columnas (`timestamps`, `choice_indexes`) son memoryview sobre el
+    archivo: indexarlas o recorrerlas por tramos no copia el archivo a memoria.
+    Se usa como gestor de contexto para cerrar el archivo:
+
+        with open_archive(question.id) as archive:
+            por_opcion = archive.tally()
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, num_choices, count, last_vote_id = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f'{path} no es un archivo de votos válido')
+        self.count = count
+        self.last_vote_id = last_vote_id
+        self.choice_ids = [
+            CHOICE_ID.unpack_from(self._mmap, HEADER.size + i * CHOICE_ID.size)[0]
+            for i in range(num_choices)
+        ]
+        start = HEADER.size + num_choices * CHOICE_ID.size
+        middle = start + count * TIMESTAMP_SIZE
+        end = middle + count * CHOICE_INDEX_SIZE
+        self._view = memoryview(self._mmap)
+        self.timestamps = self._view[start:middle].cast('q')
+        self.choice_indexes = self._view[middle:end].cast('H')
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Suelta las columnas y cierra el mmap."""
+        for view in (self.timestamps, self.choice_indexes, self._view):
+            view.release()
+        self._mmap.close()
+
+    def span(self, since=None, until=None):
+        """
+        Posiciones [inicio, fin) de los votos con since <= voted_at < until.
+
+        Búsqueda binaria sobre la columna de fechas, que está ordenada.
+        """
+        start = 0 if since is None else bisect.bisect_left(self.timestamps, to_timestamp(since))
+        end = self.count if until is None else bisect.bisect_left(self.timestamps, to_timestamp(until))
+        return start, max(start, end)
+
+    def tally(self, since=None, until=None, chunk_size=1 << 20):
+        """
+        Cuenta los votos por opción, opcionalmente en un rango de fechas.
+
+        Recorre la columna de elecciones por tramos de `chunk_size` votos.
+
+        Returns:
+            Counter: {choice_id: votos}
+        """
+        start, end = self.span(since, until)
+        by_index = Counter()
+        for offset in range(start, end, chunk_size):
+            by_index.update(self.choice_indexes[offset:min(offset + chunk_size, end)])
+        return Counter({self.choice_ids[index]: votes for index, votes in by_index.items()})
+
+    def date_range(self):
+        """Fechas (primer voto, último voto), o None si no hay votos."""
+        if not self.count:
+            return None
+        return from_timestamp(self.timestamps[0]), from_timestamp(self.timestamps[-1])
+
+    def iter_votes(self, since=None, until=None):
+        """Recorre los votos como pares (choice_id, voted_at), en orden de fecha."""
+        start, end = self.span(since, until)
+        for position in range(start, end):
+            yield (
+                self.choice_ids[self.choice_indexes[position]],
+                from_timestamp(self.timestamps[position]),
+            )
+
+
+def open_archive(question_id):
+    """
+    Abre el archivo de votos de una pregunta.
+
+    Returns:
+        ArchivedVotes | None: None si la pregunta no tiene votos archivados
+    """
+    try:
+        return ArchivedVotes(archive_path(question_id))
+    except FileNotFoundError:
+        return None
+
+
+def write_archive(question, last_vote_id):
+    """
+    Escribe los votos de una pregunta (hasta `last_vote_id`) en su archivo.
+
+    El archivo se arma en un temporal del tamaño final, se llena por mmap
+    leyendo los votos de a BATCH_SIZE y recién al final reemplaza al
+    definitivo, así nunca queda un archivo a medias.
+
+    Returns:
+        int: Cantidad de votos archivados
+    """
+    from .models import Vote
+
+    config = get_config()
+    choice_ids = list(question.choice_set.order_by('id').values_list('id', flat=True))
+    if len(choice_ids) > MAX_CHOICES:
+        raise ValueError(f'La pregunta {question.pk} tiene más de {MAX_CHOICES} opciones')
+    choice_index = {choice_id: index for index, choice_id in enumerate(choice_ids)}
+
+    votes = Vote.objects.filter(question=question, id__lte=last_vote_id)
+    count = votes.count()
+    start = HEADER.size + len(choice_ids) * CHOICE_ID.size
+    middle = start + count * TIMESTAMP_SIZE
+    size = middle + count * CHOICE_INDEX_SIZE
+
+    path = archive_path(question.pk)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w+b') as file:
+        file.truncate(size)
+        with mmap.mmap(file.fileno(), size) as output:
+            HEADER.pack_into(output, 0, MAGIC, VERSION, len(choice_ids), count, last_vote_id)
+            for i, choice_id in enumerate(choice_ids):
+                CHOICE_ID.pack_into(output, HEADER.size + i * CHOICE_ID.size, choice_id)
+            written = 0
+            rows = votes.order_by('voted_at', 'id').values_list('choice_id', 'voted_at')
+            for choice_id, voted_at in rows.iterator(chunk_size=config['BATCH_SIZE']):
+                if written == count:
+                    break
+                struct.pack_into('<q', output, start + written * TIMESTAMP_SIZE, to_timestamp(voted_at))
+                struct.pack_into('<H', output, middle + written * CHOICE_INDEX_SIZE, choice_index[choice_id])
+                written += 1
+            if written != count:
+                raise RuntimeError(f'Se esperaban {count} votos de la pregunta {question.pk} y se leyeron {written}')
+            output.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+    return count
+
+
+def delete_archived_rows(question, last_vote_id, batch_size=None):
+    """
+    Borra las filas de Vote ya archivadas, de a `batch_size` por transacción.
+
+    Returns:
+        int: Cantidad de filas borradas
+    """
+    from .models import Vote
+
+    batch_size = batch_size or get_config()['BATCH_SIZE']
+    deleted = 0
+    while True:
+        ids = list(
+            Vote.objects.filter(question=question, id__lte=last_vote_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        # Los contadores ya tienen los totales del archivo: no hace falta recontar
+        with transaction.atomic():
+            deleted += Vote.objects.filter(pk__in=ids).delete(recount=False)[0]
+
+
+def archive_question(question):
+    """
+    Archiva los votos de una pregunta y borra sus filas de Vote.
+
+    1. Cierra la encuesta (is_active=False) para que no entren votos nuevos.
+    2. Escribe el archivo con los votos hasta el último id actual.
+    3. Marca archived_at y recalcula los contadores desde el archivo
+       (Question.recount_votes), que quedan como totales finales.
+    4. Borra las filas archivadas por lotes.
+
+    Si se interrumpe después del paso 3, volver a llamarla solo termina
+    de borrar las filas.
+
+    Returns:
+        tuple: (votos archivados, filas borradas)
+    """
+    from .models import Question, Vote
+
+    archive = open_archive(question.pk) if question.archived_at else None
+    if archive is not None:
+        with archive:
+            last_vote_id, archived = archive.last_vote_id, archive.count
+    else:
+        Question.objects.filter(pk=question.pk).update(is_active=False)
+        last_vote_id = Vote.objects.filter(question=question).order_by('-id').values_list('id', flat=True).first() or 0
+        archived = write_archive(question, last_vote_id)
+        question.is_active = False
+        question.counter_shards = 1
+        question.archived_at = timezone.now()
+        Question.objects.filter(pk=question.pk).update(
+            is_active=False, counter_shards=1, archived_at=question.archived_at
+        )
+        question.recount_votes()
+    return archived, delete_archived_rows(question, last_vote_id)
@@ -0,0 +1,311 @@
+"""
+Escritor de votos por lotes (group commit).
+
+Normalmente la vista `vote` guarda cada voto con su propia transacción, y en
+momentos de mucho tráfico (sobre todo con SQLite) el límite es la cantidad de
+commits por segundo. Con este modo opcional, la vista valida el voto y lo deja
+en una cola en memoria; un hilo escritor junta los votos y los guarda cada
+MAX_DELAY_MS milisegundos o cada MAX_BATCH votos con `bulk_create`, todo en una
+sola transacción.
+
+Cada petición espera su resultado en un Future, así los votos duplicados se
+siguen informando al usuario.
+
+Configuración en settings.py:
+    POLLS_VOTE_WRITER = {
+        'ENABLED': True,
+        'MAX_BATCH': 200,
+        'MAX_DELAY_MS': 20,
+        'TIMEOUT': 5,
+    }
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+
+from .models import Vote
+from .voter_filter import voter_filters
+from .voter_identity import stored_ip, voter_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'MAX_BATCH': 200,
+    'MAX_DELAY_MS': 20,
+    'TIMEOUT': 5,
+}
+
+
+class DuplicateVote(Exception):
+    """El votante ya tenía un voto registrado en esa pregunta."""
+
+
+def get_config():
+    """
+    Devuelve la configuración del escritor mezclada con los valores por defecto.
+    """
+    return {**DEFAULTS, **getattr(settings, 'POLLS_VOTE_WRITER', {})}
+
+
+def voter_keys(vote):
+    """
+    Claves que identifican a un votante dentro de una pregunta.
+
+    Sigue la misma regla que la vista `vote`: la IP bloquea siempre y,
+    si el usuario está autenticado, también su cuenta.
+    """
+    question_id = vote.choice.question_id
+    keys = [(question_id, 'ip', bytes(vote.voter_key))]
+    if vote.user_id:
+        keys.append((question_id, 'user', vote.user_id))
+    return keys
+
+
+class VoteWriter:
+    """
+    Hilo que guarda votos por lotes.
+
+    Uso:
+        writer = VoteWriter(max_batch=200, max_delay_ms=20)
+        writer.start()
+        writer.submit(Vote(choice=..., voter_ip=...)).result(timeout=5)
+        writer.stop()
+    """
+
+    def __init__(self, max_batch=200, max_delay_ms=20):
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'batches': 0,
+            'votes': 0,
+            'duplicates': 0,
+            'errors': 0,
+            'max_batch_size': 0,
+            'commit_seconds_total': 0.0,
+            'max_commit_seconds': 0.0,
+            'last_commit_seconds': 0.0,
+        }
+
+    def start(self):
+        """Arranca el hilo escritor (si no estaba corriendo)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='polls-vote-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        """
+        Detiene el hilo después de guardar todo lo que quedaba en la cola.
+        """
+        if not self._thread:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, vote):
+        """
+        Encola un voto para guardarlo en el próximo lote.
+
+        Args:
+            vote (Vote): Voto sin guardar, con `choice` (y su pregunta) cargada
+
+        Returns:
+            Future: Se resuelve con el voto guardado, o con DuplicateVote si el
+            votante ya había votado en la pregunta
+        """
+        future = Future()
+        # bulk_create no llama a Vote.save(): copiar la pregunta y
+        # calcular la clave del votante aquí
+        vote.question_id = vote.choice.question_id
+        vote.voter_key = voter_key(vote.voter_ip)
+        vote.voter_ip = stored_ip(vote.voter_ip)
+        self._queue.put((vote, future))
+        return future
+
+    def stats(self):
+        """
+        Devuelve métricas del escritor: lotes, votos, tamaño de lote y latencia de commit.
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queue_size'] = self._queue.qsize()
+        stats['avg_batch_size'] = stats['votes'] / stats['batches'] if stats['batches'] else 0
+        stats['avg_commit_seconds'] = (
+            stats['commit_seconds_total'] / stats['batches'] if stats['batches'] else 0
+        )
+        return stats
+
+    def _run(self):
+        """Bucle principal: junta un lote y lo guarda, hasta que se pide parar."""
+        try:
+            while not (self._stopping.is_set() and self._queue.empty()):
+                batch = self._collect()
+                if batch:
+                    self._flush(batch)
+        finally:
+            connection.close()
+
+    def _collect(self):
+        """Espera el primer voto y junta más hasta MAX_BATCH o MAX_DELAY_MS."""
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        """Guarda un lote y resuelve los Future de cada voto."""
+        connection.close_if_unusable_or_obsolete()
+        started = time.perf_counter()
+        accepted, duplicates, errors = [], [], 0
+        try:
+            accepted, duplicates = self._dedupe(batch)
+            try:
+                self._write(accepted)
+            except IntegrityError:
+                # Algún voto chocó con una restricción: guardarlos uno por uno
+                # para saber exactamente cuáles fallaron
+                accepted, more_duplicates = self._write_one_by_one(accepted)
+                duplicates.extend(more_duplicates)
+        except Exception as exc:
+            logger.exception('Error al guardar un lote de %s votos', len(batch))
+            for _, future in batch:
+                future.set_exception(exc)
+            accepted, duplicates, errors = [], [], len(batch)
+        elapsed = time.perf_counter() - started
+
+        for vote, future in accepted:
+            future.set_result(vote)
+        for _, future in duplicates:
+            future.set_exception(DuplicateVote())
+
+        with self._stats_lock:
+            self._stats['batches'] += 1
+            self._stats['votes'] += len(accepted)
+            self._stats['duplicates'] += len(duplicates)
+            self._stats['errors'] += errors
+            self._stats['max_batch_size'] = max(self._stats['max_batch_size'], len(batch))
+            self._stats['commit_seconds_total'] += elapsed
+            self._stats['max_commit_seconds'] = max(self._stats['max_commit_seconds'], elapsed)
+            self._stats['last_commit_seconds'] = elapsed
+
+    def _dedupe(self, batch):
+        """
+        Separa los votos duplicados: dentro del mismo lote y contra la base de datos.
+
+        La búsqueda en la base de datos es una sola consulta para todo el lote,
+        sobre los índices únicos (question, voter_key) y (question, user).
+        """
+        condition = Q()
+        for vote, _ in batch:
+            condition |= Q(question_id=vote.question_id, voter_key=vote.voter_key)
+            if vote.user_id:
+                condition |= Q(question_id=vote.question_id, user_id=vote.user_id)
+        existing = set()
+        rows = Vote.objects.filter(condition).values_list('question_id', 'user_id', 'voter_key')
+        for question_id, user_id, key in rows:
+            existing.add((question_id, 'ip', bytes(key)))
+            if user_id:
+                existing.add((question_id, 'user', user_id))
+
+        accepted, duplicates = [], []
+        for vote, future in batch:
+            keys = voter_keys(vote)
+            if existing.intersection(keys):
+                duplicates.append((vote, future))
+            else:
+                existing.update(keys)
+                accepted.append((vote, future))
+        return accepted, duplicates
+
+    def _write(self, items):
+        """Inserta los votos con bulk_create y actualiza los contadores en la misma transacción."""
+        if not items:
+            return
+        votes = [vote for vote, _ in items]
+        with transaction.atomic():
+            Vote.objects.bulk_create(votes)
+            self._add_to_counters(votes)
+
+    def _write_one_by_one(self, items):
+        """Inserta los votos de a uno (con savepoints) cuando el lote completo falló."""
+        accepted, duplicates = [], []
+        with transaction.atomic():
+            for vote, future in items:
+                try:
+                    with transaction.atomic():
+                        Vote.objects.bulk_create([vote])
+                except IntegrityError:
+                    duplicates.append((vote, future))
+                else:
+                    accepted.append((vote, future))
+            self._add_to_counters([vote for vote, _ in accepted])
+        return accepted, duplicates
+
+    @staticmethod
+    def _add_to_counters(votes):
+        """
+        Suma los votos del lote a los contadores (un incremento por opción)
+        y agrega sus votantes al filtro de "¿ya votó?" (ver voter_filter.py).
+        """
+        questions = {}
+        per_choice = Counter()
+        for vote in votes:
+            questions[vote.choice.question_id] = vote.choice.question
+            per_choice[(vote.choice.question_id, vote.choice_id)] += 1
+            voter_filters.add_vote(vote.question_id, vote.voter_key, vote.user_id)
+        for (question_id, choice_id), amount in per_choice.items():
+            questions[question_id].add_votes(choice_id, amount)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def is_enabled():
+    """Indica si el modo de escritura por lotes está activado en settings."""
+    return bool(get_config()['ENABLED'])
+
+
+def get_vote_writer():
+    """
+    Devuelve el escritor del proceso, creándolo y arrancándolo la primera vez.
+
+    Al terminar el proceso se guardan los votos que quedaban en la cola.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            config = get_config()
+            _writer = VoteWriter(
+                max_batch=config['MAX_BATCH'],
+                max_delay_ms=config['MAX_DELAY_MS'],
+            )
+            _writer.start()
+            atexit.register(_writer.stop)
+        return _writer
@@ -0,0 +1,272 @@
+"""
+Filtro en memoria de "¿ya votó?" por pregunta.
+
+Cada vez que alguien abre la página de una encuesta hay que saber si ya votó
+(por IP o por usuario) para mostrar el formulario o el aviso. En una encuesta
+con mucho tráfico anónimo, casi todas esas consultas responden "no".
+
+Aquí cada pregunta tiene un filtro de Bloom con las claves de sus votantes:
+una estructura de bits muy compacta que puede responder "seguro que no votó"
+sin ir a la base de datos. Si responde "quizás", se consulta la base de datos
+como siempre. Nunca da un "no" equivocado para los votos de este proceso; un
+"quizás" equivocado (falso positivo) solo cuesta la consulta de siempre.
+
+- El filtro de una pregunta se arma la primera vez que se necesita, leyendo
+  las claves de sus votos.
+- Cada voto guardado en este proceso agrega su clave enseguida.
+- Los votos guardados en otros procesos se incorporan cuando cambia la
+  versión de los resultados en caché (ver results_cache.py), con una consulta
+  de los votos nuevos, como mucho cada REFRESH_SECONDS. Para eso la caché
+  de resultados tiene que ser compartida entre procesos (ver checks.py).
+- Los filtros de preguntas que nadie mira se descartan después de
+  IDLE_SECONDS, y los menos usados cuando se supera MEMORY_BYTES.
+
+Configuración en settings.py:
+    POLLS_VOTER_FILTER = {
+        'ENABLED': True,
+        'FALSE_POSITIVE_RATE': 0.01,
+        'MEMORY_BYTES': 16 * 1024 * 1024,
+        'IDLE_SECONDS': 600,
+        'REFRESH_SECONDS': 1,
+        'MIN_CAPACITY': 1024,
+    }
+"""
+
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import results_cache
+from .voter_identity import voter_key
+
+DEFAULTS = {
+    'ENABLED': True,
+    'FALSE_POSITIVE_RATE': 0.01,
+    'MEMORY_BYTES': 16 * 1024 * 1024,
+    'IDLE_SECONDS': 600,
+    'REFRESH_SECONDS': 1,
+    'MIN_CAPACITY': 1024,
+}
+
+
+def get_config():
+    """Devuelve la configuración del filtro mezclada con los valores por defecto."""
+    return {**DEFAULTS, **getattr(settings, 'POLLS_VOTER_FILTER', {})}
+
+
+def voter_keys(key, user_id=None):
+    """
+    Claves de un votante dentro de una pregunta.
+
+    Misma regla que la vista vote: la IP siempre (por su clave binaria,
+    Vote.voter_key; None si no se conoce) y, si está autenticado, también
+    su usuario.
+    """
+    keys = [] if key is None else [f'ip:{bytes(key).hex()}']
+    if user_id:
+        keys.append(f'user:{user_id}')
+    return keys
+
+
+class BloomFilter:
+    """
+    Filtro de Bloom: conjunto aproximado sin falsos negativos.
+
+    Args:
+        capacity (int): Cantidad de claves para la que se dimensiona
+        false_positive_rate (float): Probabilidad buscada de "quizás" equivocado
+    """
+
+    def __init__(self, capacity, false_positive_rate):
+        self.capacity = capacity
+        bits = math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        self.num_bits = max(8, bits)
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    @property
+    def size_bytes(self):
+        return len(self.bits)
+
+    def _positions(self, key):
+        # Doble hashing: k posiciones a partir de dos hashes de 64 bits
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class _QuestionFilter:
+    """Filtro de una pregunta con lo necesario para mantenerlo al día."""
+
+    def __init__(self, bloom, version, last_vote_id):
+        self.bloom = bloom
+        self.version = version
+        self.last_vote_id = last_vote_id
+        now = time.monotonic()
+        self.last_used = now
+        self.last_refresh = now
+
+
+class VoterFilterCache:
+    """
+    Filtros de Bloom de todas las preguntas de este proceso, con límite de memoria.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filters = OrderedDict()
+        self._memory = 0
+        self._stats = {'skipped_db': 0, 'maybe': 0, 'builds': 0, 'refreshes': 0, 'evictions': 0}
+
+    def might_have_voted(self, question_id, voter_ip, user_id=None):
+        """
+        Indica si el votante podría haber votado en la pregunta.
+
+        Returns:
+            bool: False si seguro que no votó (no hace falta consultar la base
+            de datos); True si quizás votó (hay que consultarla)
+        """
+        config = get_config()
+        if not config['ENABLED']:
+            return True
+        question_filter = self._get_filter(question_id, config)
+        if question_filter is None:
+            return True
+        keys = voter_keys(voter_key(voter_ip) if voter_ip else None, user_id)
+        with self._lock:
+            maybe = any(key in question_filter.bloom for key in keys)
+            self._stats['maybe' if maybe else 'skipped_db'] += 1
+        return maybe
+
+    def add_vote(self, question_id, key, user_id=None):
+        """
+        Agrega un voto nuevo al filtro de su pregunta (si ese filtro está armado).
+
+        Args:
+            question_id (int): ID de la pregunta
+            key (bytes): Clave binaria de la IP (Vote.voter_key)
+            user_id (int): ID del usuario, o None si es anónimo
+
+        Se llama justo después del INSERT, antes del commit: si la transacción
+        se deshace, la clave queda como un falso positivo, que no hace daño.
+        """
+        with self._lock:
+            question_filter = self._filters.get(question_id)
+            if question_filter is None:
+                return
+            for filter_key in voter_keys(key, user_id):
+                question_filter.bloom.add(filter_key)
+            if question_filter.bloom.count > question_filter.bloom.capacity:
+                # Se llenó: descartarlo para armarlo de nuevo más grande
+                self._discard(question_id)
+
+    def clear(self):
+        """Descarta todos los filtros."""
+        with self._lock:
+            self._filters.clear()
+            self._memory = 0
+
+    def stats(self):
+        """Métricas del filtro: consultas evitadas, filtros armados, memoria usada."""
+        with self._lock:
+            return {**self._stats, 'filters': len(self._filters), 'memory_bytes': self._memory}
+
+    def _get_filter(self, question_id, config):
+        """Devuelve el filtro de la pregunta al día, armándolo si hace falta."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now, config['IDLE_SECONDS'])
+            question_filter = self._filters.get(question_id)
+            if question_filter is not None:
+                question_filter.last_used = now
+                self._filters.move_to_end(question_id)
+                needs_refresh = now - question_filter.last_refresh >= config['REFRESH_SECONDS']
+                if needs_refresh:
+                    question_filter.last_refresh = now
+
+        if question_filter is None:
+            return self._build(question_id, config)
+        if needs_refresh:
+            version = results_cache.get_version(question_id)
+            if version != question_filter.version:
+                self._refresh(question_id, question_filter, version)
+        return question_filter
+
+    def _build(self, question_id, config):
+        """Arma el filtro de una pregunta con las claves de todos sus votos."""
+        from .models import Vote
+
+        version = results_cache.get_version(question_id)
+        rows = list(Vote.objects.filter(question_id=question_id).values_list('id', 'voter_key', 'user_id'))
+        # Hasta dos claves por voto (IP y usuario), con lugar para otro tanto de votos nuevos
+        capacity = max(config['MIN_CAPACITY'], 4 * len(rows))
+        bloom = BloomFilter(capacity, config['FALSE_POSITIVE_RATE'])
+        if bloom.size_bytes > config['MEMORY_BYTES']:
+            # No entra en el presupuesto: esta pregunta siempre consulta la base de datos
+            return None
+        last_vote_id = 0
+        for vote_id, key, user_id in rows:
+            for filter_key in voter_keys(key, user_id):
+                bloom.add(filter_key)
+            last_vote_id = max(last_vote_id, vote_id)
+
+        question_filter = _QuestionFilter(bloom, version, last_vote_id)
+        with self._lock:
+            self._stats['builds'] += 1
+            self._discard(question_id)
+            self._filters[question_id] = question_filter
+            self._memory += bloom.size_bytes
+            while self._memory > config['MEMORY_BYTES'] and len(self._filters) > 1:
+                oldest = next(iter(self._filters))
+                self._discard(oldest)
+                self._stats['evictions'] += 1
+        return question_filter
+
+    def _refresh(self, question_id, question_filter, version):
+        """Agrega los votos guardados después de armar el filtro (por ejemplo, en otros procesos)."""
+        from .models import Vote
+
+        rows = list(Vote.objects.filter(
+            question_id=question_id, id__gt=question_filter.last_vote_id
+        ).values_list('id', 'voter_key', 'user_id'))
+        with self._lock:
+            self._stats['refreshes'] += 1
+            for vote_id, key, user_id in rows:
+                for filter_key in voter_keys(key, user_id):
+                    question_filter.bloom.add(filter_key)
+                question_filter.last_vote_id = max(question_filter.last_vote_id, vote_id)
+            question_filter.version = version
+            if question_filter.bloom.count > question_filter.bloom.capacity:
+                self._discard(question_id)
+
+    def _evict_idle(self, now, idle_seconds):
+        """Descarta los filtros que nadie consultó en los últimos IDLE_SECONDS (con el lock tomado)."""
+        while self._filters:
+            question_id, question_filter = next(iter(self._filters.items()))
+            if now - question_filter.last_used < idle_seconds:
+                break
+            self._discard(question_id)
+            self._stats['evictions'] += 1
+
+    def _discard(self, question_id):
+        """Quita el filtro de una pregunta (con el lock tomado)."""
+        question_filter = self._filters.pop(question_id, None)
+        if question_filter is not None:
+            self._memory -= question_filter.bloom.size_bytes
+
+
+voter_filters = VoterFilterCache()
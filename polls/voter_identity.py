@@ -0,0 +1,155 @@
+"""
+Identidad compacta del votante.
+
+Para buscar y para impedir votos duplicados se usa Vote.voter_key: una
+clave binaria de 16 bytes fijos, mucho más chica en los índices que el
+texto de la IP. En modo 'packed' la IP también se guarda como texto en
+Vote.voter_ip (para mostrarla en el admin y exportarla).
+
+Modos (POLLS_VOTER_IDENTITY['MODE']):
+- 'packed': la IP empaquetada. IPv4 se guarda como IPv6 mapeada
+  (::ffff:a.b.c.d), así todas ocupan lo mismo y las distintas formas de
+  escribir una misma IPv6 dan la misma clave.
+- 'hash': HMAC-SHA256 de la IP empaquetada con una sal (SALT, o SECRET_KEY
+  si no se define), recortado a 16 bytes. La IP no se puede recuperar de la
+  clave, y Vote.voter_ip queda vacío (ver stored_ip): guardar la IP en
+  texto al lado del hash no protegería nada. Tampoco se exporta.
+
+Si se cambia el modo o la sal con votos ya guardados, hay que recalcular
+las claves con rekey_votes() (la migración 0007 la usa para los votos que
+ya existían). Al pasar a 'hash' también borra las IPs guardadas, así que
+después ya no se puede volver a 'packed' ni cambiar la sal para esos votos.
+
+Configuración en settings.py:
+    POLLS_VOTER_IDENTITY = {
+        'MODE': 'packed',   # o 'hash'
+        'SALT': None,       # Solo para 'hash'; por defecto SECRET_KEY
+    }
+"""
+
+import hashlib
+import hmac
+import ipaddress
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+DEFAULTS = {
+    'MODE': 'packed',
+    'SALT': None,
+}
+
+KEY_SIZE = 16
+
+
+def get_config():
+    """Devuelve la configuración de la identidad mezclada con los valores por defecto."""
+    return {**DEFAULTS, **getattr(settings, 'POLLS_VOTER_IDENTITY', {})}
+
+
+def pack_ip(voter_ip):
+    """
+    Empaqueta una IP en 16 bytes (IPv4 como IPv6 mapeada).
+
+    Raises:
+        ValueError: Si el texto no es una IP válida
+    """
+    address = ipaddress.ip_address(voter_ip)
+    if address.version == 4:
+        address = ipaddress.IPv6Address(f'::ffff:{address}')
+    return address.packed
+
+
+def valid_ip(text):
+    """
+    Devuelve el texto sin espacios si es una IP válida, o None si no lo es.
+
+    Por ejemplo, un X-Forwarded-For "unknown" que algunos proxies mandan.
+    """
+    text = (text or '').strip()
+    try:
+        ipaddress.ip_address(text)
+    except ValueError:
+        return None
+    return text
+
+
+def voter_key(voter_ip):
+    """
+    Clave binaria de 16 bytes de una IP, según el modo configurado.
+
+    Args:
+        voter_ip (str): IP del votante (por ejemplo, la de get_client_ip)
+
+    Returns:
+        bytes: La clave para Vote.voter_key
+    """
+    config = get_config()
+    packed = pack_ip(voter_ip)
+    if config['MODE'] == 'packed':
+        return packed
+    if config['MODE'] == 'hash':
+        salt = (config['SALT'] or settings.SECRET_KEY).encode()
+        return hmac.new(salt, packed, hashlib.sha256).digest()[:KEY_SIZE]
+    raise ImproperlyConfigured(f"POLLS_VOTER_IDENTITY['MODE'] no válido: {config['MODE']!r}")
+
+
+def stores_ip():
+    """Indica si Vote.voter_ip guarda la IP en texto (solo en modo 'packed')."""
+    return get_config()['MODE'] == 'packed'
+
+
+def stored_ip(voter_ip):
+    """
+    Valor de Vote.voter_ip para una IP: la misma en modo 'packed', None en modo 'hash'.
+    """
+    return voter_ip if stores_ip() else None
+
+
+def key_to_ip(key):
+    """
+    Devuelve la IP de una clave en modo 'packed' (None si no se puede recuperar).
+    """
+    if key is None or get_config()['MODE'] != 'packed':
+        return None
+    address = ipaddress.IPv6Address(bytes(key))
+    return str(address.ipv4_mapped or address)
+
+
+def rekey_votes(vote_model, chunk_size=5000, keep_ips=False):
+    """
+    Recalcula voter_key de todos los votos, por tramos de id.
+
+    Cada tramo se guarda en su propia transacción con bulk_update. En modo
+    'hash' también vacía voter_ip (salvo con keep_ips). Los votos sin IP
+    guardada no se pueden recalcular y se dejan como están.
+
+    Args:
+        vote_model: El modelo Vote (o su versión histórica en una migración)
+        chunk_size (int): Votos por tramo
+        keep_ips (bool): No tocar voter_ip (la migración 0007 es anterior a
+            que voter_ip admita NULL)
+
+    Returns:
+        int: Cantidad de votos actualizados
+    """
+    fields = ['voter_key'] if keep_ips or stores_ip() else ['voter_key', 'voter_ip']
+    updated = 0
+    last_id = 0
+    while True:
+        rows = list(
+            vote_model.objects.filter(id__gt=last_id, voter_ip__isnull=False)
+            .order_by('id')
+            .values_list('id', 'voter_ip')[:chunk_size]
+        )
+        if not rows:
+            return updated
+        votes = [
+            vote_model(id=vote_id, voter_key=voter_key(voter_ip), voter_ip=stored_ip(voter_ip))
+            for vote_id, voter_ip in rows
+        ]
+        with transaction.atomic():
+            vote_model.objects.bulk_update(votes, fields, batch_size=500)
+        updated += len(votes)
+        last_id = rows[-1][0]